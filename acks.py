@@ -0,0 +1,84 @@
+# Acknowledgement tracking for the remote
+# The robot writes back the sequence number and sender tick of every frame
+# it gets. From those the remote keeps a smoothed round trip time, the
+# jitter (how much the round trip moves about) and a rolling loss rate.
+# Everything is integer maths on preallocated arrays.
+
+import array
+
+from micropython import const
+
+import protocol
+
+# Frames that can be waiting for an ack; an older one that is still waiting
+# when its slot comes round again counts as lost. Must be a power of two.
+ACK_WINDOW = const(32)
+
+
+class AckTracker:
+    """ Round trip time, jitter and loss from the robot's acks """
+
+    def __init__(self, window=ACK_WINDOW):
+        self._mask = window - 1
+        self._seqs = array.array("H", [0] * window)
+        self._pending = bytearray(window)
+        # Smoothed values in fixed point: rtt x8, jitter x16, loss in 1/1000 x16
+        self._rtt8 = 0
+        self._jitter16 = 0
+        self._loss16 = 0
+        self._last_rtt = None
+        self.sent = 0
+        self.acked = 0
+        self.lost = 0
+        self.unexpected = 0
+
+    def _resolved(self, lost):
+        self._loss16 += (1000 if lost else 0) - (self._loss16 >> 4)
+
+    def sent_frame(self, seq):
+        """ Record a frame that has just been notified """
+        index = seq & self._mask
+        if self._pending[index]:
+            self.lost += 1
+            self._resolved(True)
+        self._seqs[index] = seq & 0xFFFF
+        self._pending[index] = 1
+        self.sent += 1
+
+    def on_ack(self, data):
+        """ Record an ack written by the robot """
+        if len(data) != protocol.ACK_SIZE:
+            self.unexpected += 1
+            return
+        seq = protocol.ack_seq(data)
+        index = seq & self._mask
+        if not self._pending[index] or self._seqs[index] != seq:
+            # Already acked, or given up on as lost
+            self.unexpected += 1
+            return
+        self._pending[index] = 0
+        self.acked += 1
+        self._resolved(False)
+        rtt = protocol.tick_diff(protocol.now_tick(), protocol.ack_tick(data))
+        if self._last_rtt is None:
+            if not self._rtt8:
+                self._rtt8 = rtt << 3
+        else:
+            self._rtt8 += rtt - (self._rtt8 >> 3)
+            # RFC 3550 style jitter, the smoothed change between round trips
+            self._jitter16 += abs(rtt - self._last_rtt) - (self._jitter16 >> 4)
+        self._last_rtt = rtt
+
+    def rtt_ms(self):
+        return self._rtt8 >> 3
+
+    def jitter_ms(self):
+        return self._jitter16 >> 4
+
+    def loss_percent(self):
+        return (self._loss16 >> 4) / 10
+
+    def stats(self):
+        """ Return the link figures as a string, for printing """
+        return (f"rtt {self.rtt_ms()} ms, jitter {self.jitter_ms()} ms, loss {self.loss_percent()}%, "
+                f"sent {self.sent}, acked {self.acked}, lost {self.lost}")
@@ -0,0 +1,44 @@
+# Adaptive advertising for the remote
+# Right after boot or a disconnect the robot is most likely looking for us,
+# so advertise fast for a while, then back off to save power.
+
+import aioble
+import uasyncio as asyncio
+
+# (how long in ms, interval in us); the last phase lasts until a connection
+DEFAULT_PROFILE = (
+    (30_000, 25_000),
+    (120_000, 250_000),
+    (None, 1_000_000),
+)
+
+
+class AdvertisingSchedule:
+    """ Advertise through a fast-to-slow profile until a central connects """
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.profile = profile
+        self.phase = 0
+
+    def interval_at(self, elapsed_ms):
+        """ Return the advertising interval in us, elapsed_ms after the schedule started """
+        for duration_ms, interval_us in self.profile:
+            if duration_ms is None or elapsed_ms < duration_ms:
+                return interval_us
+            elapsed_ms -= duration_ms
+        return self.profile[-1][1]
+
+    async def advertise(self, **kwargs):
+        """ Same as aioble.advertise(), starting again from the fast phase """
+        self.phase = 0
+        last = len(self.profile) - 1
+        while True:
+            duration_ms, interval_us = self.profile[self.phase]
+            if duration_ms:
+                print(f'advertising every {interval_us // 1000} ms for {duration_ms // 1000} s')
+            else:
+                print(f'advertising every {interval_us // 1000} ms')
+            try:
+                return await aioble.advertise(interval_us, timeout_ms=duration_ms, **kwargs)
+            except asyncio.TimeoutError:
+                self.phase = min(self.phase + 1, last)
@@ -0,0 +1,28 @@
+# A timeout for a ThreadSafeFlag wait that doesn't allocate
+# asyncio.wait_for_ms() makes a new coroutine and Task every time it is
+# called, and a TimeoutError each time it runs out, which adds up in a loop
+# that waits once for every frame or button edge. An Alarm sets the flag
+# itself from a one-shot machine.Timer when the time is up, so the loop
+# just awaits the flag, the same as when it has no timeout.
+# The alarm isn't cancelled when the flag is set first, so a wait can come
+# back early for nothing; whoever waits has to check why it woke anyway.
+
+import machine
+
+
+class Alarm:
+    """ Set a ThreadSafeFlag after a number of milliseconds """
+
+    def __init__(self, flag):
+        self.flag = flag
+        # A soft timer, its callback is scheduled like a soft IRQ
+        self._timer = machine.Timer()
+        # Made once: a bound method is a new object on every lookup
+        self._ring = self._alarm
+
+    def _alarm(self, timer):
+        self.flag.set()
+
+    def start(self, ms):
+        """ Set the flag in ms milliseconds, moving an alarm that is still pending """
+        self._timer.init(mode=machine.Timer.ONE_SHOT, period=ms, callback=self._ring)
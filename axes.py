@@ -0,0 +1,236 @@
+# Analog axis channel
+# Joystick axes go out on their own characteristic, apart from the button
+# frames. AxisStream samples the ADCs, takes out a deadband around the
+# centre and sends only the axes that moved since the last update, as
+# deltas, never more than once per connection interval. A keyframe with
+# every axis's absolute value goes out every AXIS_KEYFRAME_MS, so an update
+# that goes missing is put right. AxisState on the robot rebuilds the values.
+#
+# Axis update format:
+#
+#   byte 0    sequence number, uint8, wraps
+#   byte 1    low nibble: the axes included, one bit each
+#             bit 7: keyframe, the values are absolute instead of deltas
+#   byte 2    which of the included axes are int16 ("<h"), the rest are int8 ("<b")
+#   byte 3..  one value per included axis, lowest axis first
+#
+# Values are thousandths of full deflection, -1000..1000.
+
+import array
+import struct
+
+from micropython import const
+from utime import ticks_diff, ticks_ms
+
+from protocol import MAX_AXES
+from receiver import Subscriber
+
+AXIS_MAX = const(1000)
+
+AXIS_HEADER_SIZE = const(3)
+
+_KEYFRAME = const(0x80)
+_AXES_MASK = const(0x0F)
+
+_ADC_MID = const(32768)
+
+# How often the axes are read
+AXIS_SAMPLE_MS = const(10)
+
+# Thousandths either side of the centre that read as 0
+AXIS_DEADBAND = const(60)
+
+# Smaller moves are noise and are not sent, unless the stick comes to rest
+# on the centre or an end stop
+AXIS_MIN_CHANGE = const(8)
+
+# At most one update per connection interval (the longest in the "drive"
+# link profile)
+AXIS_INTERVAL_MS = const(15)
+
+# A keyframe goes out this often even if nothing moves
+AXIS_KEYFRAME_MS = const(500)
+
+
+class AxisStream:
+    """ Sample joystick axes and build updates for the ones that moved """
+
+    def __init__(self, adcs, deadband=AXIS_DEADBAND, min_change=AXIS_MIN_CHANGE, interval_ms=AXIS_INTERVAL_MS,
+                 keyframe_ms=AXIS_KEYFRAME_MS):
+        if len(adcs) > MAX_AXES:
+            raise ValueError("too many axes")
+        # Anything with read_u16(), e.g. machine.ADC
+        self.adcs = adcs
+        self.deadband = deadband
+        self.min_change = min_change
+        self.interval_ms = interval_ms
+        self.keyframe_ms = keyframe_ms
+        count = len(adcs)
+        self.values = array.array("h", [0] * count)
+        # What the robot has been sent
+        self._sent = array.array("h", [0] * count)
+        self._buffer = bytearray(AXIS_HEADER_SIZE + 2 * count)
+        view = memoryview(self._buffer)
+        # One view per length, made now so update() allocates nothing
+        self._views = [view[:length] for length in range(len(self._buffer) + 1)]
+        self._seq = 0
+        self._last_ms = 0
+        self._keyframe_ms = 0
+        self._keyframe_due = True
+        # Statistics
+        self.samples = 0
+        self.updates = 0
+        self.keyframes = 0
+        self.bytes = 0
+
+    def reset(self):
+        """ Start again with a keyframe, e.g. after connecting """
+        self._keyframe_due = True
+
+    def scale(self, raw):
+        """ Turn an ADC reading into thousandths of full deflection, with the deadband taken out """
+        value = (raw - _ADC_MID) * AXIS_MAX // (_ADC_MID - 1)
+        deadband = self.deadband
+        if value > deadband:
+            return min(AXIS_MAX, (value - deadband) * AXIS_MAX // (AXIS_MAX - deadband))
+        if value < -deadband:
+            return max(-AXIS_MAX, (value + deadband) * AXIS_MAX // (AXIS_MAX - deadband))
+        return 0
+
+    def sample(self):
+        """ Read every axis """
+        values = self.values
+        adcs = self.adcs
+        for index in range(len(values)):
+            values[index] = self.scale(adcs[index].read_u16())
+        self.samples += 1
+
+    def update(self, now=None):
+        """ Return the update to send now as a memoryview, or None if there is nothing to send yet """
+        if now is None:
+            now = ticks_ms()
+        if not self._keyframe_due and ticks_diff(now, self._last_ms) < self.interval_ms:
+            return None
+        keyframe = self._keyframe_due or ticks_diff(now, self._keyframe_ms) >= self.keyframe_ms
+        values = self.values
+        sent = self._sent
+        buffer = self._buffer
+        min_change = self.min_change
+        mask = 0
+        wide = 0
+        length = AXIS_HEADER_SIZE
+        for index in range(len(values)):
+            value = values[index]
+            if keyframe:
+                field = value
+            else:
+                field = value - sent[index]
+                if not field:
+                    continue
+                if -min_change < field < min_change and value != 0 and value != AXIS_MAX and value != -AXIS_MAX:
+                    continue
+            mask |= 1 << index
+            if -128 <= field <= 127:
+                struct.pack_into("<b", buffer, length, field)
+                length += 1
+            else:
+                struct.pack_into("<h", buffer, length, field)
+                wide |= 1 << index
+                length += 2
+            sent[index] = value
+        if not mask:
+            return None
+        buffer[0] = self._seq
+        buffer[1] = (mask | _KEYFRAME) if keyframe else mask
+        buffer[2] = wide
+        self._seq = (self._seq + 1) & 0xFF
+        self._last_ms = now
+        if keyframe:
+            self._keyframe_ms = now
+            self._keyframe_due = False
+            self.keyframes += 1
+        self.updates += 1
+        self.bytes += length
+        return self._views[length]
+
+    def stats(self):
+        """ Return the update counts as a string, for printing """
+        return f"axes: {self.samples} samples, {self.updates} updates ({self.keyframes} keyframes), {self.bytes} bytes"
+
+
+class AxisState:
+    """ The remote's axis values, rebuilt from its updates """
+
+    def __init__(self, count=MAX_AXES):
+        self.values = array.array("h", [0] * count)
+        # False until a keyframe arrives, and again after a missed update
+        self.synced = False
+        self._seq = 0
+        self.received = 0
+        self.lost = 0
+        self.rejected = 0
+
+    def update(self, data):
+        """ Apply an update; return False if it was not valid or has to wait for a keyframe """
+        self.received += 1
+        if len(data) < AXIS_HEADER_SIZE:
+            self.rejected += 1
+            return False
+        seq = data[0]
+        mask = data[1] & _AXES_MASK
+        keyframe = data[1] & _KEYFRAME
+        wide = data[2]
+        values = self.values
+        length = AXIS_HEADER_SIZE
+        for index in range(MAX_AXES):
+            if mask >> index & 1:
+                length += 2 if wide >> index & 1 else 1
+        if len(data) < length or mask >> len(values):
+            self.rejected += 1
+            return False
+        if not keyframe:
+            if not self.synced:
+                return False
+            if seq != (self._seq + 1) & 0xFF:
+                # Deltas from here on would be off, so wait for a keyframe
+                self.lost += (seq - self._seq - 1) & 0xFF
+                self.synced = False
+                return False
+        position = AXIS_HEADER_SIZE
+        for index in range(len(values)):
+            if not mask >> index & 1:
+                continue
+            if wide >> index & 1:
+                field = data[position] | data[position + 1] << 8
+                if field & 0x8000:
+                    field -= 0x10000
+                position += 2
+            else:
+                field = data[position]
+                if field & 0x80:
+                    field -= 0x100
+                position += 1
+            values[index] = field if keyframe else values[index] + field
+        self._seq = seq
+        self.synced = True
+        return True
+
+
+class AxisReceiver(Subscriber):
+    """ Subscribe to the remote's axis characteristic and pass on every update applied """
+
+    def __init__(self, characteristic, handler, subscribe=None, count=MAX_AXES):
+        super().__init__(characteristic, subscribe)
+        # handler(values), values is AxisState.values
+        self.handler = handler
+        self.state = AxisState(count)
+
+    def handle(self, data):
+        state = self.state
+        if state.update(data):
+            self.handler(state.values)
+
+    def stats(self):
+        """ Return the counters as a string, for printing """
+        state = self.state
+        return f"axes: received {state.received}, lost {state.lost}, rejected {state.rejected}"
@@ -0,0 +1,75 @@
+# Benchmark: round trip, jitter and loss as the remote sees them from the
+# robot's acks, and how many late frames the robot throws away
+# remote.py and robot_code.py run in the simulator over links of varying
+# quality while buttons are pressed on the remote.
+#
+#   python benchmarks/bench_acks.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+from simulator import Simulation  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+
+PRESSES = 80
+FIRST_PRESS_MS = 3000
+PRESS_GAP_MS = 300
+
+# (label, interval ms, packet loss, jitter ms)
+LINKS = (
+    ("30 ms", 30, 0.0, 0.0),
+    ("30 ms, 20% loss", 30, 0.2, 0.0),
+    ("30 ms, 20 ms jitter", 30, 0.0, 20.0),
+    ("30 ms, 600 ms jitter", 30, 0.0, 600.0),
+)
+
+
+def capture_receivers(receivers):
+    """ Setup function that keeps every NotificationReceiver the robot makes """
+
+    def setup(sim):
+        robot = sim.scripts["robot_code"].module
+        receiver_class = robot.NotificationReceiver
+
+        def make(*args, **kwargs):
+            receiver = receiver_class(*args, **kwargs)
+            receivers.append(receiver)
+            return receiver
+
+        robot.NotificationReceiver = make
+
+    return setup
+
+
+def simulate(interval_ms, packet_loss, jitter_ms):
+    sim = Simulation(SCRIPTS, interval_ms, packet_loss, jitter_ms, seed=1)
+    rng = random.Random(2)
+    at_ms = FIRST_PRESS_MS
+    for index in range(PRESSES):
+        at_ms += PRESS_GAP_MS + rng.randrange(-100, 100)
+        sim.press(index % 4, at_ms, rng.randrange(50, 400))
+    receivers = []
+    sim.run(at_ms + 2000, setup=capture_receivers(receivers))
+    # One robot, in the first slot
+    return sim.scripts["remote"].module.centrals.acks[0], receivers
+
+
+def main():
+    print(f"{'link':22} {'sent':>5} {'acked':>6} {'rtt ms':>7} {'jitter ms':>10} {'loss %':>7} "
+          f"{'handled':>8} {'stale':>6}")
+    for label, interval_ms, packet_loss, jitter_ms in LINKS:
+        acks, receivers = simulate(interval_ms, packet_loss, jitter_ms)
+        handled = sum(receiver.received - receiver.duplicates - receiver.rejected - receiver.stale
+                      for receiver in receivers)
+        stale = sum(receiver.stale for receiver in receivers)
+        print(f"{label:22} {acks.sent:5} {acks.acked:6} {acks.rtt_ms():7} {acks.jitter_ms():10} "
+              f"{acks.loss_percent():7} {handled:8} {stale:6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Benchmark: time to rediscovery and advertising cost, fixed 250 ms vs adaptive
+# A simulated scanner (find_remote's 30 ms window / 30 ms interval) starts
+# some time after the remote lost its connection and listens until it hears
+# an advertisement. Advertising events are generated from the schedule.
+#
+#   python benchmarks/bench_advertising.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+from advertising import DEFAULT_PROFILE, AdvertisingSchedule  # noqa: E402
+
+# Chance the scanner hears any one advertising event (collisions, channel hopping)
+HEAR_CHANCE = 0.8
+TRIALS = 400
+# When the robot starts looking, in seconds after the disconnect
+SCAN_STARTS = (0.5, 5, 20, 60, 300, 3600)
+
+PROFILES = (
+    ("fixed 250 ms", AdvertisingSchedule(((None, 250_000),))),
+    ("adaptive", AdvertisingSchedule(DEFAULT_PROFILE)),
+)
+
+
+def rediscovery_ms(schedule, start_ms, rng):
+    """ Time from the scan starting until the first advertisement is heard """
+    time = 0.0
+    while True:
+        time += schedule.interval_at(time) / 1000 + rng.random() * 10
+        if time >= start_ms and rng.random() < HEAR_CHANCE:
+            return time - start_ms
+
+
+def events_per_hour(schedule):
+    time, count = 0.0, 0
+    while time < 3_600_000:
+        time += schedule.interval_at(time) / 1000
+        count += 1
+    return count
+
+
+def main():
+    rng = random.Random(7)
+    print("mean time to rediscovery in ms, by when the robot starts scanning")
+    print(f"{'profile':13} " + " ".join(f"{f'{start}s':>7}" for start in SCAN_STARTS) + f" {'adv/hour':>9}")
+    for name, schedule in PROFILES:
+        means = []
+        for start in SCAN_STARTS:
+            total = sum(rediscovery_ms(schedule, start * 1000, rng) for _ in range(TRIALS))
+            means.append(total / TRIALS)
+        print(f"{name:13} " + " ".join(f"{mean:7.0f}" for mean in means) + f" {events_per_hour(schedule):9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# Benchmark: bytes and updates per second for a recorded joystick session
+# The stick trace is two axes read every AXIS_SAMPLE_MS: resting off centre,
+# ramps, a steady sweep, quick flicks and small corrections, with ADC noise
+# on top, made up the same way every run. It is sent three ways: every
+# sample as raw int16s, the axes that changed as absolute int16s, and
+# axes.AxisStream (deadband, deltas, changed axes only, at most one update
+# per connection interval, keyframes). "air" adds the 4 byte L2CAP and 3
+# byte ATT headers of each notification. The error is how far the robot's
+# values are from the remote's reading at every sample, in thousandths.
+# Then updates are lost at random: the link layer resends lost packets, so
+# on a real link this is only updates the robot has not read before the next
+# one comes, which the rate cap is there to stop, but a lost delta puts the
+# robot out of step until the next keyframe. Last, the whole trace is played
+# into remote.py's ADCs in the simulator, with robot_code.py driving on it
+# through motors with a speed, and the stick is held at full throttle for
+# HOLD_MS, across several of the remote's keepalives, which must not stop
+# the motors even for a moment.
+#
+#   python benchmarks/bench_axes.py
+
+import math
+import os
+import random
+import struct
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import machine  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from simulator import Simulation, speed_motors  # noqa: E402
+
+import axes  # noqa: E402
+import mixer  # noqa: E402
+
+SAMPLE_MS = axes.AXIS_SAMPLE_MS
+NOTIFY_OVERHEAD = 4 + 3
+NOISE = 120
+CENTRE_OFFSET = (400, -250)
+LOSSES = (0.01, 0.05, 0.2)
+KEYFRAMES_MS = (axes.AXIS_KEYFRAME_MS, 200)
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+INTERVAL_MS = 15
+PLAY_AT_MS = 3000
+AXIS_PINS = (26, 27)
+HOLD_MS = 5000
+
+
+def stick_positions(seed=1):
+    """ Return [(steer, throttle)] every SAMPLE_MS, where the stick was pushed, in thousandths """
+    rng = random.Random(seed)
+    positions = []
+
+    def hold(ms, steer, throttle):
+        positions.extend([(steer, throttle)] * (ms // SAMPLE_MS))
+
+    hold(2000, 0, 0)
+    # Throttle up to full over a second, then hold it
+    positions.extend((0, 1000 * step * SAMPLE_MS // 1000) for step in range(1000 // SAMPLE_MS))
+    hold(2000, 0, 1000)
+    # Weave at 0.5 Hz
+    positions.extend((int(600 * math.sin(math.pi * step * SAMPLE_MS / 1000)), 700)
+                     for step in range(3000 // SAMPLE_MS))
+    hold(2000, 0, 0)
+    # Flicks to new positions every 300 ms, the stick getting there in ~50 ms
+    steer = throttle = 0.0
+    for step in range(4000 // SAMPLE_MS):
+        if step % (300 // SAMPLE_MS) == 0:
+            target = (rng.randrange(-1000, 1001), rng.randrange(-1000, 1001))
+        steer += (target[0] - steer) * SAMPLE_MS / 50
+        throttle += (target[1] - throttle) * SAMPLE_MS / 50
+        positions.append((int(steer), int(throttle)))
+    hold(2000, 0, 0)
+    # Small corrections around a cruise
+    steer = 0.0
+    for step in range(4000 // SAMPLE_MS):
+        steer = max(-300.0, min(300.0, steer + rng.gauss(0, 15)))
+        positions.append((int(steer), 500))
+    return positions
+
+
+def stick_trace(seed=1):
+    """ Return [(raw, raw)] ADC readings for stick_positions(), with noise and an off-centre rest """
+    rng = random.Random(seed + 1)
+    return [tuple(min(65535, max(0, 32768 + value * 32767 // 1000 + offset + int(rng.gauss(0, NOISE))))
+                  for value, offset in zip(position, CENTRE_OFFSET))
+            for position in stick_positions(seed)]
+
+
+class Replay:
+    """ Stands in for an ADC, returning the trace one sample at a time """
+
+    def __init__(self):
+        self.value = 32768
+
+    def read_u16(self):
+        return self.value
+
+
+def readings(trace):
+    """ The remote's reading of every sample, deadband taken out, in thousandths """
+    scale = axes.AxisStream([]).scale
+    return [tuple(scale(raw) for raw in sample) for sample in trace]
+
+
+def raw_every_sample(trace):
+    """ Yield the update for every sample: seq, then each axis as raw int16 """
+    for seq, sample in enumerate(trace):
+        yield struct.pack("<Bhh", seq & 0xFF, *(raw - 32768 for raw in sample))
+
+
+def changed_absolute(trace):
+    """ Yield an update (seq, mask, int16 per changed axis) whenever a reading changes, else None """
+    last = None
+    seq = 0
+    for reading in readings(trace):
+        if reading == last:
+            yield None
+            continue
+        mask = 0
+        values = []
+        for index, value in enumerate(reading):
+            if last is None or value != last[index]:
+                mask |= 1 << index
+                values.append(value)
+        last = reading
+        yield struct.pack("<BB" + "h" * len(values), seq & 0xFF, mask, *values)
+        seq += 1
+
+
+def decode_raw(update, state):
+    scale = axes.AxisStream([]).scale
+    for index, value in enumerate(struct.unpack("<hh", update[1:])):
+        state[index] = scale(value + 32768)
+
+
+def decode_changed(update, state):
+    mask = update[1]
+    position = 2
+    for index in range(len(state)):
+        if mask >> index & 1:
+            state[index] = struct.unpack_from("<h", update, position)[0]
+            position += 2
+
+
+def axis_stream(trace, **kwargs):
+    """ Yield AxisStream's update for every sample, or None """
+    adcs = [Replay(), Replay()]
+    stream = axes.AxisStream(adcs, **kwargs)
+    for step, sample in enumerate(trace):
+        for adc, raw in zip(adcs, sample):
+            adc.value = raw
+        stream.sample()
+        update = stream.update(step * SAMPLE_MS)
+        yield None if update is None else bytes(update)
+
+
+def measure(updates, decode, trace, loss=0.0, seed=3):
+    """ Return (updates/s, payload bytes/s, air bytes/s, mean error, max error, ms out of step) """
+    rng = random.Random(seed)
+    wanted = readings(trace)
+    sent = size = 0
+    errors = []
+    out_of_step = 0
+    state = axes.AxisState(2) if decode is None else None
+    values = [0, 0]
+    for update, reading in zip(updates, wanted):
+        if update is not None:
+            sent += 1
+            size += len(update)
+            if rng.random() >= loss:
+                if decode is None:
+                    state.update(update)
+                else:
+                    decode(update, values)
+        if state is not None:
+            # Out of step the robot keeps the values it had
+            values = state.values
+            out_of_step += not state.synced
+        errors.extend(abs(value - want) for value, want in zip(values, reading))
+    seconds = len(trace) * SAMPLE_MS / 1000
+    return (sent / seconds, size / seconds, (size + sent * NOTIFY_OVERHEAD) / seconds,
+            sum(errors) / len(errors), max(errors), out_of_step * SAMPLE_MS)
+
+
+def end_to_end(trace):
+    """ Play the trace into remote.py's ADCs; return (remote module, robot motors, expected and actual speeds) """
+    expected = []
+    sides = []
+
+    def setup(sim):
+        remote = sim.scripts["remote"].module
+        remote.AXIS_PINS = AXIS_PINS
+        remote.axes = axes.AxisStream([remote.machine.ADC(pin) for pin in AXIS_PINS])
+        sides.extend(speed_motors(sim.scripts["robot_code"].module))
+
+    async def play():
+        await asyncio.sleep_ms(PLAY_AT_MS)
+        steer_adc, throttle_adc = machine.adc(AXIS_PINS[0]), machine.adc(AXIS_PINS[1])
+        scale = axes.AxisStream([]).scale
+        mix = mixer.Mixer().mix
+        for steer, throttle in trace:
+            steer_adc.drive(steer)
+            throttle_adc.drive(throttle)
+            steer, throttle = scale(steer), scale(throttle)
+            expected.append(mix(steer, throttle) if steer or throttle else (0, 0))
+            await asyncio.sleep_ms(SAMPLE_MS)
+        # Back to the centre
+        steer_adc.drive(32768)
+        throttle_adc.drive(32768)
+
+    motors = []
+
+    async def watch():
+        # Motor speeds half way between samples
+        await asyncio.sleep_ms(PLAY_AT_MS + SAMPLE_MS // 2)
+        left, right = sides
+        for _ in trace:
+            motors.append((round(left.speed() * 1000), round(right.speed() * 1000)))
+            await asyncio.sleep_ms(SAMPLE_MS)
+
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=1)
+    sim.run(PLAY_AT_MS + len(trace) * SAMPLE_MS + 2000, tasks=(play, watch), setup=setup)
+    remote = sim.scripts["remote"].module
+    return remote, sides, expected, motors
+
+
+def held_stick():
+    """ Hold full throttle for HOLD_MS; return ms the left motor was at 0 after first moving, and its speeds """
+    sides = []
+
+    def setup(sim):
+        remote = sim.scripts["remote"].module
+        remote.AXIS_PINS = AXIS_PINS
+        remote.axes = axes.AxisStream([remote.machine.ADC(pin) for pin in AXIS_PINS])
+        sides.extend(speed_motors(sim.scripts["robot_code"].module))
+
+    speeds = []
+
+    async def hold():
+        await asyncio.sleep_ms(PLAY_AT_MS)
+        throttle = machine.adc(AXIS_PINS[1])
+        throttle.drive(65535)
+        for _ in range(HOLD_MS):
+            await asyncio.sleep_ms(1)
+            speeds.append(sides[0].speed())
+        throttle.drive(32768)
+
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=1)
+    sim.run(PLAY_AT_MS + HOLD_MS + 1000, tasks=(hold,), setup=setup)
+    moving = [speed for speed in speeds[next(ms for ms, speed in enumerate(speeds) if speed):]]
+    return sum(1 for speed in moving if not speed), moving
+
+
+def main():
+    trace = stick_trace()
+    seconds = len(trace) * SAMPLE_MS / 1000
+    print(f"stick trace: 2 axes, {len(trace)} samples over {seconds:.0f} s, noise {NOISE} counts")
+    print(f"{'encoding':28} {'updates/s':>9} {'bytes/s':>8} {'air B/s':>8} {'mean err':>9} {'max err':>8}")
+    encodings = (
+        ("raw int16, every sample", raw_every_sample(trace), decode_raw),
+        ("changed axes, absolute", changed_absolute(trace), decode_changed),
+        ("AxisStream, no rate cap", axis_stream(trace, interval_ms=0), None),
+        ("AxisStream", axis_stream(trace), None),
+    )
+    for label, updates, decode in encodings:
+        rate, size, air, mean, worst, _ = measure(updates, decode, trace)
+        print(f"{label:28} {rate:9.1f} {size:8.0f} {air:8.0f} {mean:9.1f} {worst:8}")
+
+    print()
+    print("AxisStream with updates lost")
+    print(f"{'keyframe ms':>11} {'bytes/s':>8} {'loss':>6} {'mean err':>9} {'max err':>8} {'out of step':>12}")
+    for keyframe_ms in KEYFRAMES_MS:
+        size = measure(axis_stream(trace, keyframe_ms=keyframe_ms), None, trace)[1]
+        for loss in LOSSES:
+            _, _, _, mean, worst, out_ms = measure(axis_stream(trace, keyframe_ms=keyframe_ms), None, trace, loss)
+            print(f"{keyframe_ms:11} {size:8.0f} {loss:6.0%} {mean:9.1f} {worst:8} {out_ms / 1000:11.2f}s")
+
+    print()
+    remote, (left, right), expected, motors = end_to_end([tuple(sample) for sample in trace])
+    errors = [abs(got - want) for pair, wanted in zip(motors, expected) for got, want in zip(pair, wanted)]
+    notifications = remote.axis_characteristic.notifications
+    print(f"simulator, {INTERVAL_MS} ms connection interval: {remote.axes.stats()}")
+    print(f"  {notifications / seconds:.1f} notifications/s, {remote.axes.bytes / seconds:.0f} bytes/s, "
+          f"motor speed error mean {sum(errors) / len(errors):.1f} max {max(errors)} thousandths, "
+          f"stopped at the end: {left.speed() == right.speed() == 0}")
+
+    stopped_ms, moving = held_stick()
+    print(f"full throttle held {HOLD_MS} ms: {stopped_ms} ms stopped after first moving, "
+          f"slowest {min(moving) * 1000:.0f} thousandths")
+    if stopped_ms:
+        raise AssertionError("the motors stopped while the stick was held")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Benchmark: pin IRQ ring buffer vs the 10 ms Button.read() polling loop
+# Runs under CPython against the simulated machine.Pin in sim/
+#
+#   python benchmarks/bench_button_events.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import uasyncio as asyncio  # noqa: E402
+from pimoroni import Button  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+from button_events import ButtonEvents  # noqa: E402
+
+PRESSES = 40
+SEED = 1
+
+
+def press_script():
+    """ A repeatable list of (button, hold_ms, gap_ms) """
+    rng = random.Random(SEED)
+    return [(rng.randrange(4), rng.randint(30, 120), rng.randint(20, 80)) for _ in range(PRESSES)]
+
+
+async def drive(pins, script, pressed_at):
+    for button, hold_ms, gap_ms in script:
+        await asyncio.sleep_ms(gap_ms)
+        pressed_at.append((button, ticks_us()))
+        pins[button].drive(0)
+        await asyncio.sleep_ms(hold_ms)
+        pins[button].drive(1)
+    await asyncio.sleep_ms(50)
+
+
+async def polling_consumer(buttons, notified, stats):
+    """ The original remote_task loop """
+    while True:
+        stats["wakeups"] += 1
+        for index, button in enumerate(buttons):
+            if button.read():
+                notified.append((index, ticks_us()))
+                break
+        await asyncio.sleep_ms(10)
+
+
+async def irq_consumer(events, notified, stats):
+    """ The interrupt driven remote_task loop """
+    while True:
+        await events.wait(200 if events.state else None)
+        stats["wakeups"] += 1
+        while events.any():
+            button, pressed, _ = events.pop()
+            if pressed:
+                notified.append((button, ticks_us()))
+
+
+def latencies(pressed_at, notified):
+    """ Match each press with the first notify for that button after it """
+    result = []
+    for button, start in pressed_at:
+        for index, time in notified:
+            if index == button and ticks_diff(time, start) >= 0:
+                result.append(ticks_diff(time, start))
+                break
+    return result
+
+
+async def run(mode, script):
+    buttons = [Button(pin) for pin in range(4)]
+    pins = [button.pin for button in buttons]
+    pressed_at, notified = [], []
+    stats = {"wakeups": 0}
+    if mode == "polling":
+        consumer = polling_consumer(buttons, notified, stats)
+    else:
+        consumer = irq_consumer(ButtonEvents(pins), notified, stats)
+    task = asyncio.create_task(consumer)
+    start = ticks_us()
+    await drive(pins, script, pressed_at)
+    # One idle second shows the cost of nobody touching the remote
+    idle_wakeups = stats["wakeups"]
+    await asyncio.sleep_ms(1000)
+    idle_wakeups = stats["wakeups"] - idle_wakeups
+    elapsed = ticks_diff(ticks_us(), start) / 1_000_000
+    task.cancel()
+    return latencies(pressed_at, notified), stats["wakeups"] / elapsed, idle_wakeups
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    script = press_script()
+    print(f"{'mode':8} {'presses':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'wake/s':>7} {'idle/s':>7}")
+    for mode in ("polling", "irq"):
+        result, wakeups, idle = asyncio.run(run(mode, script))
+        print(f"{mode:8} {len(result):7} {percentile(result, 50):8} {percentile(result, 99):8} "
+              f"{max(result):8} {wakeups:7.1f} {idle:7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Benchmark: bouncy buttons through ButtonEvents with and without debounce,
+# and a classic counting debounce sampled every millisecond
+# The 11 gamepad pins from button_test.py are pressed in virtual time; each
+# press and release chatters a few times before it settles, and now and
+# then for longer than the hold-off.
+#
+#   python benchmarks/bench_debounce.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import machine  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+from button_events import ButtonEvents  # noqa: E402
+from debounce import DEBOUNCE_US  # noqa: E402
+from simulator import run_virtual  # noqa: E402
+
+GAMEPAD_PINS = (6, 7, 4, 5, 8, 9, 2, 3, 10, 11, 12)
+
+PRESSES = 300
+SEED = 4
+
+# Hold-off for each ButtonEvents mode; 10 ms is the default
+HOLDOFFS = {"raw irq": 0, "5 ms": 5_000, "10 ms": DEBOUNCE_US}
+
+# A counting debounce needs this many equal 1 ms samples before it changes
+INTEGRATOR_SAMPLES = 5
+
+
+def bounce(rng):
+    """ Gaps in us between the chatter toggles of one edge, an even count """
+    toggles = rng.choice((0, 0, 2, 2, 4, 6, 8))
+    spread = 4_000 if rng.random() < 0.9 else 9_000
+    return [rng.randint(30, spread // max(1, toggles)) for _ in range(toggles)]
+
+
+def press_script():
+    """ A repeatable list of (button, press chatter, hold_us, release chatter, gap_us) """
+    rng = random.Random(SEED)
+    return [(rng.randrange(len(GAMEPAD_PINS)), bounce(rng), rng.randint(30_000, 300_000), bounce(rng),
+             rng.randint(20_000, 200_000)) for _ in range(PRESSES)]
+
+
+async def sleep_us(us):
+    await asyncio.sleep(us / 1_000_000)
+
+
+async def edge(pin, level, chatter):
+    """ Move a pin to level, bouncing on the way; return when it first moved """
+    start = ticks_us()
+    pin.drive(level)
+    for gap in chatter:
+        await sleep_us(gap)
+        pin.drive(1 - pin.value())
+    return start
+
+
+async def drive(pins, script, truth):
+    for button, press_chatter, hold_us, release_chatter, gap_us in script:
+        await sleep_us(gap_us)
+        pressed = await edge(pins[button], 0, press_chatter)
+        await sleep_us(hold_us)
+        released = await edge(pins[button], 1, release_chatter)
+        truth.append((button, pressed, released))
+    await sleep_us(50_000)
+
+
+async def irq_consumer(events, seen):
+    while True:
+        await events.wait()
+        while events.any():
+            button, pressed, time = events.pop()
+            seen.append((button, pressed, time, ticks_us()))
+
+
+async def integrator_consumer(pins, seen):
+    """ Sample every pin each millisecond and count towards the reading """
+    counts = bytearray(len(pins))
+    state = 0
+    while True:
+        now = ticks_us()
+        for index, pin in enumerate(pins):
+            bit = 1 << index
+            pressed = pin.value() == 0
+            if pressed != bool(state & bit):
+                counts[index] += 1
+                if counts[index] >= INTEGRATOR_SAMPLES:
+                    state ^= bit
+                    counts[index] = 0
+                    seen.append((index, pressed, now, now))
+            else:
+                counts[index] = 0
+        await asyncio.sleep_ms(1)
+
+
+async def run(mode):
+    pins = [machine.Pin(pin, machine.Pin.IN, machine.Pin.PULL_UP) for pin in GAMEPAD_PINS]
+    truth, seen = [], []
+    events = None
+    if mode == "integrator":
+        consumer = asyncio.create_task(integrator_consumer(pins, seen))
+    else:
+        events = ButtonEvents(pins, debounce_us=HOLDOFFS[mode])
+        consumer = asyncio.create_task(irq_consumer(events, seen))
+    await drive(pins, press_script(), truth)
+    consumer.cancel()
+    return truth, seen, events
+
+
+def score(truth, seen):
+    """ (spurious edges, missed presses, stamp latencies us, delivery latencies us) """
+    stamps, delivered = [], []
+    missed = 0
+    for button, pressed, released in truth:
+        match = None
+        for entry in seen:
+            if entry[0] == button and entry[1] and 0 <= ticks_diff(entry[2], pressed) < ticks_diff(released, pressed):
+                match = entry
+                break
+        if match is None:
+            missed += 1
+            continue
+        stamps.append(ticks_diff(match[2], pressed))
+        delivered.append(ticks_diff(match[3], pressed))
+    spurious = max(0, len(seen) - 2 * len(truth))
+    return spurious, missed, sorted(stamps), sorted(delivered)
+
+
+def main():
+    print(f"{PRESSES} presses on {len(GAMEPAD_PINS)} pins")
+    print(f"{'mode':12} {'edges':>6} {'spurious':>9} {'missed':>7} {'stamp p50/max us':>17} "
+          f"{'seen p50/max us':>16} {'bounces':>8}")
+    for mode in ("raw irq", "5 ms", "10 ms", "integrator"):
+        truth, seen, events = run_virtual(run(mode))
+        spurious, missed, stamps, delivered = score(truth, seen)
+        bounces = events.debouncer.bounces if events else "-"
+        print(f"{mode:12} {len(seen):6} {spurious:9} {missed:7} "
+              f"{stamps[len(stamps) // 2]:>8}/{stamps[-1]:<8} {delivered[len(delivered) // 2]:>7}/{delivered[-1]:<8} "
+              f"{bounces:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# Benchmark: stress test of the core 0 / core 1 handoff, with CPython threads
+# standing in for the two cores
+# CoreRing is hammered by a producer and a consumer thread, and every
+# record is checked for loss, duplication, reordering and tearing. The racy
+# runs let the other thread in at every shared read and write, and two
+# deliberately broken rings show the checks catch those bugs. Then
+# InputCore and MotorCore run their core 1 loops in a real thread against
+# the stand-in pins and Burgerbot, and MotorCore once more with a
+# VelocityLoop, ticked on core 1, in front of motor.Motor stand-ins.
+#
+#   python benchmarks/bench_dual_core.py
+
+import _thread
+import array
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import motion  # noqa: E402
+from burgerbot import Burgerbot  # noqa: E402
+from core_ring import CoreRing  # noqa: E402
+from dual_core import InputCore, MotorCore  # noqa: E402
+from gpio_bank import RegisterBank  # noqa: E402
+from motor import Motor, pico_motor_shim  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+from velocity import VelocityLoop  # noqa: E402
+from wheels import Wheels  # noqa: E402
+
+RECORDS = 200_000
+RACY_RECORDS = 20_000
+RACY_RING_SIZE = 2
+STALL_S = 0.5
+
+BUTTON_PINS = (0, 1, 2, 3)
+PRESSES = 150
+
+# Bursts of commands, each up to 1 ms apart - faster than any BLE stream
+BURSTS = 200
+BURST_GAP_S = 0.001
+MOTORS = {motion.STOP: (0, 0), motion.FORWARD: (1, 1), motion.BACKWARD: (-1, -1),
+          motion.LEFT: (-1, 1), motion.RIGHT: (1, -1)}
+# Drives with the velocity loop, each long enough to ramp full forward to full reverse
+DRIVES = 20
+DRIVE_S = 0.5
+
+
+class EarlyPublishRing(CoreRing):
+    """ Broken: moves the write index before the record is written """
+
+    def put(self, code, value):
+        index = self._index
+        head = index[0]
+        next_head = (head + 1) & self._mask
+        if next_head == index[1]:
+            self.dropped += 1
+            return False
+        index[0] = next_head
+        self._codes[head] = code
+        self._values[head] = value
+        return True
+
+
+class SharedCountRing(CoreRing):
+    """ Broken: both sides update one shared fill count, so updates get lost """
+
+    def __init__(self, size):
+        super().__init__(size)
+        self._size = size
+        # Write index, read index, then the count
+        self._index = array.array("L", [0, 0, 0])
+
+    def put(self, code, value):
+        index = self._index
+        if index[2] == self._size:
+            self.dropped += 1
+            return False
+        head = index[0]
+        self._codes[head] = code
+        self._values[head] = value
+        index[0] = (head + 1) & self._mask
+        index[2] = index[2] + 1
+        return True
+
+    def get(self):
+        index = self._index
+        if index[2] == 0:
+            return None
+        tail = index[1]
+        record = self._codes[tail], self._values[tail]
+        index[1] = (tail + 1) & self._mask
+        index[2] = index[2] - 1
+        return record
+
+
+class RacyArray:
+    """ Wraps a ring's storage so the other thread can run at every access
+
+    On the device both cores run at once, so a bug window a few
+    instructions wide is enough. Under the GIL a thread only switches at
+    calls, so each read and write here yields first to stand in for that.
+    """
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getitem__(self, index):
+        time.sleep(0)
+        return self._wrapped[index]
+
+    def __setitem__(self, index, value):
+        time.sleep(0)
+        self._wrapped[index] = value
+
+
+def racy(ring):
+    ring._codes = RacyArray(ring._codes)
+    ring._values = RacyArray(ring._values)
+    ring._index = RacyArray(ring._index)
+    return ring
+
+
+def run_threads(producer, consumer):
+    """ Run producer on a second thread and consumer on this one """
+    done = _thread.allocate_lock()
+    done.acquire()
+
+    def wrapper():
+        producer()
+        done.release()
+
+    _thread.start_new_thread(wrapper, ())
+    result = consumer()
+    done.acquire()
+    return result
+
+
+def handoff(ring, records, wait_when_full):
+    """ Pass records through the ring; return (seconds, received, errors)
+
+    A record that never arrives counts as an error; either side gives up
+    after STALL_S without progress, as a ring that lost track of its
+    records can stay full or empty for ever.
+    """
+    done = [False]
+
+    def producer():
+        for value in range(records):
+            stalled = time.perf_counter() + STALL_S
+            while not ring.put(value & 0xFF, value):
+                if not wait_when_full or time.perf_counter() > stalled:
+                    break
+                # Let the consumer run, as core 1 would get on with its loop
+                time.sleep(0)
+        done[0] = True
+
+    def consumer():
+        received = errors = 0
+        last = -1
+        finished = False
+        stalled = time.perf_counter() + STALL_S
+        while last != records - 1 and time.perf_counter() < stalled:
+            record = ring.get()
+            if record is None:
+                if finished:
+                    break
+                # One more look once the producer is done
+                finished = done[0]
+                time.sleep(0)
+                continue
+            stalled = time.perf_counter() + STALL_S
+            code, value = record
+            received += 1
+            # In order, no duplicates, nothing missing unless it was dropped,
+            # and the code belongs to the value
+            if code != value & 0xFF or value <= last or (wait_when_full and value != last + 1):
+                errors += 1
+            last = value
+        return received, errors
+
+    start = time.perf_counter()
+    received, errors = run_threads(producer, consumer)
+    seconds = time.perf_counter() - start
+    # Refused puts are retried when the producer waits, so only count them
+    # as accounted for when it drops
+    missing = records - received - (0 if wait_when_full else ring.dropped)
+    return seconds, received, errors + max(0, missing)
+
+
+def ring_checks():
+    print(f"{'ring':26} {'when full':10} {'records/s':>10} {'received':>9} {'refused':>8} {'errors':>7}")
+    for mode, wait_when_full in (("wait", True), ("drop", False)):
+        ring = CoreRing()
+        seconds, received, errors = handoff(ring, RECORDS, wait_when_full)
+        print(f"{'CoreRing':26} {mode:10} {RECORDS / seconds:10.0f} {received:9} {ring.dropped:8} {errors:7}")
+    for name, ring_class in (("CoreRing", CoreRing), ("early publish", EarlyPublishRing),
+                             ("shared count", SharedCountRing)):
+        for mode, wait_when_full in (("wait", True), ("drop", False)):
+            # A small ring is full most of the time, so slots are reused
+            # while the other side may still be at them
+            ring = racy(ring_class(RACY_RING_SIZE))
+            seconds, received, errors = handoff(ring, RACY_RECORDS, wait_when_full)
+            print(f"{name + ', racy':26} {mode:10} {RACY_RECORDS / seconds:10.0f} {received:9} "
+                  f"{ring.dropped:8} {errors:7}")
+
+
+async def input_core():
+    """ Press buttons from a thread while InputCore scans in another """
+    bank = RegisterBank(BUTTON_PINS)
+    events = InputCore(bank)
+    rng = random.Random(3)
+    presses = []
+
+    def driver():
+        for _ in range(PRESSES):
+            button = rng.randrange(len(BUTTON_PINS))
+            time.sleep(rng.uniform(0.015, 0.04))
+            presses.append((button, ticks_us()))
+            bank.pins[button].drive(0)
+            time.sleep(rng.uniform(0.015, 0.04))
+            bank.pins[button].drive(1)
+
+    events.start()
+    _thread.start_new_thread(driver, ())
+    seen = []
+    while len(seen) < PRESSES:
+        if not await events.wait(2000):
+            break
+        while events.any():
+            button, pressed, stamp = events.pop()
+            if pressed:
+                seen.append((button, stamp, ticks_us()))
+    events.stop()
+    matched = [(ticks_diff(stamp, at), ticks_diff(now, at)) for (button, at), (seen_button, stamp, now)
+               in zip(presses, seen) if button == seen_button]
+    stamps = sorted(stamp for stamp, _ in matched)
+    delivered = sorted(now for _, now in matched)
+    print(f"InputCore: {len(seen)}/{PRESSES} presses, {len(matched)} in order, {events.dropped} dropped, "
+          f"{events.scans} scans")
+    print(f"  stamp p50/max {stamps[len(stamps) // 2]}/{stamps[-1]} us, "
+          f"delivered p50/max {delivered[len(delivered) // 2]}/{delivered[-1]} us")
+
+
+async def motor_core():
+    """ Fire bursts of commands at MotorCore and check core 1 ends up running the last one """
+    bot = Burgerbot()
+    executor = MotorCore(bot)
+    await executor.run()
+    rng = random.Random(4)
+    wrong = 0
+    for _ in range(BURSTS):
+        for _ in range(rng.randint(1, 30)):
+            command = rng.choice((motion.FORWARD, motion.BACKWARD, motion.LEFT, motion.RIGHT))
+            executor.submit(command)
+            await asyncio.sleep(rng.uniform(0, BURST_GAP_S))
+        await asyncio.sleep(0.02)
+        if (bot.left, bot.right) != MOTORS[command]:
+            wrong += 1
+    await asyncio.sleep(motion.PULSE_MS / 1000 + 0.02)
+    stopped = (bot.left, bot.right) == (0, 0)
+    executor.running = False
+    print(f"MotorCore: {BURSTS} bursts, {wrong} ended on the wrong command, stopped after the pulse: {stopped}")
+    print(f"  submitted {executor.submitted}, executed {executor.executed}, coalesced {executor.coalesced}, "
+          f"dropped {executor.dropped}, max depth {executor.max_depth}, max age {executor.max_age_us} us")
+
+
+async def ramped_motor_core():
+    """ Drive MotorCore with a VelocityLoop and check core 1 ramps to each drive, and halts at once """
+    left, right = Motor(pico_motor_shim.MOTOR_1), Motor(pico_motor_shim.MOTOR_2)
+    loop = VelocityLoop(Wheels(Burgerbot(), left, right))
+    executor = MotorCore(loop)
+    await executor.run()
+    rng = random.Random(5)
+    wrong = 0
+    moved = 0
+    for _ in range(DRIVES):
+        speeds = (rng.randrange(-1000, 1001, 50), rng.randrange(-1000, 1001, 50))
+        executor.drive(*speeds)
+        await asyncio.sleep(DRIVE_S)
+        if (round(left.speed() * 1000), round(right.speed() * 1000)) != speeds:
+            wrong += 1
+        # Halted while a new drive is queued behind it
+        executor.drive(1000, 1000)
+        executor.stop()
+        await asyncio.sleep(0.005)
+        changes = len(left.log) + len(right.log)
+        await asyncio.sleep(0.05)
+        if left.speed() or right.speed() or len(left.log) + len(right.log) != changes:
+            moved += 1
+    executor.running = False
+    await asyncio.sleep(0.01)
+    print(f"MotorCore with a VelocityLoop: {DRIVES} drives, {wrong} not reached in {DRIVE_S * 1000:.0f} ms, "
+          f"{moved} moved after a halt")
+    print(f"  {loop.stats()}")
+
+
+def main():
+    ring_checks()
+    asyncio.run(input_core())
+    asyncio.run(motor_core())
+    asyncio.run(ramped_motor_core())
+
+
+if __name__ == "__main__":
+    main()
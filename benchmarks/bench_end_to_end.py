@@ -0,0 +1,281 @@
+# Benchmark suite: the remote -> robot path, end to end
+# Runs remote.py against robot_code.py in the simulator and measures
+#   - latency per stage of a button press: press -> notify -> deliver ->
+#     dispatch (the robot's frame handler) -> motor
+#   - the highest command rate the robot's notified() loop keeps up with
+#   - reconnect time after the link drops
+# Host CPU time counts towards the simulated clock (CPU_SCALE), so the
+# cost of the code shows up next to the link delays. Results are written
+# as JSON, to benchmarks/bench_end_to_end.json unless --output says where;
+# pass an older file with --baseline to see what changed.
+#
+#   python benchmarks/bench_end_to_end.py [--output FILE] [--baseline FILE]
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+import protocol  # noqa: E402
+from simulator import Simulation, drives  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+
+# Host seconds per simulated second of running code
+CPU_SCALE = 1.0
+
+# Buttons A, B, X and Y and the motors (left, right) each one should drive
+MOTORS = {0: (1, 1), 1: (-1, -1), 2: (-1, 1), 3: (1, -1)}
+
+PRESSES = 100
+FIRST_PRESS_MS = 3000
+PRESS_GAP_MS = 400
+
+# Commands per second to try, how long for, and the share that has to reach
+# the handler to count as kept up with
+RATES = (10, 25, 50, 75, 100, 133, 200, 400)
+RATE_MS = 2000
+SUSTAINED = 0.99
+FLOOD_SEQ = 0x1000
+
+DROPS = 6
+DROP_GAP_MS = 3000
+KEEPALIVE_MS = 10
+
+STAGES = ("press_to_notify", "notify_to_deliver", "deliver_to_dispatch", "dispatch_to_motor", "press_to_motor")
+
+
+def percentiles(values):
+    """ p50, p90, p99 and max in ms, from a list of us """
+    values = sorted(values)
+    if not values:
+        return None
+
+    def pick(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))] / 1000, 3)
+
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": round(values[-1] / 1000, 3)}
+
+
+def hook_dispatch(dispatches):
+    """ Setup function that timestamps every frame reaching the robot's handler """
+
+    def setup(sim):
+        robot = sim.scripts["robot_code"].module
+        handler = robot.on_control_frame
+
+        def on_control_frame(frame):
+            dispatches.append((ticks_us(), protocol.frame_seq(frame)))
+            handler(frame)
+
+        robot.on_control_frame = on_control_frame
+
+    return setup
+
+
+async def wait_connected(sim):
+    """ Wait for the remote to be connected, the robot to have subscribed and
+    the remote to have sent its first frame """
+    remote = sim.scripts["remote"].module
+    while not remote.connected:
+        await asyncio.sleep_ms(10)
+    await asyncio.sleep_ms(1000)
+    while not remote.schedule.changes:
+        await asyncio.sleep_ms(10)
+    await asyncio.sleep_ms(100)
+    return remote
+
+
+def first(items, condition):
+    for item in items:
+        if condition(item):
+            return item
+    return None
+
+
+def press_latencies():
+    sim = Simulation(SCRIPTS, seed=1, cpu_scale=CPU_SCALE)
+    rng = random.Random(2)
+    at_ms = FIRST_PRESS_MS
+    for index in range(PRESSES):
+        at_ms += PRESS_GAP_MS + rng.randrange(-100, 100)
+        sim.press(index % 4, at_ms, rng.randrange(120, 200))
+    dispatches = []
+    sim.run(at_ms + 2 * PRESS_GAP_MS, setup=hook_dispatch(dispatches))
+    log = sim.scripts["robot_code"].module.bot.log
+    stages = {name: [] for name in STAGES}
+    missed = 0
+    for pin, pressed, released in sim.presses:
+        bit = 1 << pin
+        notify = first(sim.trace, lambda entry: entry[1] == "notify" and ticks_diff(entry[0], pressed) >= 0
+                       and protocol.decode(entry[2])[1] & bit)
+        if notify is None:
+            missed += 1
+            continue
+        seq = protocol.frame_seq(notify[2])
+        deliver = first(sim.trace, lambda entry: entry[1] == "deliver" and protocol.frame_seq(entry[2]) == seq)
+        dispatch = first(dispatches, lambda entry: entry[1] == seq)
+        if deliver is None or dispatch is None:
+            missed += 1
+            continue
+        motor = first(log, lambda entry: ticks_diff(entry[0], dispatch[0]) >= 0 and drives(*entry[1:], MOTORS[pin]))
+        if motor is None:
+            missed += 1
+            continue
+        stages["press_to_notify"].append(ticks_diff(notify[0], pressed))
+        stages["notify_to_deliver"].append(ticks_diff(deliver[0], notify[0]))
+        stages["deliver_to_dispatch"].append(ticks_diff(dispatch[0], deliver[0]))
+        stages["dispatch_to_motor"].append(ticks_diff(motor[0], dispatch[0]))
+        stages["press_to_motor"].append(ticks_diff(motor[0], pressed))
+    result = {name: percentiles(values) for name, values in stages.items()}
+    result["presses"] = len(sim.presses)
+    result["missed"] = missed
+    return result
+
+
+def rate_before(rate):
+    """ The rate tried before this one, 0 for the first """
+    index = RATES.index(rate)
+    return RATES[index - 1] if index else 0
+
+
+def command_rate(rate):
+    """ Flood the robot through the remote's connection; return (sent, dispatched) """
+    sim = Simulation(SCRIPTS, seed=1, cpu_scale=CPU_SCALE)
+    dispatches = []
+    sent = []
+
+    started = []
+
+    async def flood():
+        remote = await wait_connected(sim)
+        # Keep the remote's own keepalives out of the way
+        remote.schedule.keepalive_ms = 10 * RATE_MS
+        started.append(ticks_us())
+        period = 1 / rate
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        for index in range(rate * RATE_MS // 1000):
+            # Sequence numbers carry on after the frames the remote sent itself
+            seq = FLOOD_SEQ + index
+            remote.centrals.notify(remote.button_characteristic, protocol.CHANNEL_FRAMES,
+                                   protocol.encode(protocol.BUTTON_A, seq))
+            sent.append(seq)
+            await asyncio.sleep(start + (index + 1) * period - loop.time())
+
+    sim.run(RATE_MS + 5000, tasks=(flood,), setup=hook_dispatch(dispatches))
+    handled = [entry for entry in dispatches if ticks_diff(entry[0], started[0]) >= 0]
+    return len(sent), len(handled)
+
+
+def reconnect_times():
+    """ Drop the link a few times while the remote keeps sending; time until frames flow again """
+    sim = Simulation(SCRIPTS, seed=1, cpu_scale=CPU_SCALE)
+    dispatches = []
+    drops = []
+
+    async def keepalive():
+        remote = await wait_connected(sim)
+        seq = 0
+        while True:
+            if remote.connected:
+                remote.centrals.notify(remote.button_characteristic, protocol.CHANNEL_FRAMES, protocol.encode(0, seq))
+                seq += 1
+            await asyncio.sleep_ms(KEEPALIVE_MS)
+
+    async def dropper():
+        await wait_connected(sim)
+        for _ in range(DROPS):
+            await asyncio.sleep_ms(DROP_GAP_MS)
+            drops.append(ticks_us())
+            for link in aioble.links():
+                link.close()
+
+    sim.run(FIRST_PRESS_MS + (DROPS + 1) * DROP_GAP_MS, tasks=(keepalive, dropper), setup=hook_dispatch(dispatches))
+    times = []
+    for dropped in drops:
+        resumed = first(dispatches, lambda entry: ticks_diff(entry[0], dropped) > 0)
+        if resumed:
+            times.append(ticks_diff(resumed[0], dropped))
+    source = sim.scripts["robot_code"].module.peers.last_source
+    return times, source
+
+
+def commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """ Print the change in each figure against an older results file """
+    print(f"\nagainst {baseline.get('commit')}:")
+    for name in STAGES:
+        old, new = baseline["latency"].get(name), results["latency"][name]
+        if old and new:
+            print(f"  {name:20} p50 {new['p50'] - old['p50']:+8.3f} ms  p99 {new['p99'] - old['p99']:+8.3f} ms")
+    print(f"  max sustained rate   {results['max_sustained_rate'] - baseline['max_sustained_rate']:+d} /s")
+    old, new = baseline["reconnect_ms"], results["reconnect_ms"]
+    if old and new:
+        print(f"  reconnect            p50 {new['p50'] - old['p50']:+8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "bench_end_to_end.json"))
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    latency = press_latencies()
+    print(f"{latency['presses']} presses, {latency['missed']} missed")
+    print(f"{'stage':20} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name in STAGES:
+        row = latency[name]
+        print(f"{name:20} {row['p50']:8.3f} {row['p90']:8.3f} {row['p99']:8.3f} {row['max']:8.3f}")
+
+    rates = []
+    max_rate = 0
+    print(f"\n{'commands/s':>10} {'sent':>6} {'handled':>8}")
+    for rate in RATES:
+        sent, dispatched = command_rate(rate)
+        rates.append({"rate": rate, "sent": sent, "dispatched": dispatched})
+        print(f"{rate:10} {sent:6} {dispatched:8}")
+        if dispatched >= sent * SUSTAINED and max_rate == rate_before(rate):
+            max_rate = rate
+    print(f"max sustained rate: {max_rate} commands/s")
+
+    times, source = reconnect_times()
+    reconnect = percentiles(times)
+    print(f"\nreconnect after {len(times)} drops (last via {source}): "
+          f"p50 {reconnect['p50']:.1f} ms, max {reconnect['max']:.1f} ms")
+
+    results = {
+        "commit": commit(),
+        "cpu_scale": CPU_SCALE,
+        "latency": latency,
+        "rates": rates,
+        "max_sustained_rate": max_rate,
+        "reconnect_ms": reconnect,
+        "reconnect_samples_ms": [round(time / 1000, 3) for time in times],
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nwrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
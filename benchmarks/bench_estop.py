@@ -0,0 +1,183 @@
+# Benchmark: time to stop under a saturated command stream
+# remote.py and robot_code.py run in the simulator with the remote's
+# autorepeat at 1 ms, so while A is held a frame goes out every ms, tens of
+# them per connection event, far more than the robot reads (the robot only
+# gets the newest frame on the button characteristic). In each trial A is
+# held to drive at full speed, then the robot is stopped one of two ways,
+# at a random point in the connection interval:
+#
+#   let go      A is released: the release frame goes out in the stream and
+#               the motors stop, or ramp down with RAMP on
+#   stop chord  X then Y are pressed with A still held: the stop goes out on
+#               its own characteristic and the robot halts
+#
+# Time to stop runs from the release or the Y press until the Burgerbot is
+# told (0, 0), with and without packet loss.
+#
+# Then the remote hangs while the joystick holds full throttle: it stays
+# connected but sends nothing more. Time to stop runs from the hang, with
+# the deadman and with it switched off, where only the executor's DRIVE_MS
+# and then the link timeout are left to stop the robot.
+#
+#   python benchmarks/bench_estop.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import machine  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+import utime  # noqa: E402
+from simulator import Simulation  # noqa: E402
+
+import axes  # noqa: E402
+from send_schedule import SendSchedule  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+INTERVAL_MS = 15
+LOSSES = (0.0, 0.05)
+TRIALS = 40
+START_MS = 3000
+CYCLE_MS = 1500
+# When in each cycle the robot is stopped, give or take a connection interval
+STOP_AT_MS = 600
+HANG_TRIALS = 10
+HANG_CYCLE_MS = 6000
+AXIS_PINS = (26, 27)
+
+PIN_A, PIN_X, PIN_Y = 0, 2, 3
+
+
+def flood(sim):
+    """ Hook the remote to repeat held buttons every ms """
+    remote = sim.scripts["remote"].module
+    remote.schedule = SendSchedule(1, remote.KEEPALIVE_MS)
+
+
+def stop_times(bot, stops):
+    """ ms from each stop to the first time the Burgerbot was told (0, 0) after it; None if it never was """
+    times = []
+    for stopped in stops:
+        time = None
+        for when, left, right in bot.log:
+            if utime.ticks_diff(when, stopped) >= 0 and left == 0 and right == 0:
+                time = utime.ticks_diff(when, stopped) / 1000
+                break
+        times.append(time)
+    return times
+
+
+def stop_trials(method, loss, seed=1):
+    """ Return (stop times in ms, frames sent per second while driving, robot module) """
+    rng = random.Random(seed)
+    stops = []
+    moving = []
+
+    async def trials():
+        await asyncio.sleep_ms(START_MS)
+        a, x, y = machine.pin(PIN_A), machine.pin(PIN_X), machine.pin(PIN_Y)
+        bot = sim.scripts["robot_code"].module.bot
+        for _ in range(TRIALS):
+            a.drive(0)
+            await asyncio.sleep_ms(STOP_AT_MS - 20 + rng.randrange(INTERVAL_MS))
+            moving.append(bot.left == bot.right == 1.0)
+            if method == "let go":
+                stops.append(utime.ticks_us())
+                a.drive(1)
+            else:
+                x.drive(0)
+                await asyncio.sleep_ms(20)
+                stops.append(utime.ticks_us())
+                y.drive(0)
+            await asyncio.sleep_ms(300)
+            for pin in (a, x, y):
+                pin.drive(1)
+            await asyncio.sleep_ms(CYCLE_MS - STOP_AT_MS - 300)
+
+    sim = Simulation(SCRIPTS, INTERVAL_MS, packet_loss=loss, seed=seed)
+    sim.run(START_MS + TRIALS * CYCLE_MS + 500, tasks=(trials,), setup=flood)
+    if not all(moving):
+        raise AssertionError("the robot was not at full speed when it was stopped")
+    remote = sim.scripts["remote"].module
+    robot = sim.scripts["robot_code"].module
+    rate = remote.button_characteristic.notifications / (TRIALS * STOP_AT_MS / 1000)
+    return stop_times(robot.bot, stops), rate, robot
+
+
+def hang_trials(deadman, seed=1):
+    """ Return (stop times in ms, robot module) for a remote that hangs with the joystick at full throttle """
+    hangs = []
+
+    def setup(sim):
+        remote = sim.scripts["remote"].module
+        remote.AXIS_PINS = AXIS_PINS
+        remote.axes = axes.AxisStream([remote.machine.ADC(pin) for pin in AXIS_PINS])
+        if not deadman:
+            sim.scripts["robot_code"].module.deadman.halt = lambda: False
+
+    async def trials():
+        await asyncio.sleep_ms(START_MS)
+        remote = sim.scripts["remote"].module
+        throttle = machine.adc(AXIS_PINS[1])
+        characteristics = (remote.button_characteristic, remote.axis_characteristic)
+        notifies = [characteristic.notify for characteristic in characteristics]
+        for trial in range(HANG_TRIALS):
+            throttle.drive(65535)
+            await asyncio.sleep_ms(STOP_AT_MS + 37 * trial % 500)
+            hangs.append(utime.ticks_us())
+            for characteristic in characteristics:
+                characteristic.notify = lambda connection, data=None: None
+            # Back before the link times out
+            await asyncio.sleep_ms(2500)
+            throttle.drive(32768)
+            for characteristic, notify in zip(characteristics, notifies):
+                characteristic.notify = notify
+            await asyncio.sleep_ms(HANG_CYCLE_MS - STOP_AT_MS - 37 * trial % 500 - 2500)
+
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=seed)
+    sim.run(START_MS + HANG_TRIALS * HANG_CYCLE_MS + 500, tasks=(trials,), setup=setup)
+    robot = sim.scripts["robot_code"].module
+    return stop_times(robot.bot, hangs), robot
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def row(label, times):
+    stopped = [time for time in times if time is not None]
+    missed = len(times) - len(stopped)
+    print(f"{label:28} {percentile(stopped, 0.5):8.1f} {percentile(stopped, 0.99):8.1f} {max(stopped):8.1f} "
+          f"{missed:7}")
+
+
+def main():
+    print(f"{TRIALS} stops from full speed each, {INTERVAL_MS} ms connection interval, frames every ms")
+    print(f"{'stop':28} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'missed':>7}")
+    for loss in LOSSES:
+        for method in ("let go", "stop chord"):
+            times, rate, robot = stop_trials(method, loss)
+            row(f"{method}, {loss:.0%} loss", times)
+            if method == "let go" and not loss:
+                # A is only held until it is let go
+                sent = rate
+    print(f"({sent:.0f} frames/s sent while driving)")
+
+    print()
+    print(f"remote hangs {HANG_TRIALS} times with the joystick at full throttle, deadman {robot.DEADMAN_MS} ms, "
+          f"DRIVE_MS {robot.motion.DRIVE_MS} ms, link timeout {robot.LINK_TIMEOUT_MS} ms")
+    print(f"{'stop':28} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'missed':>7}")
+    for deadman in (True, False):
+        times, robot = hang_trials(deadman)
+        row("deadman" if deadman else "no deadman", times)
+        if deadman:
+            stats = robot.deadman.stats()
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Benchmark: event trace cost, and the trace of a simulated drive session
+# record() is timed with the trace off and on. Then remote.py and
+# robot_code.py run in the simulator with TRACE on while buttons are
+# pressed, both traces are dumped the way they are over serial, and the
+# robot's clock is moved by CLOCK_SKEW_US first, as two boards never agree.
+# tools/trace_to_chrome.py has to find that skew again from the
+# notify / ack pairs.
+#
+#   python benchmarks/bench_event_trace.py [--output drive.json]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT, os.path.join(ROOT, "tools")]
+
+import event_trace  # noqa: E402
+from simulator import Simulation  # noqa: E402
+
+import trace_to_chrome  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+
+RECORDS = 200_000
+SESSION_MS = 20_000
+PRESSES = 40
+
+# The robot's clock runs this far ahead of the remote's
+CLOCK_SKEW_US = 123_456_789
+
+# (label, interval ms, jitter ms)
+LINKS = (("30 ms", 30, 0.0), ("30 ms, 20 ms jitter", 30, 20.0))
+
+
+def record_cost():
+    for enabled in (False, True):
+        trace = event_trace.EventTrace("bench", enabled)
+        seconds = min(timeit.repeat(lambda: trace.record(event_trace.NOTIFY_SENT, 1), number=RECORDS, repeat=3))
+        print(f"record(), trace {'on' if enabled else 'off'}: {seconds / RECORDS * 1e9:.0f} ns")
+
+
+def enable_tracing(sim):
+    for script in sim.scripts.values():
+        script.module.trace.enabled = True
+
+
+def session(interval_ms, jitter_ms):
+    """ Return the serial dumps of (remote, robot), robot clock skewed """
+    sim = Simulation(SCRIPTS, interval_ms, jitter_ms=jitter_ms, seed=1)
+    rng = random.Random(2)
+    at_ms = 3000
+    for _ in range(PRESSES):
+        at_ms += rng.randint(200, 500)
+        sim.press(rng.randrange(4), at_ms, rng.randint(50, 300))
+    sim.run(SESSION_MS, setup=enable_tracing)
+    robot = sim.scripts["robot_code"].module.trace
+    for index in range(len(robot._times)):
+        robot._times[index] = (robot._times[index] + CLOCK_SKEW_US) % trace_to_chrome.TICKS_PERIOD
+    dumps = []
+    for name in ("remote", "robot_code"):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            sim.scripts[name].module.trace.dump()
+        dumps.append(output.getvalue())
+    return dumps
+
+
+def one_way_us(traces):
+    """ Notify sent to notify received for each frame, on the corrected clocks """
+    remote, robot = traces
+    sent = remote.first(event_trace.NOTIFY_SENT)
+    received = robot.first(event_trace.NOTIFY_RECEIVED)
+    return sorted((received[seq] - robot.offset_us) - sent[seq] for seq in sent if seq in received)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="write the last session's Chrome trace here")
+    args = parser.parse_args()
+    record_cost()
+    print()
+    print(f"{'link':22} {'events':>7} {'dump bytes':>11} {'skew error us':>14} {'one-way p50/min us':>19}")
+    for label, interval_ms, jitter_ms in LINKS:
+        dumps = session(interval_ms, jitter_ms)
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for index, dump in enumerate(dumps):
+                paths.append(os.path.join(folder, f"device{index}.log"))
+                with open(paths[-1], "w") as file:
+                    file.write(dump)
+            chrome, notes = trace_to_chrome.convert(paths)
+            traces = [trace for path in paths for trace in trace_to_chrome.parse(open(path)).values()]
+        trace_to_chrome.align(traces)
+        delays = one_way_us(traces)
+        error = traces[1].offset_us - CLOCK_SKEW_US
+        print(f"{label:22} {sum(len(trace.records) for trace in traces):7} {sum(map(len, dumps)):11} "
+              f"{error:14.0f} {delays[len(delays) // 2]:>10.0f}/{delays[0]:<8.0f}")
+        for note in notes:
+            print(f"  {note}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(chrome, file)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
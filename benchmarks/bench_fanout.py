@@ -0,0 +1,212 @@
+# Benchmark: one remote sending every frame to several robots
+# First the cost of a frame on the remote for N robots: encoding it once
+# and notifying the same buffer to each with centrals.CentralRegistry,
+# against encoding a new frame for each robot. Host time per frame, and
+# heap allocations per frame as bench_memory.py counts them (every one is a
+# heap allocation on the RP2040); notify is a stand-in that only counts.
+#
+# Then remote.py runs in the simulator with N robots connecting one after
+# another. Each is a NotificationReceiver acking every frame, as in
+# robot_code.py, on its own link, so connection events fall at different
+# times on each. Buttons are pressed and, for every frame, the time from
+# notify to delivery at each robot and the skew (last robot minus first)
+# are measured. One more robot tries to connect while the remote is full,
+# then gets in once a robot leaves.
+#
+#   python benchmarks/bench_fanout.py
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+import utime  # noqa: E402
+from bench_memory import AllocationAudit  # noqa: E402
+from simulator import Simulation  # noqa: E402
+
+import protocol  # noqa: E402
+from centrals import CentralRegistry  # noqa: E402
+from receiver import NotificationReceiver  # noqa: E402
+
+FRAMES = 20_000
+COUNTS = (1, 2, 4, 8)
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"),)
+INTERVAL_MS = 15
+ROBOTS = (1, 2, 3, 4)
+JOIN_MS = 700
+PRESSES = 20
+PRESS_MS = 300
+
+_REMOTE_UUID = bluetooth.UUID(0x1848)
+_BUTTON_UUID = bluetooth.UUID(0x2A6E)
+_ACK_UUID = bluetooth.UUID(0x2A6F)
+
+
+class Counter:
+    """ Stands in for a characteristic, counting notifications """
+
+    def __init__(self):
+        self.notifications = 0
+
+    def notify(self, connection, data=None):
+        self.notifications += 1
+
+
+def one_encode(count):
+    centrals = CentralRegistry(count)
+    for index in range(count):
+        centrals.add(object())
+    characteristic = Counter()
+    buffer = bytearray(protocol.HEADER_SIZE)
+
+    def send(seq):
+        protocol.encode_into(buffer, protocol.BUTTON_A, seq)
+        centrals.notify(characteristic, protocol.CHANNEL_FRAMES, buffer)
+        centrals.sent_frame(seq)
+
+    return send, characteristic
+
+
+def encode_each(count):
+    connections = [object() for _ in range(count)]
+    characteristic = Counter()
+
+    def send(seq):
+        for connection in connections:
+            characteristic.notify(connection, protocol.encode(protocol.BUTTON_A, seq))
+
+    return send, characteristic
+
+
+def cost(make, count):
+    """ Return (host ns per frame, allocations per frame) """
+    # Best of three, the host is noisy
+    ns = None
+    for _ in range(3):
+        send, characteristic = make(count)
+        start = time.perf_counter_ns()
+        for seq in range(FRAMES):
+            send(seq)
+        took = (time.perf_counter_ns() - start) / FRAMES
+        ns = took if ns is None else min(ns, took)
+        if characteristic.notifications != FRAMES * count:
+            raise AssertionError("not every robot was notified")
+    checker = AllocationAudit({send.__code__})
+    checker.start()
+    try:
+        for seq in range(1000):
+            send(seq)
+    finally:
+        checker.stop()
+    return ns, sum(count for count, _ in checker.lines.values()) / 1000
+
+
+async def robot(deliveries, connections, join_ms):
+    """ Connect to the remote and receive and ack its frames like robot_code.py """
+    await asyncio.sleep_ms(join_ms)
+    device = aioble.Device(aioble.ADDR_PUBLIC, aioble.local_address)
+    try:
+        connection = await device.connect(timeout_ms=2000)
+    except asyncio.TimeoutError:
+        connections.append(None)
+        return
+    connections.append((utime.ticks_us(), connection))
+    service = await connection.service(_REMOTE_UUID)
+    characteristic = await service.characteristic(_BUTTON_UUID)
+    ack = await service.characteristic(_ACK_UUID)
+
+    def on_frame(frame):
+        deliveries[protocol.frame_seq(frame)] = utime.ticks_us()
+
+    receiver = NotificationReceiver(characteristic, {protocol.PROTOCOL_VERSION: on_frame}, ack=ack)
+    try:
+        await receiver.run()
+    except aioble.DeviceDisconnectedError:
+        pass
+
+
+def fleet(count, seed=1):
+    """ Return (notify to delivery ms for every robot and frame, skew ms per frame, remote module, joins) """
+    deliveries = [{} for _ in range(count + 1)]
+    joins = [[] for _ in range(count + 1)]
+    start_ms = (count + 1) * JOIN_MS + 1000
+    extra_ms = start_ms + PRESSES * 2 * PRESS_MS
+
+    def setup(sim):
+        remote = sim.scripts["remote"].module
+        remote.MAX_CENTRALS = count
+        remote.centrals = CentralRegistry(count)
+        for press in range(PRESSES):
+            sim.press(0, start_ms + press * 2 * PRESS_MS, PRESS_MS)
+
+    def robots():
+        tasks = []
+        for index in range(count):
+            def task(index=index):
+                return robot(deliveries[index], joins[index], JOIN_MS * (index + 1))
+            tasks.append(task)
+
+        async def extra():
+            # Tries while the remote is full, then again once the first robot has left
+            await robot(deliveries[count], joins[count], count * JOIN_MS + JOIN_MS)
+            await asyncio.sleep_ms(extra_ms - utime.ticks_ms())
+            await joins[0][0][1].disconnect()
+            await robot(deliveries[count], joins[count], 100)
+
+        tasks.append(extra)
+        return tasks
+
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=seed)
+    sim.run(extra_ms + 2000, tasks=robots(), setup=setup)
+    notified = {}
+    for when, event, data in sim.trace:
+        if event == "notify" and len(data) >= protocol.HEADER_SIZE:
+            notified.setdefault(protocol.frame_seq(data), when)
+    latencies = []
+    skews = []
+    for seq, sent in notified.items():
+        times = [robot_deliveries[seq] for robot_deliveries in deliveries[:count] if seq in robot_deliveries]
+        if len(times) < count or utime.ticks_diff(sent, start_ms * 1000) < 0:
+            continue
+        latencies.extend(utime.ticks_diff(when, sent) / 1000 for when in times)
+        skews.append((max(times) - min(times)) / 1000)
+    return latencies, skews, sim.scripts["remote"].module, joins[count]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    print(f"remote, cost of one frame for N robots ({FRAMES} frames)")
+    print(f"{'robots':>6} {'one encode ns':>14} {'allocs':>7} {'encode each ns':>15} {'allocs':>7}")
+    for count in COUNTS:
+        once_ns, once_allocs = cost(one_encode, count)
+        each_ns, each_allocs = cost(encode_each, count)
+        print(f"{count:6} {once_ns:14.0f} {once_allocs:7.1f} {each_ns:15.0f} {each_allocs:7.1f}")
+
+    print()
+    print(f"simulator, {INTERVAL_MS} ms connection interval, {PRESSES} presses; notify to delivery at every robot "
+          f"and the skew between the first and last robot to get each frame")
+    print(f"{'robots':>6} {'frames':>6} {'p50 ms':>7} {'max ms':>7} {'skew p50':>9} {'skew p99':>9} {'skew max':>9}")
+    for count in ROBOTS:
+        latencies, skews, remote, extra = fleet(count)
+        print(f"{count:6} {len(skews):6} {percentile(latencies, 0.5):7.1f} {max(latencies):7.1f} "
+              f"{percentile(skews, 0.5):9.1f} {percentile(skews, 0.99):9.1f} {max(skews):9.1f}")
+    centrals = remote.centrals
+    print(centrals.stats())
+    print(f"extra robot while full: {'refused' if extra[0] is None else 'connected'}, "
+          f"after one left: {'connected' if extra[-1] is not None else 'refused'}")
+    for index in range(centrals.capacity):
+        print(f"  slot {index}: {centrals.acks[index].stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Benchmark: time to first command with and without the GATT handle cache
+# The remote's GATT table mirrors remote.py; it notifies a frame every 20 ms.
+# The robot also looks for the joystick characteristic, which this remote
+# doesn't have, like robot_code.py does; once the cache knows it is missing
+# that lookup has to take no round trips, or this exits with an error.
+#
+#   python benchmarks/bench_gatt_cache.py
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_ms  # noqa: E402
+
+import protocol  # noqa: E402
+from gatt_cache import GattCache  # noqa: E402
+
+_DEVICE_INFO_UUID = bluetooth.UUID(0x180A)
+_MODEL_NUMBER_UUID = bluetooth.UUID(0x2A24)
+_REMOTE_UUID = bluetooth.UUID(0x1848)
+_BUTTON_UUID = bluetooth.UUID(0x2A6E)
+_AXIS_UUID = bluetooth.UUID(0x2A71)
+
+INTERVAL_MS = 30
+
+
+def remote_services(model, extra=0):
+    """ Register remote.py's services; extra characteristics shift the handles """
+    aioble.reset()
+    aioble.connection_interval_ms = INTERVAL_MS
+    device_info = aioble.Service(_DEVICE_INFO_UUID)
+    aioble.Characteristic(device_info, _MODEL_NUMBER_UUID, read=True, initial=model)
+    remote_service = aioble.Service(_REMOTE_UUID)
+    for index in range(extra):
+        aioble.Characteristic(remote_service, bluetooth.UUID(0x2B00 + index), read=True)
+    button = aioble.Characteristic(remote_service, _BUTTON_UUID, read=True, notify=True)
+    aioble.register_services(remote_service, device_info)
+    return button
+
+
+async def remote(button):
+    connection = await aioble.advertise(100_000, name="KevsRobots")
+    seq = 0
+    while connection.is_connected():
+        button.notify(connection, protocol.encode(protocol.BUTTON_A, seq))
+        seq += 1
+        await asyncio.sleep_ms(20)
+
+
+async def first_command(gatt):
+    """ Connect, then time discovery + subscribe + first notification """
+    device = aioble.Device(aioble.ADDR_PUBLIC, aioble.local_address)
+    connection = await device.connect()
+    start = ticks_ms()
+    if gatt:
+        characteristic = await gatt.characteristic(connection, _REMOTE_UUID, _BUTTON_UUID)
+        before = connection._link.round_trips
+        axis = await gatt.characteristic(connection, _REMOTE_UUID, _AXIS_UUID)
+    else:
+        service = await connection.service(_REMOTE_UUID)
+        characteristic = await service.characteristic(_BUTTON_UUID)
+        before = connection._link.round_trips
+        axis = await service.characteristic(_AXIS_UUID)
+    assert axis is None
+    missing_round_trips = connection._link.round_trips - before
+    if gatt:
+        await gatt.subscribe(characteristic)
+    else:
+        await characteristic.subscribe(notify=True)
+    await characteristic.notified()
+    elapsed = ticks_diff(ticks_ms(), start)
+    round_trips = connection._link.round_trips
+    await connection.disconnect()
+    return elapsed, round_trips, missing_round_trips
+
+
+async def run(gatt, model="1.0", extra=0):
+    button = remote_services(model, extra)
+    task = asyncio.create_task(remote(button))
+    result = await first_command(gatt)
+    task.cancel()
+    return result
+
+
+def main():
+    gatt = GattCache(os.path.join(tempfile.mkdtemp(), "gatt_cache.json"))
+    cases = (
+        ("no cache", None, "1.0", 0),
+        ("cold cache", gatt, "1.0", 0),
+        ("warm cache", gatt, "1.0", 0),
+        ("model changed", gatt, "1.1", 2),
+        ("warm again", gatt, "1.1", 2),
+    )
+    print(f"connection interval {INTERVAL_MS} ms")
+    print(f"{'case':14} {'first cmd ms':>12} {'ATT round trips':>16} {'for joystick':>13}")
+    failed = False
+    for name, cache, model, extra in cases:
+        elapsed, round_trips, missing = asyncio.run(run(cache, model, extra))
+        print(f"{name:14} {elapsed:12} {round_trips:16} {missing:13}")
+        failed = failed or (name.startswith("warm") and missing > 0)
+    print(gatt.stats())
+    if failed:
+        print("FAIL: a warm cache looked for the missing joystick characteristic again")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
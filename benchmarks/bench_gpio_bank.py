@@ -0,0 +1,79 @@
+# Benchmark: cost of one button scan, pin by pin vs one GPIO register read
+# The stand-in machine module keeps a simulated SIO GPIO_IN register in
+# step with its pins, so both backends read the same levels. Scans are
+# timed on the host for the four remote_control.py buttons and the 11
+# gamepad pins in button_test.py; every backend is checked against the
+# others on random pin levels first.
+#
+#   python benchmarks/bench_gpio_bank.py
+
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+from pimoroni import Button  # noqa: E402
+
+from gpio_bank import PinBank, RegisterBank  # noqa: E402
+
+# (label, pins in button order)
+MAPS = (
+    ("remote_control.py", (12, 13, 14, 15)),
+    ("button_test.py", (6, 7, 4, 5, 8, 9, 2, 3, 10, 11, 12)),
+)
+
+SCANS = 100_000
+CHECKS = 2000
+
+
+class ButtonScan:
+    """ The old remote_control.py scan, a pimoroni Button per pin """
+
+    def __init__(self, pin_ids):
+        self.buttons = [Button(pin_id) for pin_id in pin_ids]
+        self.pins = [button.pin for button in self.buttons]
+
+    def read(self):
+        buttons = 0
+        bit = 1
+        for button in self.buttons:
+            if button.raw():
+                buttons |= bit
+            bit <<= 1
+        return buttons
+
+
+def check(pin_ids, backends):
+    """ Set random levels and make sure every backend reads the same mask """
+    # Each backend made its own Pin objects; set the level on all of them
+    rng = random.Random(1)
+    for _ in range(CHECKS):
+        expected = 0
+        for index in range(len(pin_ids)):
+            pressed = rng.random() < 0.3
+            for _, backend in backends:
+                backend.pins[index].value(0 if pressed else 1)
+            expected |= pressed << index
+        for label, backend in backends:
+            if backend.read() != expected:
+                raise AssertionError(f"{label} read {backend.read():#x}, expected {expected:#x}")
+
+
+def main():
+    print(f"{'pins':20} {'backend':16} {'ns/scan':>8} {'pin reads/scan':>15}")
+    for label, pin_ids in MAPS:
+        backends = [("pimoroni Button", ButtonScan(pin_ids)), ("PinBank", PinBank(pin_ids)),
+                    ("RegisterBank", RegisterBank(pin_ids))]
+        check(pin_ids, backends)
+        for name, backend in backends:
+            reads = sum(pin.reads for pin in backend.pins)
+            seconds = min(timeit.repeat(backend.read, number=SCANS, repeat=3))
+            per_scan = (sum(pin.reads for pin in backend.pins) - reads) / (3 * SCANS)
+            print(f"{label:20} {name:16} {seconds / SCANS * 1e9:8.0f} {per_scan:15.1f}")
+
+
+if __name__ == "__main__":
+    main()
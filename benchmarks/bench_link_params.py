@@ -0,0 +1,94 @@
+# Benchmark: notify latency for the "drive" and "idle" link profiles
+# The aioble stand-in records the parameters each connect() asks for and
+# picks the interval from them, like a central does. Half way through, the
+# remote asks for the top of the robot's interval range, as a peripheral
+# may, and the robot's LinkParams has to pick up the values in effect from
+# the connection update IRQ.
+#
+#   python benchmarks/bench_link_params.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+import link_params  # noqa: E402
+import protocol  # noqa: E402
+from link_params import LinkParams  # noqa: E402
+
+_REMOTE_UUID = bluetooth.UUID(0x1848)
+_BUTTON_UUID = bluetooth.UUID(0x2A6E)
+
+FRAMES = 20
+# Supervision timeout the remote asks for in its update
+UPDATE_TIMEOUT_MS = 4000
+
+
+async def remote(button, sent, update):
+    connection = await aioble.advertise(25_000, name="KevsRobots")
+    await asyncio.sleep_ms(300)
+    for seq in range(FRAMES):
+        if seq == FRAMES // 2:
+            aioble.update_params(connection, *update)
+        sent[seq] = ticks_us()
+        button.notify(connection, protocol.encode(protocol.BUTTON_A, seq))
+        await asyncio.sleep_ms(237)
+    await asyncio.sleep_ms(500)
+    await connection.disconnect()
+
+
+async def robot(link, received, described):
+    device = aioble.Device(aioble.ADDR_PUBLIC, aioble.local_address)
+    connection = await device.connect(**link.connect_kwargs())
+    link.watch(connection)
+    described.append(link.describe())
+    service = await connection.service(_REMOTE_UUID)
+    characteristic = await service.characteristic(_BUTTON_UUID)
+    await characteristic.subscribe(notify=True)
+    interval_ms = connection._link.interval * 1000
+    try:
+        while True:
+            frame = await characteristic.notified()
+            received[protocol.frame_seq(frame)] = ticks_us()
+    except aioble.DeviceDisconnectedError:
+        return interval_ms
+
+
+async def run(mode):
+    aioble.reset()
+    service = aioble.Service(_REMOTE_UUID)
+    button = aioble.Characteristic(service, _BUTTON_UUID, read=True, notify=True)
+    aioble.register_services(service)
+    link = LinkParams(mode)
+    sent, received, described = {}, {}, []
+    update = (link.profiles[mode][1] / 1000, 0, UPDATE_TIMEOUT_MS)
+    _, interval_ms = await asyncio.gather(remote(button, sent, update), robot(link, received, described))
+    if (link.interval_us, link.latency, link.timeout_ms) != (update[0] * 1000, update[1], update[2]):
+        raise AssertionError("the connection update was not picked up")
+    described.append(link.describe())
+    latencies = sorted(ticks_diff(received[seq], sent[seq]) / 1000 for seq in received)
+    return described, aioble.requested_params[-1], interval_ms, latencies
+
+
+def main():
+    print(f"{'mode':6} {'requested us':>16} {'interval ms':>12} {'p50 ms':>7} {'max ms':>7}")
+    for mode in ("drive", "idle"):
+        described, requested, interval_ms, latencies = asyncio.run(run(mode))
+        print(f"{mode:6} {requested[0]:>7}-{requested[1]:<8} {interval_ms:12.2f} "
+              f"{latencies[len(latencies) // 2]:7.1f} {latencies[-1]:7.1f}")
+        print(f"       connected: {described[0]}")
+        print(f"       after the update: {described[1]}")
+    try:
+        link_params.check((7_500, 400_000, 10, 2_000))
+    except ValueError as e:
+        print(f"bad profile rejected: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Benchmark: cost of one loop iteration with logging printed, deferred or off
+# The iteration is remote_control.py's remote_task sending a frame and
+# logging the buttons. "print" is the old f-string print(); the others go
+# through log.Logger printing straight away, queued in a DeferredSink
+# (flushed between iterations, as the loop's idle time would, and timed
+# separately), or turned off. Output goes to a stand-in for USB serial
+# that counts the bytes written from the loop itself. gui.draw_logo is
+# timed the same way.
+#
+#   python benchmarks/bench_log.py
+
+import contextlib
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import log  # noqa: E402
+import protocol  # noqa: E402
+
+import gui  # noqa: E402
+
+ITERATIONS = 20_000
+DRAWS = 500
+
+# The deferred sink is flushed after this many iterations, like a flush
+# task running every LOG_FLUSH_MS in between frames
+FLUSH_EVERY = log.LOG_FLUSH_LINES
+
+
+class Serial:
+    """ Counts what would have gone out over USB serial """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class Connection:
+    def __repr__(self):
+        return "<DeviceConnection 4>"
+
+
+class Display:
+    def pixel(self, x, y):
+        pass
+
+    def update(self):
+        pass
+
+
+connection = Connection()
+
+
+def make_iteration(mode, logger):
+    def iteration(seq):
+        buttons = protocol.BUTTON_A | protocol.BUTTON_X
+        frame = protocol.encode(buttons, seq)
+        if mode == "print":
+            print(f"Buttons {protocol.button_names(buttons)} pressed, connection is: {connection}")
+        elif mode == "off, unguarded":
+            logger.debug("Buttons %s pressed, connection is: %s", protocol.button_names(buttons), connection)
+        elif logger.level <= log.DEBUG:
+            logger.debug("Buttons %s pressed, connection is: %s", protocol.button_names(buttons), connection)
+        return frame
+
+    return iteration
+
+
+def loop_cost(mode):
+    """ Return (ns per iteration, bytes per iteration from the loop, ns per flushed line) """
+    sink = log.DeferredSink() if mode == "deferred" else None
+    level = log.INFO if mode.startswith("off") else log.DEBUG
+    logger = log.Logger(level, sink)
+    iteration = make_iteration(mode, logger)
+    serial = Serial()
+    in_loop = flush_ns = 0
+    with contextlib.redirect_stdout(serial):
+        for seq in range(ITERATIONS):
+            start = time.perf_counter_ns()
+            iteration(seq & 0xFFFF)
+            in_loop += time.perf_counter_ns() - start
+            if sink is not None and seq % FLUSH_EVERY == FLUSH_EVERY - 1:
+                loop_bytes = serial.bytes
+                start = time.perf_counter_ns()
+                sink.flush()
+                flush_ns += time.perf_counter_ns() - start
+                # Bytes printed by the flush are not the loop's
+                serial.bytes = loop_bytes
+    return in_loop / ITERATIONS, serial.bytes / ITERATIONS, flush_ns / ITERATIONS if sink else None
+
+
+def draw_cost(level):
+    """ Return (us per draw_logo call, bytes per call) """
+    gui.logger.level = level
+    display = Display()
+    serial = Serial()
+    with contextlib.redirect_stdout(serial):
+        start = time.perf_counter_ns()
+        for _ in range(DRAWS):
+            gui.draw_logo(0, 0, display)
+        elapsed = time.perf_counter_ns() - start
+    return elapsed / DRAWS / 1000, serial.bytes / DRAWS
+
+
+def main():
+    print(f"{'logging':16} {'ns/iteration':>13} {'bytes/iteration':>16} {'idle flush ns/line':>19}")
+    for mode in ("print", "on", "deferred", "off", "off, unguarded"):
+        ns, written, flush_ns = loop_cost(mode)
+        flush = f"{flush_ns:19.0f}" if flush_ns is not None else f"{'-':>19}"
+        print(f"{mode:16} {ns:13.0f} {written:16.1f} {flush}")
+    print()
+    print(f"{'draw_logo':16} {'us/call':>13} {'bytes/call':>16}")
+    for label, level in (("debug (print)", log.DEBUG), ("off", log.INFO)):
+        us, written = draw_cost(level)
+        print(f"{label:16} {us:13.1f} {written:16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Benchmark: what the event loop profiler costs, and what it shows
+# First the cost per task step on a real asyncio loop, with no profiler,
+# with the profiler turned off and turned on. Then remote.py,
+# remote_control.py and robot_code.py run in the simulator with profiling
+# on (host CPU time counts as device time) while buttons are pressed, and
+# each prints its per task summary; remote.py's reports are also packed and
+# decoded the way the diagnostics characteristic sends them, one task per
+# notification, each checked to fit a notification without a bigger MTU.
+# Every task a script starts has to get a slot in the profiler.
+#
+#   python benchmarks/bench_loop_profiler.py
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import uasyncio  # noqa: E402
+
+from loop_profiler import LoopProfiler, decode_report  # noqa: E402
+from simulator import Simulation  # noqa: E402
+
+TASKS = 4
+STEPS = 50_000
+# ATT payload of a notification with the default 23 byte MTU
+NOTIFY_PAYLOAD = 20
+
+SESSION_MS = 30_000
+PRESSES = 60
+ROBOT = os.path.join(ROOT, "robot_code.py")
+
+# (remote script, its pins for A, B, X and Y)
+REMOTES = (("remote.py", (0, 1, 2, 3)), ("remote_control.py", (12, 13, 14, 15)))
+
+
+async def stepper(profiler):
+    for _ in range(STEPS):
+        await profiler.sleep_ms(0)
+
+
+async def plain_stepper():
+    for _ in range(STEPS):
+        await uasyncio.sleep_ms(0)
+
+
+async def steps(mode):
+    profiler = LoopProfiler(mode == "on")
+    if mode == "none":
+        tasks = [asyncio.create_task(plain_stepper()) for _ in range(TASKS)]
+    else:
+        tasks = [asyncio.create_task(profiler.wrap(f"task{index}", stepper(profiler))) for index in range(TASKS)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return (time.perf_counter() - start) / (TASKS * STEPS), profiler
+
+
+def overhead():
+    print(f"{'profiler':10} {'ns/step':>8}")
+    for mode in ("none", "off", "on"):
+        seconds, profiler = min((asyncio.run(steps(mode)) for _ in range(3)), key=lambda result: result[0])
+        print(f"{mode:10} {seconds * 1e9:8.0f}")
+    print(profiler.summary().splitlines()[0])
+
+
+def enable_profiling(sim):
+    for script in sim.scripts.values():
+        script.module.profiler.enabled = True
+
+
+def session(remote, pins):
+    sim = Simulation((os.path.join(ROOT, remote), ROBOT), seed=1, cpu_scale=1.0)
+    rng = random.Random(2)
+    at_ms = 3000
+    for _ in range(PRESSES):
+        at_ms += rng.randint(200, 600)
+        sim.press(pins[rng.randrange(4)], at_ms, rng.randint(50, 1500))
+    sim.run(SESSION_MS, setup=enable_profiling)
+    for name, script in sim.scripts.items():
+        print(f"{name}:")
+        for line in script.module.profiler.summary().splitlines():
+            print(f"  {line}")
+        if script.module.profiler.refused:
+            raise AssertionError(f"{name} started more tasks than the profiler has room for")
+    return sim.scripts[os.path.splitext(remote)[0]].module.profiler
+
+
+def main():
+    overhead()
+    print()
+    profilers = {}
+    for remote, pins in REMOTES:
+        profilers[remote] = session(remote, pins)
+        print()
+    profiler = profilers["remote.py"]
+    print(f"remote.py diagnostics reports, {len(profiler.report())} bytes each:")
+    index = 0
+    tasks = 1
+    while index < tasks:
+        report = profiler.report(index)
+        if len(report) > NOTIFY_PAYLOAD:
+            raise AssertionError(f"report is {len(report)} bytes, a notification carries {NOTIFY_PAYLOAD}")
+        tasks, index, name, wakeups, run_us, max_us, max_lag_us = decode_report(report)
+        print(f"  {index}/{tasks} {name:6} {wakeups:6} wakeups {run_us:8} us run {max_us:6} us longest, "
+              f"{max_lag_us} us worst lag")
+        index += 1
+
+
+if __name__ == "__main__":
+    main()
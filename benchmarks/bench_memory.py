@@ -0,0 +1,308 @@
+# Benchmark: heap allocations per frame in steady state, and GC pauses
+# remote.py and robot_code.py run in the simulator while buttons are
+# pressed. Once the link has settled, every bytecode run from the remote's
+# send and ack loops, or from the robot's notification loop, is audited:
+# anything it allocates on the host that would also be a heap allocation on
+# MicroPython (a small int is not, everything else is) is counted against
+# its line. The aioble and uasyncio stand-ins are left out, they are not
+# the code running on the device, but calling one that makes a Task, like
+# wait_for_ms(), is counted. Handling frames, acks and motion commands has
+# to come out at zero per frame, await lines included, or this exits with
+# an error. The one exception is the coroutine object made by calling the
+# async function a line awaits, which MicroPython can't avoid; those are
+# counted in a column of their own. Then the GC pauses MemoryManager
+# recorded in a session are shown.
+#
+#   python benchmarks/bench_memory.py
+
+import builtins
+import dis
+import linecache
+import os
+import random
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import uasyncio as asyncio  # noqa: E402
+from simulator import Simulation  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+
+INTERVAL_MS = 30
+PRESS_GAP_MS = 300
+AUDIT_START_MS = 4000
+AUDIT_MS = 10_000
+PAUSE_SESSION_MS = 20_000
+
+# Hot loops audited on each device: (script, file, function)
+ROOTS = {
+    "remote": (("remote", "remote.py", "remote_task"), ("remote", "remote.py", "ack_task")),
+    "robot": (("robot_code", "receiver.py", "run"), ("robot_code", "motion.py", "run")),
+}
+
+# Device code; the stand-ins in sim/ and this folder are not audited
+DEVICE_FOLDER = ROOT + os.sep
+SKIP_FOLDERS = (os.path.join(ROOT, "sim") + os.sep, os.path.join(ROOT, "benchmarks") + os.sep)
+
+# An int below 2**30 is a small int on MicroPython and never allocates; on
+# the host it is an object, sometimes made with room for a second digit
+INT_SIZES = (sys.getsizeof(1 << 29), sys.getsizeof(1 << 30))
+
+# With tracing on, CPython binds a builtin method before calling it; the
+# device calls it straight from the method table
+BOUND_BUILTIN_SIZE = sys.getsizeof({}.get)
+
+# CPython keeps freed tuples, lists, dicts and floats for reuse, so making
+# one may not show up in tracemalloc; on MicroPython these always allocate
+BUILDS = {dis.opmap[name] for name in (
+    "BUILD_TUPLE", "BUILD_LIST", "BUILD_MAP", "BUILD_SET", "BUILD_STRING", "BUILD_SLICE",
+    "BUILD_CONST_KEY_MAP", "FORMAT_VALUE", "MAKE_FUNCTION", "UNPACK_EX",
+)}
+CALL = dis.opmap["CALL"]
+GET_AWAITABLE = dis.opmap["GET_AWAITABLE"]
+GET_ITER = dis.opmap["GET_ITER"]
+
+# max() and min() get their arguments as a tuple on the host, not on the
+# device, so while auditing they are replaced by these, which are not audited
+_max, _min = max, min
+
+
+def audit_max(*args, **kwargs):
+    return _max(*args, **kwargs)
+
+
+def audit_min(*args, **kwargs):
+    return _min(*args, **kwargs)
+
+# Unpacking what a call returned means the call built a tuple for it
+UNPACK_SEQUENCE = dis.opmap["UNPACK_SEQUENCE"]
+
+# Stand-ins that make a Task (and a coroutine to run in it) on the device.
+# They aren't audited, so a call to one from device code is counted as one
+# allocation; how big the Task is on the device isn't known here
+TASK_MAKERS = {"wait_for", "wait_for_ms", "create_task", "gather"}
+
+
+class AllocationAudit:
+    """ Count allocations made by device code called from the root functions
+
+    Opcode tracing stops after every bytecode, and tracemalloc's peak shows
+    whether the one before allocated, even if it was freed straight away.
+    The tracers leave the heap where they found it before resetting the
+    peak, so their own allocations are not counted.
+    """
+
+    def __init__(self, roots):
+        self.roots = roots
+        # (file, line, opcode, coroutine): [allocations, bytes]; coroutine
+        # is True for the call an await line makes its coroutine with
+        self.lines = {}
+        self._level = 0
+        self._frame = None
+        self._line = 0
+        self._opcode = 0
+        self._after_call = False
+        # Whether the last opcode made the coroutine an await line awaits
+        self._awaited = False
+        # code: offsets of its awaited calls
+        self._awaits = {}
+        # Made once: a bound method is a new object on every lookup
+        self._opcodes = self._op
+        self._calls = self._skip
+
+    def start(self):
+        builtins.max, builtins.min = audit_max, audit_min
+        tracemalloc.start()
+        self._rebase()
+        sys.settrace(self._call)
+
+    def stop(self):
+        sys.settrace(None)
+        tracemalloc.stop()
+        builtins.max, builtins.min = _max, _min
+
+    def _rebase(self):
+        self._level = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def _count(self, size, coroutine=False):
+        code = self._frame.f_code
+        key = (os.path.relpath(code.co_filename, ROOT), self._line, dis.opname[self._opcode], coroutine)
+        counts = self.lines.setdefault(key, [0, 0])
+        counts[0] += 1
+        counts[1] += size
+
+    def _awaited_calls(self, code):
+        """ Return the offsets of the calls in code whose result is awaited straight away """
+        calls = self._awaits.get(code)
+        if calls is None:
+            calls = set()
+            call = None
+            for instruction in dis.get_instructions(code):
+                if instruction.opcode == GET_AWAITABLE and call is not None:
+                    calls.add(call)
+                call = instruction.offset if instruction.opcode == CALL else None
+            self._awaits[code] = calls
+        return calls
+
+    def _check(self, peak):
+        """ Count what the last opcode allocated, given the heap's peak since """
+        opcode = self._opcode
+        size = peak - self._level
+        if self._awaited:
+            if size > 0:
+                self._count(size, True)
+        elif opcode in BUILDS or (opcode == UNPACK_SEQUENCE and self._after_call):
+            self._count(max(size, 0))
+        elif opcode == UNPACK_SEQUENCE:
+            # The host unpacks a list through an iterator, the device in place
+            return
+        elif size > 0 and size not in INT_SIZES and not (opcode == CALL and size == BOUND_BUILTIN_SIZE) \
+                and not (opcode in (CALL, GET_ITER) and self._counting_loop()):
+            self._count(size)
+
+    def _counting_loop(self):
+        """ True on a "for ... in range()" line, which MicroPython compiles to a plain counter """
+        line = linecache.getline(self._frame.f_code.co_filename, self._line).strip()
+        return line.startswith("for ") and " in range(" in line
+
+    def _call(self, frame, event, arg):
+        back = frame.f_back
+        if self._frame is not None and self._frame is back and frame.f_code.co_name in TASK_MAKERS:
+            self._count(0)
+        if frame.f_code in self.roots or (back is not None and (back.f_trace is self._opcodes or
+                                                                back.f_trace is self._calls)):
+            frame.f_trace_lines = False
+            self._frame = None
+            filename = frame.f_code.co_filename
+            if filename.startswith(DEVICE_FOLDER) and not filename.startswith(SKIP_FOLDERS):
+                frame.f_trace_opcodes = True
+                self._rebase()
+                return self._opcodes
+            self._rebase()
+            return self._calls
+        return None
+
+    def _op(self, frame, event, arg):
+        if self._frame is not None:
+            self._check(tracemalloc.get_traced_memory()[1])
+        if event == "opcode":
+            self._after_call = self._frame is frame and self._opcode == CALL
+            self._frame = frame
+            self._line = frame.f_lineno
+            self._opcode = frame.f_code.co_code[frame.f_lasti]
+            self._awaited = frame.f_lasti in self._awaited_calls(frame.f_code)
+        else:
+            self._frame = None
+        self._rebase()
+        return self._opcodes
+
+    def _skip(self, frame, event, arg):
+        if event == "return":
+            self._frame = None
+            self._rebase()
+        return self._calls
+
+
+def audit(device):
+    """ Return (frames handled, AllocationAudit) for one device's hot loops """
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=1)
+    rng = random.Random(2)
+    at_ms = 2000
+    while at_ms < AUDIT_START_MS + AUDIT_MS:
+        at_ms += PRESS_GAP_MS + rng.randrange(-100, 100)
+        sim.press(rng.randrange(4), at_ms, rng.randrange(50, 400))
+    counted = []
+
+    async def window():
+        await asyncio.sleep_ms(AUDIT_START_MS)
+        roots = set()
+        for script, file, function in ROOTS[device]:
+            module = sim.scripts[script].module
+            for value in list(vars(module).values()) + [module]:
+                for candidate in _functions(value):
+                    code = candidate.__code__
+                    if code.co_name == function and os.path.basename(code.co_filename) == file:
+                        roots.add(code)
+        checker = AllocationAudit(roots)
+        kind = "notify" if device == "remote" else "deliver"
+        first = len(sim.trace)
+        checker.start()
+        try:
+            await asyncio.sleep_ms(AUDIT_MS)
+        finally:
+            checker.stop()
+        counted.append((sum(1 for _, event, _ in sim.trace[first:] if event == kind), checker))
+
+    sim.run(AUDIT_START_MS + AUDIT_MS + 500, tasks=(window,))
+    return counted[0], sim
+
+
+def _functions(value):
+    """ Functions reachable from a module global: itself, or the methods of its class """
+    if hasattr(value, "__code__"):
+        yield value
+    cls = value if isinstance(value, type) else type(value)
+    for attribute in vars(cls).values():
+        if hasattr(attribute, "__code__"):
+            yield attribute
+
+
+def pauses():
+    """ Return {device: MemoryManager} after a drive session with the host heap counted """
+    sim = Simulation(SCRIPTS, INTERVAL_MS, seed=1, cpu_scale=1.0)
+    rng = random.Random(3)
+    at_ms = 2000
+    while at_ms < PAUSE_SESSION_MS - 1000:
+        at_ms += PRESS_GAP_MS + rng.randrange(-100, 100)
+        sim.press(rng.randrange(4), at_ms, rng.randrange(50, 400))
+    tracemalloc.start()
+    try:
+        sim.run(PAUSE_SESSION_MS)
+    finally:
+        tracemalloc.stop()
+    return {name: sim.scripts[script].module.memory for name, script in (("remote", "remote"),
+                                                                        ("robot", "robot_code"))}
+
+
+def main():
+    print(f"steady state, {AUDIT_MS // 1000} s of driving over a {INTERVAL_MS} ms link; allocations per frame")
+    print(f"{'device':8} {'frames':>7} {'handling':>9} {'bytes':>7} {'coroutines':>11} {'bytes':>7}")
+    details = []
+    failed = False
+    for device in ROOTS:
+        (frames, checker), _ = audit(device)
+        totals = [0, 0, 0, 0]
+        for (_, _, _, coroutine), (count, size) in checker.lines.items():
+            column = 2 if coroutine else 0
+            totals[column] += count
+            totals[column + 1] += size
+        print(f"{device:8} {frames:7} " + " ".join(f"{value / frames:{width}.1f}"
+                                                 for value, width in zip(totals, (9, 7, 11, 7))))
+        details.append((device, checker))
+        failed = failed or totals[0] > 0
+    print()
+    print(f"idle collections over {PAUSE_SESSION_MS // 1000} s, host heap and host time")
+    print(f"{'device':8} {'collections':>12} {'mean us':>8} {'max us':>7}  latest us")
+    for device, memory in pauses().items():
+        mean = memory.total_us // memory.collections if memory.collections else 0
+        latest = " ".join(str(pause) for pause in memory.pauses()[-6:])
+        print(f"{device:8} {memory.collections:12} {mean:8} {memory.max_us:7}  {latest}")
+    for device, checker in details:
+        print()
+        print(f"{device}: where it allocates, bytes as seen on the host")
+        for (file, line, opcode, coroutine), (count, size) in sorted(checker.lines.items(),
+                                                                     key=lambda item: -item[1][0]):
+            kind = "coroutine" if coroutine else ""
+            print(f"  {file + ':' + str(line):22} {opcode:16} {kind:9} {count:6} x {size / count:4.0f}")
+    if failed:
+        print()
+        print("FAIL: frame handling allocates")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
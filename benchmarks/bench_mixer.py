@@ -0,0 +1,228 @@
+# Benchmark: lookup table mixer against the same mix in floats
+# "float" works out the expo curves, rate, scaling and trims with floats on
+# every call, as the straightforward version would. "table" is
+# mixer.Mixer.mix_into and "viper" is mixer_viper.mix_viper; on the host
+# the viper emitter is a stand-in, so it runs as plain Python here and its
+# time only means something on the Pico. Besides host time, every bytecode run
+# per mix is counted, and the floats made (each one is a heap allocation
+# on the RP2040), which is what costs on the device. The tables are then
+# checked against the float mix over the whole stick range, and the cost of
+# working them out again is timed. Last, mixer.py is loaded as on a port
+# without the viper emitter, where mixer_viper.py is a SyntaxError, and
+# Mixer(viper=True) has to mix in Python instead.
+#
+#   python benchmarks/bench_mixer.py
+
+import array
+import importlib.util
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import mixer  # noqa: E402
+import mixer_viper  # noqa: E402
+
+CALLS = 50_000
+GRID_STEP = 5
+
+# Settings the comparison runs with: some expo, a softer steering rate, a
+# trim and a weaker right motor
+SETTINGS = dict(steer_expo=40, throttle_expo=20, steer_rate=80, steer_trim=15, left_gain=100, right_gain=94)
+
+
+def mix_float(steer, throttle, speeds, steer_expo=40, throttle_expo=20, steer_rate=80, steer_trim=15,
+              left_gain=100, right_gain=94):
+    """ The same mix with floats """
+    x = max(-1.0, min(1.0, steer / 1000 + steer_trim / 1000))
+    x = ((1 - steer_expo / 100) * x + steer_expo / 100 * x * x * x) * steer_rate / 100
+    y = max(-1.0, min(1.0, throttle / 1000))
+    y = (1 - throttle_expo / 100) * y + throttle_expo / 100 * y * y * y
+    left = y + x
+    right = y - x
+    biggest = max(abs(left), abs(right))
+    if biggest > 1.0:
+        left /= biggest
+        right /= biggest
+    speeds[0] = int(max(-1.0, min(1.0, left * left_gain / 100)) * 1000)
+    speeds[1] = int(max(-1.0, min(1.0, right * right_gain / 100)) * 1000)
+
+
+def sticks(count, seed=1):
+    rng = random.Random(seed)
+    return [(rng.randrange(-1000, 1001), rng.randrange(-1000, 1001)) for _ in range(count)]
+
+
+def variants():
+    table = mixer.Mixer(**SETTINGS)
+    viper = mixer.Mixer(viper=True, **SETTINGS)
+    return (
+        ("float", mix_float),
+        ("table", table.mix_into),
+        ("viper", viper.mix_into),
+    )
+
+
+def host_ns(mix, inputs):
+    speeds = array.array("h", [0, 0])
+    start = time.perf_counter_ns()
+    for steer, throttle in inputs:
+        mix(steer, throttle, speeds)
+    return (time.perf_counter_ns() - start) / len(inputs)
+
+
+class CountingFloat(float):
+    """ A float whose arithmetic counts every float it makes """
+
+    made = 0
+
+
+def _counted(name):
+    method = getattr(float, name)
+
+    def operation(self, *args):
+        result = method(self, *args)
+        if not isinstance(result, float):
+            return result
+        CountingFloat.made += 1
+        return CountingFloat(result)
+
+    return operation
+
+
+for _name in ("__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__", "__truediv__",
+              "__rtruediv__", "__neg__", "__abs__"):
+    setattr(CountingFloat, _name, _counted(_name))
+
+
+def vm_cost(mix, inputs):
+    """ Return bytecodes run per mix, counted over the mixing code only """
+    counts = [0]
+    files = (os.path.abspath(mixer.__file__), os.path.abspath(mixer_viper.__file__), os.path.abspath(__file__))
+
+    def opcodes(frame, event, arg):
+        if event == "opcode":
+            counts[0] += 1
+        return opcodes
+
+    def calls(frame, event, arg):
+        if frame.f_code.co_filename in files and frame.f_code.co_name in ("mix_float", "mix_into", "mix_viper"):
+            frame.f_trace_opcodes = True
+            return opcodes
+        return None
+
+    speeds = array.array("h", [0, 0])
+    sys.settrace(calls)
+    try:
+        for steer, throttle in inputs:
+            mix(steer, throttle, speeds)
+    finally:
+        sys.settrace(None)
+    return counts[0] / len(inputs)
+
+
+def floats_made(mix, inputs):
+    """ Floats made per mix: every float an operation makes is a new heap object on the RP2040
+
+    The float mix is given its ints as CountingFloats, so its first
+    division counts the same as int / int does on the device.
+    """
+    speeds = array.array("h", [0, 0])
+    CountingFloat.made = 0
+    for steer, throttle in inputs:
+        if mix is mix_float:
+            mix(CountingFloat(steer), CountingFloat(throttle), speeds,
+                **{name: CountingFloat(value) for name, value in SETTINGS.items()})
+        else:
+            mix(steer, throttle, speeds)
+    return CountingFloat.made / len(inputs)
+
+
+def accuracy():
+    """ Return (mean, max) difference in thousandths between the tables and floats over the stick range """
+    table = mixer.Mixer(**SETTINGS)
+    viper = mixer.Mixer(viper=True, **SETTINGS)
+    got = array.array("h", [0, 0])
+    from_viper = array.array("h", [0, 0])
+    wanted = [0, 0]
+    total = worst = count = 0
+    for steer in range(-1000, 1001, GRID_STEP):
+        for throttle in range(-1000, 1001, GRID_STEP):
+            table.mix_into(steer, throttle, got)
+            viper.mix_into(steer, throttle, from_viper)
+            mix_float(steer, throttle, wanted)
+            if list(got) != list(from_viper):
+                raise AssertionError(f"viper differs at {steer}, {throttle}: {list(from_viper)} != {list(got)}")
+            for value, want in zip(got, wanted):
+                difference = abs(value - want)
+                total += difference
+                worst = max(worst, difference)
+                count += 1
+    return total / count, worst
+
+
+def rebuild_us():
+    """ Return (us to work out every curve, us for a trim change, builds after both) """
+    table = mixer.Mixer(**SETTINGS)
+    start = time.perf_counter_ns()
+    table.configure(steer_expo=30, throttle_expo=10, left_gain=98, right_gain=96)
+    every = (time.perf_counter_ns() - start) / 1000
+    start = time.perf_counter_ns()
+    table.configure(steer_trim=-10, steer_expo=30)
+    trim = (time.perf_counter_ns() - start) / 1000
+    return every, trim, table.builds
+
+
+class NoViper:
+    """ Import hook that fails mixer_viper like a port without the viper emitter does """
+
+    def find_spec(self, name, path=None, target=None):
+        if name == "mixer_viper":
+            raise SyntaxError("invalid micropython decorator")
+        return None
+
+
+def without_viper():
+    """ Return a Mixer(viper=True) from a mixer.py loaded where mixer_viper.py can't compile """
+    sys.meta_path.insert(0, NoViper())
+    saved = sys.modules.pop("mixer_viper")
+    try:
+        spec = importlib.util.spec_from_file_location("mixer_no_viper", mixer.__file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.meta_path.pop(0)
+        sys.modules["mixer_viper"] = saved
+    return module.Mixer(viper=True, **SETTINGS)
+
+
+def main():
+    inputs = sticks(CALLS)
+    print(f"{CALLS} mixes of random stick positions")
+    print(f"{'mixer':8} {'host ns':>8} {'bytecodes':>10} {'floats':>7}")
+    for name, mix in variants():
+        ns = host_ns(mix, inputs)
+        # Machine code on the device, no bytecodes
+        codes = f"{vm_cost(mix, inputs[:2000]):10.1f}" if name != "viper" else f"{'-':>10}"
+        floats = floats_made(mix, inputs[:2000])
+        print(f"{name:8} {ns:8.0f} {codes} {floats:7.1f}")
+    mean, worst = accuracy()
+    print()
+    print(f"tables against floats, every {GRID_STEP} thousandths of both axes: mean {mean:.2f}, "
+          f"max {worst} thousandths; viper matches the tables")
+    every, trim, builds = rebuild_us()
+    print(f"working out the curves again: all of them {every:.0f} us, a trim change {trim:.0f} us "
+          f"(curves built {builds} times: at start and for the first change only)")
+    print(f"tables: {len(mixer.Mixer().tables) * 2} bytes")
+    fallback = without_viper()
+    table = mixer.Mixer(**SETTINGS)
+    if fallback.viper or any(fallback.mix(*stick) != table.mix(*stick) for stick in inputs[:2000]):
+        raise AssertionError("without the viper emitter Mixer(viper=True) should mix like the tables")
+    print("without the viper emitter: mixer.py still imports and viper=True mixes in Python")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Benchmark: queue depth and command age under a held button
+# Compares the old blocking move_robot() pulses with motion.MotionExecutor,
+# both driving the simulated Burgerbot in sim/
+#
+#   python benchmarks/bench_motion.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import uasyncio as asyncio  # noqa: E402
+from burgerbot import Burgerbot  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+import motion  # noqa: E402
+
+HOLD_MS = 1000
+NOTIFY_INTERVAL_MS = 10
+
+
+def blocking():
+    """ Notifications pile up in the stack while each one blocks for a 0.1 s pulse """
+    bot = Burgerbot()
+    start = ticks_us()
+    handled = 0
+    max_depth = 0
+    ages = []
+    while True:
+        now = ticks_diff(ticks_us(), start) // 1000
+        if now >= HOLD_MS:
+            break
+        arrived = min(now // NOTIFY_INTERVAL_MS + 1, HOLD_MS // NOTIFY_INTERVAL_MS)
+        max_depth = max(max_depth, arrived - handled)
+        ages.append(now - handled * NOTIFY_INTERVAL_MS)
+        bot.forward(0.1)
+        bot.stop()
+        handled += 1
+    backlog = HOLD_MS // NOTIFY_INTERVAL_MS - handled
+    return handled, max_depth, max(ages), backlog, None
+
+
+async def executor():
+    bot = Burgerbot()
+    motion_executor = motion.MotionExecutor(bot)
+    task = asyncio.create_task(motion_executor.run())
+    for _ in range(HOLD_MS // NOTIFY_INTERVAL_MS):
+        motion_executor.submit(motion.FORWARD)
+        await asyncio.sleep_ms(NOTIFY_INTERVAL_MS)
+    released = ticks_us()
+    motion_executor.submit(motion.STOP)
+    while bot.left or bot.right:
+        await asyncio.sleep_ms(0)
+    stop_us = ticks_diff(ticks_us(), released)
+    task.cancel()
+    return (motion_executor.submitted, motion_executor.max_depth,
+            motion_executor.max_age_us / 1000, 0, stop_us)
+
+
+def main():
+    print(f"held button, {1000 // NOTIFY_INTERVAL_MS} notifications/s for {HOLD_MS} ms")
+    print(f"{'mode':9} {'handled':>8} {'max depth':>10} {'max age ms':>11} {'backlog':>8} {'stop us':>8}")
+    for name, result in (("blocking", blocking()), ("executor", asyncio.run(executor()))):
+        handled, depth, age, backlog, stop_us = result
+        stop = "-" if stop_us is None else stop_us
+        print(f"{name:9} {handled:8} {depth:10} {age:11.1f} {backlog:8} {stop:>8}")
+
+
+if __name__ == "__main__":
+    main()
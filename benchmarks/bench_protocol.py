@@ -0,0 +1,56 @@
+# Benchmark: encode / decode throughput of the protocol frames
+#
+#   python benchmarks/bench_protocol.py
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import protocol  # noqa: E402
+
+N = 200_000
+
+CHORD = protocol.BUTTON_A | protocol.BUTTON_X
+AXES = (64, -32)
+FRAME = protocol.encode(CHORD, 1234)
+FRAME_AXES = protocol.encode(CHORD, 1234, AXES)
+BUFFER = bytearray(protocol.MAX_FRAME_SIZE)
+
+
+def ascii_decode(command):
+    """ The old one letter per button dispatch """
+    if command == b"a":
+        return protocol.BUTTON_A
+    elif command == b"b":
+        return protocol.BUTTON_B
+    elif command == b"x":
+        return protocol.BUTTON_X
+    elif command == b"y":
+        return protocol.BUTTON_Y
+    return 0
+
+
+CASES = (
+    ("encode", lambda: protocol.encode(CHORD, 1234)),
+    ("encode axes", lambda: protocol.encode(CHORD, 1234, AXES)),
+    ("encode_into", lambda: protocol.encode_into(BUFFER, CHORD, 1234)),
+    ("decode", lambda: protocol.decode(FRAME)),
+    ("decode axes", lambda: protocol.decode(FRAME_AXES)),
+    ("ascii decode", lambda: ascii_decode(b"y")),
+)
+
+
+def main():
+    print(f"{'case':14} {'ns/op':>8} {'ops/s':>12}")
+    for name, func in CASES:
+        seconds = min(timeit.repeat(func, number=N, repeat=3))
+        print(f"{name:14} {seconds / N * 1e9:8.0f} {N / seconds:12.0f}")
+    # A chord used to need one notification per button
+    print(f"A+X chord: {len(FRAME)} bytes in 1 notification (was 2 notifications)")
+
+
+if __name__ == "__main__":
+    main()
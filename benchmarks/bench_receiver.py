@@ -0,0 +1,99 @@
+# Benchmark: subscribe-once NotificationReceiver vs GATT read polling
+# Runs both centrals against the simulated aioble link in sim/
+#
+#   python benchmarks/bench_receiver.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_us  # noqa: E402
+
+import protocol  # noqa: E402
+from receiver import NotificationReceiver  # noqa: E402
+
+_SERVICE_UUID = bluetooth.UUID(0x1848)
+_CHARACTERISTIC_UUID = bluetooth.UUID(0x2A6E)
+
+FRAMES = 200
+FRAME_INTERVAL_MS = 20
+INTERVAL_MS = 15
+
+
+async def remote(characteristic, sent):
+    connection = await aioble.advertise(100_000, name="KevsRobots")
+    await asyncio.sleep_ms(200)
+    for seq in range(FRAMES):
+        frame = protocol.encode(protocol.BUTTON_A, seq)
+        sent[seq] = ticks_us()
+        characteristic.write(frame)
+        characteristic.notify(connection, frame)
+        await asyncio.sleep_ms(FRAME_INTERVAL_MS)
+    await asyncio.sleep_ms(100)
+    await connection.disconnect()
+
+
+async def connect():
+    device = aioble.Device(aioble.ADDR_PUBLIC, aioble.local_address)
+    connection = await device.connect()
+    service = await connection.service(_SERVICE_UUID)
+    return connection, await service.characteristic(_CHARACTERISTIC_UUID)
+
+
+async def polling(seen):
+    """ The old client_test.py loop """
+    connection, characteristic = await connect()
+    try:
+        while True:
+            frame = await characteristic.read()
+            if frame:
+                seen.setdefault(protocol.frame_seq(frame), ticks_us())
+            await asyncio.sleep_ms(1)
+    except aioble.DeviceDisconnectedError:
+        pass
+    return connection._link, None
+
+
+async def notified(seen):
+    connection, characteristic = await connect()
+
+    def handler(frame):
+        seen.setdefault(protocol.frame_seq(frame), ticks_us())
+
+    receiver = NotificationReceiver(characteristic, {protocol.PROTOCOL_VERSION: handler})
+    try:
+        await receiver.run()
+    except aioble.DeviceDisconnectedError:
+        pass
+    return connection._link, receiver
+
+
+async def run(central):
+    aioble.reset()
+    aioble.connection_interval_ms = INTERVAL_MS
+    service = aioble.Service(_SERVICE_UUID)
+    characteristic = aioble.Characteristic(service, _CHARACTERISTIC_UUID, read=True, notify=True)
+    aioble.register_services(service)
+    sent, seen = {}, {}
+    _, (link, receiver) = await asyncio.gather(remote(characteristic, sent), central(seen))
+    latencies = sorted(ticks_diff(seen[seq], sent[seq]) / 1000 for seq in seen if seq in sent)
+    return len(seen), latencies, link, receiver
+
+
+def main():
+    print(f"{FRAMES} frames every {FRAME_INTERVAL_MS} ms, connection interval {INTERVAL_MS} ms")
+    print(f"{'mode':9} {'seen':>5} {'p50 ms':>7} {'max ms':>7} {'ATT rt':>7} {'events':>7}  counters")
+    for name, central in (("polling", polling), ("notified", notified)):
+        count, latencies, link, receiver = asyncio.run(run(central))
+        counters = receiver.stats() if receiver else "-"
+        print(f"{name:9} {count:5} {latencies[len(latencies) // 2]:7.1f} {latencies[-1]:7.1f} "
+              f"{link.round_trips:7} {link.events:7}  {counters}")
+
+
+if __name__ == "__main__":
+    main()
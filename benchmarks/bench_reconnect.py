@@ -0,0 +1,93 @@
+# Benchmark: reconnect time after a dropout, scanning vs the peer cache
+# The simulated aioble link is dropped every few hundred ms; the remote
+# goes straight back to advertising like remote.py does.
+#
+#   python benchmarks/bench_reconnect.py
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_ms  # noqa: E402
+
+from peer_cache import PeerCache  # noqa: E402
+
+_REMOTE_SERVICE = bluetooth.UUID(0x1800)
+
+ADV_INTERVAL_US = 250_000
+DROPOUTS = 8
+
+
+async def remote():
+    """ Advertise again as soon as the robot goes away """
+    while True:
+        connection = await aioble.advertise(ADV_INTERVAL_US, name="KevsRobots", services=[_REMOTE_SERVICE])
+        await connection.disconnected()
+
+
+async def find_remote():
+    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
+        async for result in scanner:
+            if result.name() == "KevsRobots" and _REMOTE_SERVICE in result.services():
+                return result.device
+    return None
+
+
+async def scan_connect():
+    device = await find_remote()
+    return await device.connect()
+
+
+async def robot(connect, times):
+    for _ in range(DROPOUTS + 1):
+        start = ticks_ms()
+        connection = await connect()
+        times.append(ticks_diff(ticks_ms(), start))
+        # Stay connected for a while, then lose the link
+        await asyncio.sleep_ms(300)
+        connection._link.close()
+
+
+async def run(mode, path):
+    aioble.reset()
+    times = []
+    if mode == "scan":
+        connect = scan_connect
+    else:
+        peers = PeerCache(path)
+        connect = lambda: peers.connect(find_remote)  # noqa: E731
+    advertiser = asyncio.create_task(remote())
+    await robot(connect, times)
+    advertiser.cancel()
+    # The first connection always has to scan
+    return times[0], times[1:]
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "remote_peer.json")
+    print(f"advertising every {ADV_INTERVAL_US // 1000} ms, {DROPOUTS} dropouts")
+    print(f"{'mode':6} {'first ms':>9} {'mean ms':>8} {'max ms':>7}")
+    for mode in ("scan", "cache"):
+        first, times = asyncio.run(run(mode, path))
+        print(f"{mode:6} {first:9} {sum(times) / len(times):8.0f} {max(times):7}")
+    # A cached remote that never comes back costs the timeout, then a scan
+    peers = PeerCache(path, timeout_ms=500)
+
+    async def missing():
+        aioble.reset()
+        start = ticks_ms()
+        connection = await peers.connect(find_remote)
+        return connection, ticks_diff(ticks_ms(), start)
+
+    connection, elapsed = asyncio.run(missing())
+    print(f"cached remote gone: {elapsed} ms, connected: {connection is not None}, {peers.stats()}")
+
+
+if __name__ == "__main__":
+    main()
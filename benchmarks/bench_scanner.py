@@ -0,0 +1,119 @@
+# Benchmark: raw-pattern ScanEngine vs the old decode-every-advert find_remote()
+# Uses a synthetic capture of a busy room: phones, beacons, a decoy that is
+# also called "KevsRobots", and the real remote appearing after 1.2 s.
+#
+#   python benchmarks/bench_scanner.py
+
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import aioble  # noqa: E402
+import bluetooth  # noqa: E402
+import uasyncio as asyncio  # noqa: E402
+from utime import ticks_diff, ticks_ms  # noqa: E402
+
+from scanner import ScanEngine, name_pattern, service_pattern  # noqa: E402
+
+_REMOTE_SERVICE = bluetooth.UUID(0x1800)
+_REMOTE_ADDR = b"\x28\xcd\xc1\x0a\x00\x01"
+
+CAPTURE_MS = 2500
+BACKGROUND_DEVICES = 80
+REMOTE_APPEARS_MS = 1200
+
+
+def capture():
+    """ A list of (time_ms, addr, adv_data, resp_data) sorted by time """
+    rng = random.Random(3)
+    devices = []
+    for index in range(BACKGROUND_DEVICES):
+        kind = index % 4
+        if kind == 0:
+            payloads = aioble._build_payloads(f"Phone {index}", None, 64, None)
+        elif kind == 1:
+            payloads = aioble._build_payloads(None, None, 0, (0x004C, rng.randbytes(20)))
+        elif kind == 2:
+            payloads = aioble._build_payloads(None, [bluetooth.UUID(0xFEAA)], 0, (0x0059, rng.randbytes(8)))
+        else:
+            payloads = aioble._build_payloads("Fitness band", [bluetooth.UUID(0x180D)], 0, None)
+        devices.append((rng.randbytes(6), payloads, rng.randint(100, 1000), 0))
+    # Someone else's remote with the same name but another service
+    devices.append((rng.randbytes(6), aioble._build_payloads("KevsRobots", [bluetooth.UUID(0x181A)], 384, None), 250, 0))
+    devices.append((_REMOTE_ADDR, aioble._build_payloads("KevsRobots", [_REMOTE_SERVICE], 384, None), 250, REMOTE_APPEARS_MS))
+    packets = []
+    for addr, (adv_data, resp_data), interval, start in devices:
+        time = start + rng.random() * interval
+        while time < CAPTURE_MS:
+            packets.append((time, addr, adv_data, resp_data))
+            time += interval + rng.random() * 10
+    packets.sort(key=lambda packet: packet[0])
+    return packets
+
+
+def old_matches(result):
+    """ The checks find_remote() used to make on every advert """
+    if result.name() == "KevsRobots":
+        for item in result.services():
+            pass
+        if _REMOTE_SERVICE in result.services():
+            return True
+    return False
+
+
+async def old_find_remote():
+    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
+        async for result in scanner:
+            if old_matches(result):
+                return result.device
+    return None
+
+
+def throughput(packets, engine):
+    results = []
+    for _, addr, adv_data, resp_data in packets:
+        result = aioble.ScanResult(aioble.Device(aioble.ADDR_PUBLIC, addr))
+        result.adv_data, result.resp_data = adv_data, resp_data
+        results.append(result)
+
+    def old():
+        for result in results:
+            old_matches(result)
+
+    def raw():
+        for result in results:
+            engine.matches(result.adv_data, result.resp_data)
+
+    rates = []
+    for func in (old, raw):
+        seconds = min(timeit.repeat(func, number=5, repeat=3)) / 5
+        rates.append(len(results) / seconds)
+    return rates
+
+
+async def time_to_match(find, packets):
+    aioble.reset()
+    aioble.replay(packets)
+    start = ticks_ms()
+    device = await find()
+    return ticks_diff(ticks_ms(), start), device
+
+
+def main():
+    packets = capture()
+    engine = ScanEngine((name_pattern("KevsRobots"), service_pattern(_REMOTE_SERVICE)))
+    old_rate, raw_rate = throughput(packets, engine)
+    print(f"capture: {len(packets)} adverts in {CAPTURE_MS} ms, remote from {REMOTE_APPEARS_MS} ms")
+    print(f"{'matcher':10} {'adverts/s':>11} {'match ms':>9}  device")
+    for name, rate, find in (("decode", old_rate, old_find_remote), ("raw", raw_rate, engine.find)):
+        elapsed, device = asyncio.run(time_to_match(find, packets))
+        print(f"{name:10} {rate:11.0f} {elapsed:9}  {device}")
+    print(f"engine: {engine.stats()}, passive scan: {not engine.active}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmark: notifications per minute, resend-while-held vs change-only
+# A two minute input session (taps, long holds, chords and idle spells) is
+# played into remote.py (pin interrupts) and remote_control.py (10 ms
+# polling), each driving robot_code.py in the simulator. The old scheme -
+# write every 10 ms poll and notify on every poll while a button is held -
+# is counted from the same session.
+#
+#   python benchmarks/bench_send_schedule.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+from simulator import Simulation, motor_latencies  # noqa: E402
+
+ROBOT = os.path.join(ROOT, "robot_code.py")
+
+# Label, script, its button pins for A, B, X and Y, autorepeat ms (None
+# keeps the script's setting)
+REMOTES = (
+    ("remote.py", "remote.py", (0, 1, 2, 3), None),
+    ("remote_control.py", "remote_control.py", (12, 13, 14, 15), None),
+    ("remote.py, autorepeat off", "remote.py", (0, 1, 2, 3), 0),
+)
+
+MOTORS = ((1, 1), (-1, -1), (-1, 1), (1, -1))
+
+SESSION_START_MS = 3000
+SESSION_MS = 120_000
+POLL_MS = 10
+
+
+def session():
+    """ A repeatable recording of (button, at_ms, hold_ms) """
+    rng = random.Random(5)
+    presses = []
+    at_ms = SESSION_START_MS
+    while at_ms < SESSION_START_MS + SESSION_MS - 5000:
+        button = rng.randrange(4)
+        kind = rng.random()
+        if kind < 0.6:
+            hold_ms = rng.randint(80, 200)
+        elif kind < 0.85:
+            hold_ms = rng.randint(500, 3000)
+        else:
+            # A chord: a second button joins part way through a hold
+            hold_ms = rng.randint(600, 2000)
+            presses.append(((button + 1) % 4, at_ms + 200, hold_ms - 300))
+        presses.append((button, at_ms, hold_ms))
+        gap_ms = rng.randint(5000, 15000) if rng.random() < 0.05 else rng.randint(200, 1500)
+        at_ms += hold_ms + gap_ms
+    return presses
+
+
+def old_scheme(presses):
+    """ (writes, notifications) for a 10 ms loop that writes every time and notifies while held """
+    polls = SESSION_MS // POLL_MS
+    notifications = 0
+    for poll in range(polls):
+        time = SESSION_START_MS + poll * POLL_MS
+        if any(at_ms <= time < at_ms + hold_ms for _, at_ms, hold_ms in presses):
+            notifications += 1
+    return polls, notifications
+
+
+def new_scheme(script, pins, repeat_ms, presses):
+    name = os.path.splitext(script)[0]
+
+    def setup(sim):
+        if repeat_ms is not None:
+            sim.scripts[name].module.schedule.repeat_ms = repeat_ms
+
+    sim = Simulation((os.path.join(ROOT, script), ROBOT), seed=1)
+    for button, at_ms, hold_ms in presses:
+        sim.press(pins[button], at_ms, hold_ms)
+    sim.run(SESSION_START_MS + SESSION_MS, setup=setup)
+    characteristic = sim.scripts[name].module.button_characteristic
+    motors = {pin: MOTORS[index] for index, pin in enumerate(pins)}
+    moved = [latency for latency in motor_latencies(sim.presses, sim.scripts["robot_code"].module.bot.log, motors)
+             if latency is not None]
+    return characteristic.writes, characteristic.notifications, sim.scripts[name].module.schedule, len(moved)
+
+
+def main():
+    presses = session()
+    minutes = SESSION_MS / 60_000
+    writes, notifications = old_scheme(presses)
+    print(f"session: {len(presses)} presses over {SESSION_MS // 1000} s")
+    print(f"{'scheme':32} {'writes/min':>11} {'notifies/min':>13}  moved")
+    print(f"{'old, 10 ms resend while held':32} {writes / minutes:11.0f} {notifications / minutes:13.0f}")
+    for label, script, pins, repeat_ms in REMOTES:
+        writes, notifications, schedule, moved = new_scheme(script, pins, repeat_ms, presses)
+        print(f"{label:32} {writes / minutes:11.0f} {notifications / minutes:13.0f}  {moved}/{len(presses)}")
+        print(f"{'':32} {schedule.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Benchmark: press to motor latency, remote.py driving robot_code.py
+# Both scripts run unmodified in the virtual-time simulator; pin presses on
+# the remote go through its IRQs, the simulated link and the robot's
+# receiver and motion executor to the Burgerbot stand-in.
+#
+#   python benchmarks/bench_simulation.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+from simulator import Simulation, motor_latencies  # noqa: E402
+
+SCRIPTS = (os.path.join(ROOT, "remote.py"), os.path.join(ROOT, "robot_code.py"))
+
+# Buttons A, B, X and Y and the motors (left, right) each one should drive
+MOTORS = {0: (1, 1), 1: (-1, -1), 2: (-1, 1), 3: (1, -1)}
+
+PRESSES = 60
+FIRST_PRESS_MS = 3000
+PRESS_GAP_MS = 500
+
+# (label, forced interval ms, packet loss, jitter ms); None keeps the
+# interval the robot asks for
+LINKS = (
+    ("robot's choice", None, 0.0, 0.0),
+    ("30 ms", 30, 0.0, 0.0),
+    ("30 ms, 10% loss", 30, 0.1, 0.0),
+    ("30 ms, 10% loss, 5 ms jitter", 30, 0.1, 5.0),
+    ("100 ms", 100, 0.0, 0.0),
+)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def simulate(interval_ms, packet_loss, jitter_ms):
+    sim = Simulation(SCRIPTS, interval_ms, packet_loss, jitter_ms, seed=1)
+    rng = random.Random(2)
+    at_ms = FIRST_PRESS_MS
+    for index in range(PRESSES):
+        # Random gaps so presses land all over the connection interval
+        at_ms += PRESS_GAP_MS + rng.randrange(-100, 100)
+        sim.press(index % 4, at_ms, rng.randrange(120, 200))
+    sim.run(at_ms + 2 * PRESS_GAP_MS)
+    bot = sim.scripts["robot_code"].module.bot
+    return sim, motor_latencies(sim.presses, bot.log, MOTORS)
+
+
+def main():
+    print(f"{'link':30} {'moved':>6} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    for label, interval_ms, packet_loss, jitter_ms in LINKS:
+        sim, latencies = simulate(interval_ms, packet_loss, jitter_ms)
+        moved = sorted(latency / 1000 for latency in latencies if latency is not None)
+        print(f"{label:30} {len(moved):>3}/{len(latencies):<2} {percentile(moved, 0.5):7.1f} "
+              f"{percentile(moved, 0.9):7.1f} {percentile(moved, 0.99):7.1f} {moved[-1]:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
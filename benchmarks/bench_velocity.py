@@ -0,0 +1,199 @@
+# Benchmark: ramp accuracy, tick jitter and smoothness of velocity.VelocityLoop
+# Runs in virtual time against the simulated Burgerbot, with motor.Motor
+# stand-ins for its motors through wheels.Wheels. The commanded speed
+# is sampled every ms and fed to a simple motor model (wheel speed follows
+# the command with a MOTOR_TAU_MS time constant).
+#
+# Ramps: full speed from rest, a stop and a reverse through zero, with the
+# loop alone and with another task blocking the loop for up to HOG_MS at a
+# time. The error is how far the commanded speed is from the ideal ramp.
+#
+# Held button: a button held for HOLD_MS with notifications arriving every
+# 50 ms give or take, some late, through motion.MotionExecutor, driving the
+# Burgerbot directly (100 ms pulses) or through the velocity loop.
+#
+#   python benchmarks/bench_velocity.py
+
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import uasyncio as asyncio  # noqa: E402
+import utime  # noqa: E402
+from burgerbot import Burgerbot  # noqa: E402
+from motor import Motor, pico_motor_shim  # noqa: E402
+from simulator import run_virtual  # noqa: E402
+
+import motion  # noqa: E402
+import velocity  # noqa: E402
+from wheels import Wheels  # noqa: E402
+
+MOTOR_TAU_MS = 50
+HOG_MS = 6
+HOLD_MS = 3000
+NOTIFY_MS = 50
+
+# (name, start speed, setpoint)
+RAMPS = (
+    ("rest to full", 0, 1000),
+    ("full to stop", 1000, 0),
+    ("full to reverse", 1000, -1000),
+    ("half to full", 500, 1000),
+)
+
+
+def ideal(start, target, ms, acceleration, deceleration):
+    """ Speed ms after the setpoint changed, ramping at exactly the configured rates """
+    speed = start
+    remaining = ms / 1000
+    # Slowing down to 0 first if the setpoint is the other way or lower
+    if start and (target * start < 0 or abs(target) < abs(start)):
+        stop_at = 0 if target * start <= 0 else target
+        needed = abs(start - stop_at) / deceleration
+        if remaining < needed:
+            return start - (1 if start > 0 else -1) * deceleration * remaining
+        speed = stop_at
+        remaining -= needed
+    if speed == target:
+        return speed
+    reach = abs(target - speed) / acceleration
+    if remaining >= reach:
+        return target
+    return speed + (1 if target > speed else -1) * acceleration * remaining
+
+
+def commanded(log, start_us, duration_ms):
+    """ The left speed in a Burgerbot or left motor log, every ms from start_us, in thousandths """
+    samples = []
+    speed = 0
+    changes = iter(log)
+    change = next(changes, None)
+    for ms in range(duration_ms):
+        now = start_us + ms * 1000
+        while change is not None and utime.ticks_diff(change[0], now) <= 0:
+            speed = round(change[1] * 1000)
+            change = next(changes, None)
+        samples.append(speed)
+    return samples
+
+
+async def hog(rng):
+    """ Another task that now and then keeps the loop busy for up to HOG_MS """
+    while True:
+        await asyncio.sleep_ms(rng.randrange(1, 20))
+        utime.sleep_us(rng.randrange(HOG_MS * 1000))
+
+
+def ramp_run(start, target, loaded, seed=1):
+    """ Return (commanded speed every ms, VelocityLoop) for one setpoint change """
+    left = Motor(pico_motor_shim.MOTOR_1)
+    loop = velocity.VelocityLoop(Wheels(Burgerbot(), left, Motor(pico_motor_shim.MOTOR_2)))
+    started = []
+
+    async def main():
+        task = asyncio.create_task(loop.run())
+        hog_task = asyncio.create_task(hog(random.Random(seed))) if loaded else None
+        # Get to the start speed first
+        loop.drive(start, start)
+        while not loop.settled():
+            await asyncio.sleep_ms(1)
+        loop.ticks = loop.skipped = loop.total_jitter_us = loop.max_jitter_us = 0
+        started.append(utime.ticks_us())
+        loop.drive(target, target)
+        await asyncio.sleep_ms(600)
+        task.cancel()
+        if hog_task:
+            hog_task.cancel()
+
+    run_virtual(main())
+    return commanded(left.log, started[0], 600), loop
+
+
+def settle_ms(samples, target):
+    """ ms until the commanded speed reached the setpoint """
+    for ms, speed in enumerate(samples):
+        if speed == target:
+            return ms
+    return None
+
+
+def motor(samples):
+    """ Wheel speed every ms for the commanded speeds, and its largest change in thousandths per second """
+    wheel = 0.0
+    speeds = []
+    peak = 0.0
+    for command in samples:
+        change = (command - wheel) / MOTOR_TAU_MS
+        wheel += change
+        peak = max(peak, abs(change) * 1000)
+        speeds.append(wheel)
+    return speeds, peak
+
+
+def held_button(ramped, seed=3):
+    """ Return (commanded speed every ms, slow downs during the hold, stops during the hold, largest step) """
+    bot = Burgerbot()
+    left = Motor(pico_motor_shim.MOTOR_1)
+    motors = velocity.VelocityLoop(Wheels(bot, left, Motor(pico_motor_shim.MOTOR_2))) if ramped else bot
+    executor = motion.MotionExecutor(motors)
+    rng = random.Random(seed)
+    started = []
+
+    async def main():
+        started.append(utime.ticks_us())
+        tasks = [asyncio.create_task(executor.run())]
+        if ramped:
+            tasks.append(asyncio.create_task(motors.run()))
+        held = 0
+        while held < HOLD_MS:
+            executor.submit(motion.FORWARD)
+            # Mostly on time, now and then a notification is late
+            gap = NOTIFY_MS + rng.randrange(-15, 15) + (rng.randrange(60, 120) if rng.random() < 0.1 else 0)
+            await asyncio.sleep_ms(gap)
+            held += gap
+        executor.submit(motion.STOP)
+        await asyncio.sleep_ms(500)
+        for task in tasks:
+            task.cancel()
+
+    run_virtual(main())
+    samples = commanded(left.log if ramped else bot.log, started[0], HOLD_MS + 500)
+    # From the first notification until the button is let go
+    hold = samples[NOTIFY_MS:HOLD_MS]
+    slowdowns = sum(1 for before, after in zip(hold, hold[1:]) if after < before)
+    stops = sum(1 for before, after in zip(hold, hold[1:]) if before and not after)
+    step = max(abs(after - before) for before, after in zip(samples, samples[1:]))
+    return samples, slowdowns, stops, step
+
+
+def main():
+    acceleration, deceleration = velocity.ACCELERATION, velocity.DECELERATION
+    print(f"ramps at {acceleration}/s up, {deceleration}/s down, {velocity.VELOCITY_TICK_MS} ms tick, "
+          f"thousandths of full speed")
+    print(f"{'ramp':16} {'load':6} {'settle ms':>9} {'ideal ms':>8} {'mean err':>9} {'max err':>8} "
+          f"{'ticks':>6} {'skipped':>7} {'jitter mean us':>14} {'max us':>7}")
+    for name, start, target in RAMPS:
+        wanted = [ideal(start, target, ms, acceleration, deceleration) for ms in range(600)]
+        ideal_ms = settle_ms([round(speed) for speed in wanted], target)
+        for loaded in (False, True):
+            samples, loop = ramp_run(start, target, loaded)
+            errors = [abs(got - want) for got, want in zip(samples, wanted)]
+            print(f"{name:16} {'hog' if loaded else 'idle':6} {settle_ms(samples, target):9} {ideal_ms:8} "
+                  f"{sum(errors) / len(errors):9.1f} {max(errors):8.0f} {loop.ticks:6} {loop.skipped:7} "
+                  f"{loop.total_jitter_us // max(1, loop.ticks):14} {loop.max_jitter_us:7}")
+
+    print()
+    print(f"held button, {HOLD_MS} ms, notifications every {NOTIFY_MS} ms give or take, "
+          f"motor time constant {MOTOR_TAU_MS} ms")
+    print(f"{'motors':20} {'slow downs':>10} {'stops':>6} {'largest step':>12} {'peak motor accel/s':>18}")
+    for label, ramped in (("pulses (Burgerbot)", False), ("VelocityLoop", True)):
+        samples, slowdowns, stops, step = held_button(ramped)
+        _, peak = motor(samples)
+        print(f"{label:20} {slowdowns:10} {stops:6} {step:12} {peak:18.0f}")
+
+
+if __name__ == "__main__":
+    main()
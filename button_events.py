@@ -0,0 +1,176 @@
+# Interrupt driven button capture
+# Pin IRQs write timestamped press / release edges into a preallocated ring
+# buffer; an async consumer only wakes up when there is something to read.
+# They are hard IRQs, so an edge is stamped the moment it happens and can't
+# run in the middle of settle() or poll(), which turn interrupts off; the
+# handler allocates nothing, as a hard IRQ has to.
+# Edges go through a Debouncer so contact bounce gives one clean edge.
+# Given a bank (see gpio_bank.py), settle() and poll() read every pin from
+# one snapshot instead of one Pin.value() call each.
+
+import array
+
+import machine
+import micropython
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_diff, ticks_ms, ticks_us
+
+from alarm import Alarm
+from debounce import DEBOUNCE_US, Debouncer
+
+# Ring buffer size, must be a power of two
+EVENT_BUFFER_SIZE = const(32)
+
+# So an exception in a hard IRQ can still be reported
+micropython.alloc_emergency_exception_buf(100)
+
+
+class EdgeReader:
+    """ pop() and clear() for a source of button edges that has pop_into() """
+
+    def pop(self):
+        """ Return the oldest event as (button, pressed, ticks_us), or None """
+        event = [0, False, 0]
+        if not self.pop_into(event):
+            return None
+        return event[0], event[1], event[2]
+
+    def clear(self):
+        """ Throw away any unread events """
+        while self.pop():
+            pass
+
+
+class ButtonEvents(EdgeReader):
+    """ Capture button edges from pin interrupts """
+
+    def __init__(self, pins, size=EVENT_BUFFER_SIZE, active_low=True, debounce_us=DEBOUNCE_US, bank=None):
+        self.pins = pins
+        self.bank = bank
+        self.active_low = active_low
+        self.debouncer = Debouncer(len(pins), debounce_us)
+        self._mask = size - 1
+        self._times = array.array("L", [0] * size)
+        self._codes = bytearray(size)
+        # _head is only written with interrupts off (in the hard IRQ, or
+        # settle() and poll()), _tail only by the consumer
+        self._head = 0
+        self._tail = 0
+        self._flag = asyncio.ThreadSafeFlag()
+        # Ends the waits that have a timeout
+        self._alarm = Alarm(self._flag)
+        self.dropped = 0
+        self.state = 0
+        for index, pin in enumerate(pins):
+            pin.irq(self._handler(index), machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING, hard=True)
+
+    def _handler(self, index):
+        """ Build the hard IRQ handler for one pin, allocated once at start up """
+        active = 0 if self.active_low else 1
+        debouncer = self.debouncer
+
+        def handler(pin):
+            now = ticks_us()
+            dirty = debouncer.dirty
+            if debouncer.update(index, pin.value() == active, now):
+                self._push(index, debouncer.state >> index & 1, now)
+            elif debouncer.dirty != dirty:
+                # Bouncing; wake the consumer so it reads the pin again later
+                self._flag.set()
+
+        return handler
+
+    def _push(self, index, pressed, time):
+        head = self._head
+        next_head = (head + 1) & self._mask
+        if next_head == self._tail:
+            self.dropped += 1
+            return
+        self._times[head] = time
+        self._codes[head] = index << 1 | pressed
+        self._head = next_head
+        self._flag.set()
+
+    def settle(self):
+        """ Read again any pins that bounced once their hold-off is over """
+        debouncer = self.debouncer
+        if not debouncer.dirty:
+            return
+        irq_state = machine.disable_irq()
+        now = ticks_us()
+        due = debouncer.due(now)
+        pressed = self._pressed()
+        index = 0
+        while due:
+            if due & 1 and debouncer.update(index, bool(pressed >> index & 1), now):
+                self._push(index, debouncer.state >> index & 1, now)
+            due >>= 1
+            index += 1
+        machine.enable_irq(irq_state)
+
+    def _pressed(self):
+        """ Return the pressed pins as a mask, from the bank or pin by pin """
+        if self.bank is not None:
+            return self.bank.read()
+        active = 0 if self.active_low else 1
+        pressed = 0
+        for index, pin in enumerate(self.pins):
+            if pin.value() == active:
+                pressed |= 1 << index
+        return pressed
+
+    def poll(self):
+        """ Read every pin now, for use without interrupts """
+        debouncer = self.debouncer
+        irq_state = machine.disable_irq()
+        now = ticks_us()
+        pressed = self._pressed()
+        for index in range(len(self.pins)):
+            if debouncer.update(index, bool(pressed >> index & 1), now):
+                self._push(index, debouncer.state >> index & 1, now)
+        machine.enable_irq(irq_state)
+
+    def any(self):
+        """ Return True if there are unread events """
+        return self._head != self._tail
+
+    def pop_into(self, event):
+        """ Write the oldest event into the list event as button, pressed, ticks_us and return True, or return False """
+        tail = self._tail
+        if tail == self._head:
+            return False
+        code = self._codes[tail]
+        event[2] = self._times[tail]
+        self._tail = (tail + 1) & self._mask
+        button = code >> 1
+        pressed = bool(code & 1)
+        if pressed:
+            self.state |= 1 << button
+        else:
+            self.state &= ~(1 << button)
+        event[0] = button
+        event[1] = pressed
+        return True
+
+    async def wait(self, timeout_ms=None):
+        """ Sleep until an edge arrives, or the timeout expires """
+        start = ticks_ms()
+        while True:
+            self.settle()
+            if self.any():
+                return True
+            remaining = None
+            if timeout_ms is not None:
+                remaining = timeout_ms - ticks_diff(ticks_ms(), start)
+                if remaining <= 0:
+                    return False
+            # Wake up again when a bouncing pin can be read
+            settle_us = self.debouncer.settle_us(ticks_us())
+            if settle_us is not None:
+                settle_ms = settle_us // 1000 + 1
+                if remaining is None or settle_ms < remaining:
+                    remaining = settle_ms
+            if remaining is not None:
+                self._alarm.start(remaining)
+            await self._flag.wait()
@@ -0,0 +1,114 @@
+# Connections from several robots at once, for the remote
+# Each robot gets a slot, up to a fixed number, and the remote keeps
+# advertising while a slot is free. A slot remembers which channels its
+# robot asked for (button frames, joystick axes, emergency stops) and has
+# its own AckTracker, so one robot's losses don't hide in another's. A frame
+# is encoded once and the same buffer is notified to every robot that takes
+# its channel, so sending to more robots allocates nothing more.
+
+import uasyncio as asyncio
+from micropython import const
+
+import protocol
+from acks import AckTracker
+
+# Most robots connected at once. The BLE stack has its own limit on
+# connections, which the firmware is built with.
+MAX_CENTRALS = const(4)
+
+
+class CentralRegistry:
+    """ The robots connected to the remote, and the channels each one takes """
+
+    def __init__(self, capacity=MAX_CENTRALS):
+        self.capacity = capacity
+        # One slot per robot, None when free
+        self.connections = [None] * capacity
+        self.channels = bytearray(capacity)
+        self.acks = [AckTracker() for _ in range(capacity)]
+        self.count = 0
+        self._space = asyncio.Event()
+        # Statistics
+        self.joined = 0
+        self.left = 0
+        self.fanouts = 0
+        self.notifications = 0
+        self.failed = 0
+
+    def full(self):
+        return self.count >= self.capacity
+
+    def slot(self, connection):
+        """ Return the slot of a connection, or -1 """
+        for index in range(self.capacity):
+            if self.connections[index] is connection:
+                return index
+        return -1
+
+    def add(self, connection):
+        """ Give a new robot a free slot, sending it every channel; return the slot or -1 if full """
+        for index in range(self.capacity):
+            if self.connections[index] is None:
+                self.connections[index] = connection
+                self.channels[index] = protocol.CHANNELS_ALL
+                self.acks[index] = AckTracker()
+                self.count += 1
+                self.joined += 1
+                return index
+        return -1
+
+    def remove(self, connection):
+        """ Free the robot's slot and return it, its AckTracker stays until the slot is used again """
+        index = self.slot(connection)
+        if index < 0:
+            return index
+        self.connections[index] = None
+        self.channels[index] = 0
+        self.count -= 1
+        self.left += 1
+        self._space.set()
+        return index
+
+    async def wait_for_space(self):
+        """ Return once there is a free slot """
+        while self.full():
+            self._space.clear()
+            await self._space.wait()
+
+    def notify(self, characteristic, channel, data):
+        """ Notify data to every robot that takes the channel; return how many were sent it """
+        sent = 0
+        for index in range(self.capacity):
+            connection = self.connections[index]
+            if connection is None or not self.channels[index] & channel:
+                continue
+            try:
+                characteristic.notify(connection, data)
+                sent += 1
+            except Exception:
+                # Gone; its disconnect frees the slot
+                self.failed += 1
+        self.fanouts += 1
+        self.notifications += sent
+        return sent
+
+    def sent_frame(self, seq):
+        """ Record a button frame just notified, for every robot that takes them """
+        for index in range(self.capacity):
+            if self.connections[index] is not None and self.channels[index] & protocol.CHANNEL_FRAMES:
+                self.acks[index].sent_frame(seq)
+
+    def on_written(self, connection, data):
+        """ Handle a write to the ack characteristic: an ack, or the channels a robot wants """
+        index = self.slot(connection)
+        if index < 0:
+            return
+        if len(data) == protocol.CHANNELS_SIZE:
+            self.channels[index] = data[0] & protocol.CHANNELS_ALL
+        else:
+            self.acks[index].on_ack(data)
+
+    def stats(self):
+        """ Return the counters as a string, for printing """
+        return (f"centrals {self.count}/{self.capacity}: {self.joined} joined, {self.left} left, "
+                f"{self.fanouts} sends, {self.notifications} notifications, {self.failed} failed")
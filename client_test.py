@@ -5,6 +5,10 @@ import bluetooth
 import machine
 import uasyncio as asyncio
 
+import protocol
+from receiver import NotificationReceiver
+from scanner import ScanEngine, name_pattern, service_pattern
+
 # Bluetooth UUIDS can be found online at https://www.bluetooth.com/specifications/gatt/services/
 
 _REMOTE_UUID = bluetooth.UUID(0x1848)
@@ -15,22 +19,15 @@ led = machine.Pin("LED", machine.Pin.OUT)
 connected = False
 alive = False
 
-async def find_remote():
-    # Scan for 5 seconds, in active mode, with very low interval/window (to
-    # maximise detection rate).
-    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
-        async for result in scanner:
+# The remote puts its name and service in the advertising payload, so a
+# passive scan is enough
+remote_scanner = ScanEngine((name_pattern("KevsRobots"), service_pattern(_ENV_SENSE_UUID)))
 
-            # See if it matches our name
-            if result.name() == "KevsRobots":
-                print("Found KevsRobots")
-                for item in result.services():
-                    print (item)
-                if _ENV_SENSE_UUID in result.services():
-                    print("Found Robot Remote Service")
-                    return result.device
-            
-    return None
+async def find_remote():
+    device = await remote_scanner.find()
+    if device:
+        print("Found KevsRobots", remote_scanner.stats())
+    return device
 
 async def blink_task():
     print('blink task started')
@@ -45,6 +42,10 @@ async def blink_task():
             blink = 250
         await asyncio.sleep_ms(blink)
 
+def print_frame(frame):
+    """ Print a frame as it arrives """
+    print(frame, protocol.frame_seq(frame))
+
 async def peripheral_task():
     print('starting peripheral task')
     global connected
@@ -74,41 +75,24 @@ async def peripheral_task():
             except asyncio.TimeoutError:
                 print("Timeout discovering services/characteristics")
                 return
-            count = 0
-            while True:
-                if count > 10_000:
-                    count = 0
-                count += 1
-                
-                if control_characteristic == None:
-                    print('no characteristic')
-                    await asyncio.sleep_ms(10)
-                    return
-                
-                if control_characteristic != None:
-#                     print("checking for data")
-                    try:
-                        command = await control_characteristic.read()
-                        print(command, count)
-                        await asyncio.sleep_ms(1)
-                        
-                    except TypeError:
-                        print(f'something went wrong; remote disconnected?')
-                        connected = False
-                        alive = False
-                        return
-                    except asyncio.TimeoutError:
-                        print(f'something went wrong; timeout error?')
-                        connected = False
-                        alive = False
-                        return
-                    except asyncio.GattError:
-                        print(f'something went wrong; Gatt error - did the remote die?')
-                        connected = False
-                        alive = False
-                        return
-                await asyncio.sleep_ms(1)
-                
+            if control_characteristic == None:
+                print('no characteristic')
+                return
+            receiver = NotificationReceiver(
+                control_characteristic, {protocol.PROTOCOL_VERSION: print_frame}
+            )
+            try:
+                await receiver.run()
+            except asyncio.TimeoutError:
+                print(f'something went wrong; timeout error?')
+            except aioble.DeviceDisconnectedError:
+                print(f'something went wrong; remote disconnected?')
+            except aioble.GattError:
+                print(f'something went wrong; Gatt error - did the remote die?')
+            print(receiver.stats())
+            connected = False
+            alive = False
+            return
 
 async def main():
     tasks = []
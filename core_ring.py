@@ -0,0 +1,69 @@
+# Ring buffer for passing records between the RP2040's two cores
+# One side only ever puts and the other only ever gets, so there is no
+# lock: the write index is only stored by the producer, after the record is
+# in place, and the read index only by the consumer, after the record has
+# been read. Each index is a single word in an array, so the other core
+# always sees either the old value or the new one.
+
+import array
+
+from micropython import const
+
+# Ring buffer size, must be a power of two
+CORE_RING_SIZE = const(16)
+
+
+class CoreRing:
+    """ Fixed size (code, value) records from one producer to one consumer """
+
+    def __init__(self, size=CORE_RING_SIZE):
+        self._mask = size - 1
+        self._codes = bytearray(size)
+        self._values = array.array("L", [0] * size)
+        # Write index, then read index
+        self._index = array.array("L", [0, 0])
+        # Only counted by the producer
+        self.dropped = 0
+
+    def put(self, code, value):
+        """ Add a record, or return False and count it as dropped if the ring is full """
+        index = self._index
+        head = index[0]
+        next_head = (head + 1) & self._mask
+        if next_head == index[1]:
+            self.dropped += 1
+            return False
+        self._codes[head] = code
+        self._values[head] = value
+        # Publish it only once it is written
+        index[0] = next_head
+        return True
+
+    def any(self):
+        """ Return True if there are records to get """
+        index = self._index
+        return index[0] != index[1]
+
+    def get_into(self, record):
+        """ Write the oldest record into the list record as code, value and return True, or return False """
+        index = self._index
+        tail = index[1]
+        if tail == index[0]:
+            return False
+        record[0] = self._codes[tail]
+        record[1] = self._values[tail]
+        # Hand the slot back only once it is read
+        index[1] = (tail + 1) & self._mask
+        return True
+
+    def get(self):
+        """ Return the oldest record as (code, value), or None """
+        record = [0, 0]
+        if not self.get_into(record):
+            return None
+        return record[0], record[1]
+
+    def depth(self):
+        """ Return the number of records waiting """
+        index = self._index
+        return (index[0] - index[1]) & self._mask
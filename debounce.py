@@ -0,0 +1,74 @@
+# Debouncing for a bank of buttons
+# Leading-edge debounce: the first change on a pin is taken straight away,
+# stamped with the time it happened, and the pin is then held off for
+# DEBOUNCE_US while its contacts bounce. Anything seen during the hold-off
+# marks the pin dirty; once the hold-off is over a dirty pin is read again
+# and, if it settled the other way, a second edge is taken. So a clean
+# press adds no latency and a bouncy one gives exactly one edge.
+
+import array
+
+from micropython import const
+from utime import ticks_add, ticks_diff
+
+# Hold-off after each edge, long enough for most tactile switches to settle
+# while still allowing 50 presses a second
+DEBOUNCE_US = const(10_000)
+
+
+class Debouncer:
+    """ Debounced state of up to 30 buttons, one bit each """
+
+    def __init__(self, count, holdoff_us=DEBOUNCE_US):
+        self.count = count
+        self.holdoff_us = holdoff_us
+        # End of each button's hold-off, in ticks_us
+        self._until = array.array("L", [0] * count)
+        # Bit per button: in hold-off, and read during the hold-off
+        self._held = 0
+        self.dirty = 0
+        # Debounced state, bit set while the button is pressed
+        self.state = 0
+        self.bounces = 0
+
+    def update(self, index, pressed, now):
+        """ Feed a reading of one button taken at now (ticks_us); return True for a new edge """
+        bit = 1 << index
+        if self._held & bit:
+            if ticks_diff(now, self._until[index]) < 0:
+                self.dirty |= bit
+                self.bounces += 1
+                return False
+            self._held &= ~bit
+            self.dirty &= ~bit
+        if pressed == bool(self.state & bit):
+            return False
+        self.state ^= bit
+        self._until[index] = ticks_add(now, self.holdoff_us)
+        self._held |= bit
+        return True
+
+    def settle_us(self, now):
+        """ Return how long until a dirty button can be read again, or None if none are dirty """
+        dirty = self.dirty
+        if not dirty:
+            return None
+        soonest = None
+        for index in range(self.count):
+            if dirty & (1 << index):
+                remaining = ticks_diff(self._until[index], now)
+                if soonest is None or remaining < soonest:
+                    soonest = remaining
+        return max(0, soonest)
+
+    def due(self, now):
+        """ Return a mask of the dirty buttons whose hold-off is over, to be read again """
+        dirty = self.dirty
+        mask = 0
+        index = 0
+        while dirty:
+            if dirty & 1 and ticks_diff(now, self._until[index]) >= 0:
+                mask |= 1 << index
+            dirty >>= 1
+            index += 1
+        return mask
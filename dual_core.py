@@ -0,0 +1,229 @@
+# Running input scanning or motor control on the RP2040's second core
+# BLE, the LED and printing stay in the uasyncio loop on core 0, and one of
+# these runs in a plain loop on core 1 started with _thread. They only
+# share CoreRing records and a ThreadSafeFlag, so neither core ever waits
+# on a lock. Core 1 never prints; that stays on core 0 with the REPL.
+#
+# InputCore scans a gpio_bank every SCAN_US and debounces it; on core 0 it
+# looks just like ButtonEvents (wait, any, pop, state), with pop() and
+# clear() from the same EdgeReader. MotorCore takes MotionExecutor commands
+# from core 0 and runs the motors on core 1; given a velocity.VelocityLoop
+# it ticks that on core 1 too, so nothing on core 0 touches the motors.
+
+import _thread
+
+import uasyncio as asyncio
+from micropython import const
+from utime import sleep_us, ticks_add, ticks_diff, ticks_ms, ticks_us
+
+import motion
+from alarm import Alarm
+from button_events import EdgeReader
+from core_ring import CORE_RING_SIZE, CoreRing
+from debounce import DEBOUNCE_US, Debouncer
+from velocity import VelocityLoop
+
+# How often core 1 reads the buttons
+SCAN_US = const(1000)
+
+# How often core 1 checks for a new motor command
+MOTOR_POLL_US = const(500)
+
+
+class InputCore(EdgeReader):
+    """ Debounced button edges, scanned on core 1 """
+
+    def __init__(self, bank, debounce_us=DEBOUNCE_US, scan_us=SCAN_US, size=CORE_RING_SIZE):
+        self.bank = bank
+        self.pins = bank.pins
+        self.scan_us = scan_us
+        # The debouncer is only used on core 1
+        self.debouncer = Debouncer(len(bank.pins), debounce_us)
+        self._ring = CoreRing(size)
+        self._flag = asyncio.ThreadSafeFlag()
+        # Ends the waits that have a timeout
+        self._alarm = Alarm(self._flag)
+        self.running = False
+        self.scans = 0
+        # Buttons held, as seen by the consumer on core 0
+        self.state = 0
+
+    @property
+    def dropped(self):
+        return self._ring.dropped
+
+    def start(self):
+        """ Start scanning on core 1 """
+        self.running = True
+        _thread.start_new_thread(self._scan, ())
+
+    def stop(self):
+        """ Ask core 1 to stop scanning """
+        self.running = False
+
+    def _scan(self):
+        debouncer = self.debouncer
+        ring = self._ring
+        read = self.bank.read
+        while self.running:
+            now = ticks_us()
+            pressed = read()
+            # Only pins that differ from the debounced state, or are due to
+            # be read again after bouncing, need to go through the debouncer
+            changed = pressed ^ debouncer.state
+            if debouncer.dirty:
+                changed |= debouncer.due(now)
+            edges = False
+            index = 0
+            while changed:
+                if changed & 1 and debouncer.update(index, bool(pressed >> index & 1), now):
+                    ring.put(index << 1 | (debouncer.state >> index & 1), now)
+                    edges = True
+                changed >>= 1
+                index += 1
+            if edges:
+                self._flag.set()
+            self.scans += 1
+            sleep_us(self.scan_us)
+
+    def settle(self):
+        """ Nothing to do, core 1 reads bouncing pins again itself """
+
+    def any(self):
+        """ Return True if there are unread events """
+        return self._ring.any()
+
+    def pop_into(self, event):
+        """ Write the oldest event into the list event as button, pressed, ticks_us and return True, or return False """
+        if not self._ring.get_into(event):
+            return False
+        code = event[0]
+        button = code >> 1
+        pressed = bool(code & 1)
+        if pressed:
+            self.state |= 1 << button
+        else:
+            self.state &= ~(1 << button)
+        event[2] = event[1]
+        event[0] = button
+        event[1] = pressed
+        return True
+
+    async def wait(self, timeout_ms=None):
+        """ Sleep until an edge arrives, or the timeout expires """
+        start = ticks_ms()
+        while True:
+            if self.any():
+                return True
+            if timeout_ms is None:
+                await self._flag.wait()
+                continue
+            remaining = timeout_ms - ticks_diff(ticks_ms(), start)
+            if remaining <= 0:
+                return False
+            self._alarm.start(remaining)
+            await self._flag.wait()
+
+
+class MotorCore(motion.MotionExecutor):
+    """ MotionExecutor whose motor loop runs on core 1 """
+
+    def __init__(self, bot, pulse_ms=motion.PULSE_MS, poll_us=MOTOR_POLL_US, size=CORE_RING_SIZE,
+                 drive_ms=motion.DRIVE_MS):
+        super().__init__(bot, pulse_ms, drive_ms=drive_ms)
+        self.poll_us = poll_us
+        # Ramped on core 1 rather than by its own task on core 0
+        self.velocity = bot if isinstance(bot, VelocityLoop) else None
+        self._ring = CoreRing(size)
+        self.running = False
+        # Set by stop() on core 0, cleared by core 1 once it has stopped
+        self._halt = False
+
+    def depth(self):
+        """ Return the number of commands waiting to run """
+        return self._ring.depth()
+
+    def submit(self, command):
+        """ Pass a command to core 1 without blocking; it is dropped if the ring is full """
+        if not self._ring.put(command, ticks_us()):
+            self.dropped += 1
+            return
+        self._submitted()
+
+    def drive(self, left, right):
+        """ Pass speeds for each side to core 1, like submit(); they go in the record instead of the time """
+        if not self._ring.put(motion.DRIVE, (left + motion.DRIVE_MAX) << 11 | (right + motion.DRIVE_MAX)):
+            self.dropped += 1
+            return
+        self._submitted()
+
+    def _submitted(self):
+        self.submitted += 1
+        depth = self._ring.depth()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def stop(self):
+        """ Stop at core 1's next poll, ahead of and dropping anything queued, without ramping down """
+        # Not through the ring, which may be full or have moves in it behind
+        # the stop that would win as the newest
+        self._halt = True
+
+    async def run(self):
+        """ Start the motor loop on core 1 if it is not running yet, then return """
+        if not self.running:
+            self.running = True
+            _thread.start_new_thread(self._drive, ())
+
+    def _drive(self):
+        ring = self._ring
+        velocity = self.velocity
+        deadline = ticks_us()
+        # Reused for every record, core 1 allocates nothing while it runs
+        record = [0, 0]
+        while self.running:
+            if self._halt:
+                self._halt = False
+                while ring.get_into(record):
+                    pass
+                self._apply(motion.STOP)
+                if velocity is not None:
+                    velocity.halt()
+            elif ring.any():
+                # Newest command wins, older ones are only counted
+                taken = 0
+                while ring.get_into(record):
+                    taken += 1
+                command = record[0]
+                self.coalesced += taken - 1
+                if command == motion.DRIVE:
+                    left = (record[1] >> 11) - motion.DRIVE_MAX
+                    right = (record[1] & 0x7FF) - motion.DRIVE_MAX
+                    # New speeds are applied, the same ones only extend the drive
+                    if command != self.command or left != self.left or right != self.right:
+                        self.left = left
+                        self.right = right
+                        self._apply(command)
+                    self._deadline = ticks_add(ticks_ms(), self.drive_ms)
+                else:
+                    age = ticks_diff(ticks_us(), record[1])
+                    self.last_age_us = age
+                    if age > self.max_age_us:
+                        self.max_age_us = age
+                    # A repeat of the running command only extends the pulse
+                    if command != self.command:
+                        self._apply(command)
+                    self._deadline = ticks_add(ticks_ms(), self.pulse_ms)
+            elif self.command != motion.STOP and ticks_diff(self._deadline, ticks_ms()) <= 0:
+                # Pulse finished and nothing newer arrived
+                self._apply(motion.STOP)
+            if velocity is not None:
+                if velocity.settled():
+                    # The first tick of the next ramp runs straight away
+                    deadline = ticks_us()
+                elif ticks_diff(ticks_us(), deadline) >= 0:
+                    deadline = velocity.tick(deadline)
+            sleep_us(self.poll_us)
+        self._apply(motion.STOP)
+        if velocity is not None:
+            velocity.halt()
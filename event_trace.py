@@ -0,0 +1,90 @@
+# Binary event trace
+# A flight recorder for a drive session: key events go into a fixed size
+# ring of (ticks_us, event, argument) records held in arrays, so recording
+# one never allocates and the newest TRACE_SIZE events are always kept.
+# dump() prints them over serial as hex between TRACE lines, and
+# tools/trace_to_chrome.py turns dumps from both devices into one Chrome
+# trace (chrome://tracing or ui.perfetto.dev), lining up the two clocks.
+
+import array
+import binascii
+import struct
+
+from micropython import const
+from utime import ticks_us
+
+# Events
+BUTTON_EDGE = const(1)  # argument: button << 1 | pressed
+NOTIFY_SENT = const(2)  # argument: frame seq
+NOTIFY_RECEIVED = const(3)  # argument: frame seq
+ACK_SENT = const(4)  # argument: frame seq
+ACK_RECEIVED = const(5)  # argument: frame seq
+MOVE_START = const(6)  # argument: motion command
+MOVE_STOP = const(7)
+CONNECT = const(8)
+DISCONNECT = const(9)
+GC = const(10)  # argument: collection time in us, at most 65535
+
+EVENT_NAMES = ("", "button edge", "notify sent", "notify received", "ack sent", "ack received",
+               "move start", "move stop", "connect", "disconnect", "gc")
+
+# Ring size, must be a power of two
+TRACE_SIZE = const(256)
+
+# One record in a dump: ticks_us, event, argument
+RECORD_FORMAT = "<LBH"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Records per hex line in a dump
+DUMP_RECORDS = const(16)
+
+
+class EventTrace:
+    """ Fixed size ring of timestamped events """
+
+    def __init__(self, name, enabled=False, size=TRACE_SIZE):
+        self.name = name
+        self.enabled = enabled
+        self._mask = size - 1
+        self._times = array.array("L", [0] * size)
+        self._events = bytearray(size)
+        self._args = array.array("H", [0] * size)
+        self._head = 0
+        self.count = 0
+
+    def record(self, event, arg=0, time=None):
+        """ Add an event, stamped now unless time (ticks_us) is given """
+        if not self.enabled:
+            return
+        head = self._head
+        self._times[head] = ticks_us() if time is None else time
+        self._events[head] = event
+        self._args[head] = arg & 0xFFFF
+        self._head = (head + 1) & self._mask
+        self.count += 1
+
+    def clear(self):
+        self._head = 0
+        self.count = 0
+
+    def records(self):
+        """ Return the kept records, oldest first, as (ticks_us, event, argument) """
+        size = self._mask + 1
+        kept = min(self.count, size)
+        start = (self._head - kept) & self._mask
+        return [(self._times[index], self._events[index], self._args[index])
+                for index in ((start + offset) & self._mask for offset in range(kept))]
+
+    def dump(self):
+        """ Print the trace over serial for tools/trace_to_chrome.py """
+        if not self.enabled:
+            return
+        records = self.records()
+        print(f"TRACE {self.name} {len(records)} {self.count - len(records)} {ticks_us()}")
+        line = bytearray(DUMP_RECORDS * RECORD_SIZE)
+        for first in range(0, len(records), DUMP_RECORDS):
+            chunk = records[first:first + DUMP_RECORDS]
+            for index, record in enumerate(chunk):
+                struct.pack_into(RECORD_FORMAT, line, index * RECORD_SIZE, *record)
+            print(binascii.hexlify(line[:len(chunk) * RECORD_SIZE]).decode())
+        print("TRACE END")
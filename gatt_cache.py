@@ -0,0 +1,160 @@
+# GATT handle cache for the robot
+# Service and characteristic discovery costs several ATT round trips on
+# every connect. The handles found the first time are kept in flash per
+# remote address and reused, until the remote's model number changes. A
+# characteristic the remote doesn't have is remembered as missing the same way.
+
+import json
+import struct
+
+import aioble
+import bluetooth
+import uasyncio as asyncio
+from aioble.client import ClientCharacteristic, ClientDescriptor, ClientService
+from micropython import const
+
+GATT_CACHE_FILE = "gatt_cache.json"
+
+_DEVICE_INFO_UUID = bluetooth.UUID(0x180A)
+_MODEL_NUMBER_UUID = bluetooth.UUID(0x2A24)
+_CCCD_UUID = bluetooth.UUID(0x2902)
+
+_FLAG_READ = const(0x0002)
+_CCCD_NOTIFY = const(1)
+
+
+class GattCache:
+    """ Discover a characteristic once per remote and reuse its handles """
+
+    def __init__(self, path=GATT_CACHE_FILE):
+        self.path = path
+        self._peers = None
+        self._connection = None
+        self._checked = False
+        # CCCD handles for the characteristics handed out on this connection
+        self._cccd = {}
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _load(self):
+        if self._peers is None:
+            try:
+                with open(self.path) as file:
+                    self._peers = json.load(file)
+            except (OSError, ValueError):
+                self._peers = {}
+        return self._peers
+
+    def _save(self):
+        try:
+            with open(self.path, "w") as file:
+                json.dump(self._peers, file)
+        except OSError as e:
+            print(f"could not save GATT cache: {e}")
+
+    async def characteristic(self, connection, service_uuid, characteristic_uuid):
+        """ Return the characteristic on this connection, from the cache if it is still valid """
+        if connection is not self._connection:
+            self._connection = connection
+            self._cccd.clear()
+            self._checked = False
+        key = connection.device.addr_hex()
+        peer = self._load().get(key)
+        if peer and not self._checked:
+            try:
+                # One read by handle tells us if the remote's layout changed
+                model = ClientCharacteristic(
+                    ClientService(connection, 0, 0, _DEVICE_INFO_UUID),
+                    peer["model"], peer["model"], _FLAG_READ, _MODEL_NUMBER_UUID,
+                )
+                version = await model.read()
+            except (asyncio.TimeoutError, aioble.GattError):
+                version = None
+            if version is None or bytes(version).decode() != peer["version"]:
+                print("remote changed, discovering again")
+                self.invalidations += 1
+                del self._peers[key]
+                peer = None
+            self._checked = True
+        name = str(characteristic_uuid)
+        if peer and name in peer["characteristics"]:
+            self.hits += 1
+            entry = peer["characteristics"][name]
+            if entry is None:
+                # Looked for before, and this remote doesn't have it
+                return None
+            service = ClientService(connection, entry["start"], entry["end"], service_uuid)
+            characteristic = ClientCharacteristic(
+                service, entry["char_end"], entry["value"], entry["properties"], characteristic_uuid
+            )
+            self._cccd[characteristic] = entry["cccd"]
+            return characteristic
+        self.misses += 1
+        return await self._discover(connection, key, service_uuid, characteristic_uuid)
+
+    async def _discover(self, connection, key, service_uuid, characteristic_uuid):
+        characteristic = cccd = None
+        service = await connection.service(service_uuid)
+        if service is not None:
+            characteristic = await service.characteristic(characteristic_uuid)
+        if characteristic is not None:
+            cccd = await characteristic.descriptor(_CCCD_UUID)
+        peer = self._peers.get(key)
+        if peer is None:
+            device_info = await connection.service(_DEVICE_INFO_UUID)
+            model = await device_info.characteristic(_MODEL_NUMBER_UUID) if device_info else None
+            if model is None:
+                # Nothing to check the cache against, so don't keep it
+                return characteristic
+            version = await model.read()
+            peer = self._peers[key] = {
+                "version": bytes(version).decode(),
+                "model": model._value_handle,
+                "characteristics": {},
+            }
+            self._checked = True
+        if characteristic is None:
+            # Kept as missing too, so an optional characteristic the remote
+            # doesn't have isn't looked for on every connect; it goes with
+            # the rest when the model number changes
+            peer["characteristics"][str(characteristic_uuid)] = None
+            self._save()
+            return None
+        cccd_handle = cccd._value_handle if cccd else 0
+        if cccd_handle:
+            self._cccd[characteristic] = cccd_handle
+        peer["characteristics"][str(characteristic_uuid)] = {
+            "start": service._start_handle,
+            "end": service._end_handle,
+            "char_end": characteristic._end_handle,
+            "value": characteristic._value_handle,
+            "properties": characteristic.properties,
+            "cccd": cccd_handle,
+        }
+        self._save()
+        return characteristic
+
+    async def subscribe(self, characteristic):
+        """ Turn on notifications by writing the known CCCD handle, no descriptor discovery """
+        handle = self._cccd.get(characteristic)
+        if not handle:
+            await characteristic.subscribe(notify=True)
+            return
+        characteristic._register_with_connection()
+        cccd = ClientDescriptor(characteristic, handle, _CCCD_UUID)
+        await cccd.write(struct.pack("<H", _CCCD_NOTIFY), response=True)
+
+    def forget(self, device=None):
+        """ Drop one remote's handles, or all of them """
+        peers = self._load()
+        if device is None:
+            peers.clear()
+        else:
+            peers.pop(device.addr_hex(), None)
+        self._save()
+
+    def stats(self):
+        """ Return the cache metrics as a string, for printing """
+        return f"GATT cache hits {self.hits}, misses {self.misses}, invalidations {self.invalidations}"
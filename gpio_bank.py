@@ -0,0 +1,92 @@
+# Reading a bank of buttons in one go
+# RegisterBank reads the RP2040 SIO GPIO_IN register once per scan, so
+# every button is sampled at the same instant, and turns it into a button
+# mask with lookup tables built at start up: one 256 entry table for each
+# register byte that has a button on it. PinBank reads the pins one at a
+# time and works on any port.
+
+import array
+import sys
+
+import machine
+from micropython import const
+
+# RP2040 SIO GPIO_IN, one bit per GPIO 0-29
+SIO_GPIO_IN = const(0xD0000004)
+
+GPIO_COUNT = const(30)
+
+
+def _make_pins(pin_ids, active_low):
+    pull = machine.Pin.PULL_UP if active_low else machine.Pin.PULL_DOWN
+    return [machine.Pin(pin_id, machine.Pin.IN, pull) for pin_id in pin_ids]
+
+
+class PinBank:
+    """ Buttons read with one Pin.value() call each """
+
+    def __init__(self, pin_ids, active_low=True):
+        self.pin_ids = tuple(pin_ids)
+        self.active_low = active_low
+        self.pins = _make_pins(self.pin_ids, active_low)
+
+    def read(self):
+        """ Return the pressed buttons, bit n set for the nth pin """
+        active = 0 if self.active_low else 1
+        buttons = 0
+        bit = 1
+        for pin in self.pins:
+            if pin.value() == active:
+                buttons |= bit
+            bit <<= 1
+        return buttons
+
+
+class RegisterBank:
+    """ Buttons read from a single GPIO input register snapshot """
+
+    def __init__(self, pin_ids, active_low=True, address=SIO_GPIO_IN):
+        self.pin_ids = tuple(pin_ids)
+        for pin_id in self.pin_ids:
+            if not 0 <= pin_id < GPIO_COUNT:
+                raise ValueError(f"GPIO {pin_id} is not in GPIO_IN")
+        self.active_low = active_low
+        self.address = address
+        self.pins = _make_pins(self.pin_ids, active_low)
+        # (shift, table) for each register byte with a button on it; the
+        # table maps the byte straight to button bits, inversion included
+        self._tables = [(shift, self._table(shift)) for shift in range(0, 32, 8)
+                        if any(shift <= pin_id < shift + 8 for pin_id in self.pin_ids)]
+        self._shift, self._lut = self._tables[0] if len(self._tables) == 1 else (0, None)
+
+    def _table(self, shift):
+        typecode = "B" if len(self.pin_ids) <= 8 else "H"
+        table = array.array(typecode, [0] * 256)
+        for value in range(256):
+            buttons = 0
+            for index, pin_id in enumerate(self.pin_ids):
+                offset = pin_id - shift
+                if 0 <= offset < 8 and bool(value >> offset & 1) != self.active_low:
+                    buttons |= 1 << index
+            table[value] = buttons
+        return table
+
+    def read(self):
+        """ Return the pressed buttons, bit n set for the nth pin """
+        raw = machine.mem32[self.address]
+        lut = self._lut
+        if lut is not None:
+            return lut[(raw >> self._shift) & 0xFF]
+        buttons = 0
+        for shift, table in self._tables:
+            buttons |= table[(raw >> shift) & 0xFF]
+        return buttons
+
+
+def input_bank(pin_ids, active_low=True, register=None):
+    """ Return a RegisterBank on the RP2040 and a PinBank elsewhere, or as register says """
+    if register is None:
+        register = sys.platform == "rp2"
+    if register:
+        return RegisterBank(pin_ids, active_low)
+    return PinBank(pin_ids, active_low)
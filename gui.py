@@ -1,3 +1,8 @@
+import log
+
+# log.DEBUG prints every pixel drawn
+logger = log.Logger(log.INFO)
+
 bluetooth = [
     "0000110000",
     "0000110000",
@@ -24,7 +29,8 @@ def draw_logo(x,y,display):
         for col in row:
             if col == "1":
                 display.pixel(x,y)
-                print(f'drew pixel at x:{x}, y:{y}')
+                if logger.level <= log.DEBUG:
+                    logger.debug("drew pixel at x:%d, y:%d", x, y)
             x +=1
         y +=1
         x -=10
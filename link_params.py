@@ -0,0 +1,94 @@
+# Connection parameters for the control link
+# The robot asks for them when it connects to the remote. MicroPython's
+# connect() only takes the connection interval range, so the peripheral
+# latency and supervision timeout in each profile are never requested; they
+# are kept to check the profile and for stacks that take them. What the
+# link actually runs at is only known when the stack reports a connection
+# update, which LinkParams picks up from the BLE IRQ.
+
+from aioble.core import register_irq_handler
+from micropython import const
+
+_IRQ_CONNECTION_UPDATE = const(27)
+
+# (min interval us, max interval us, peripheral latency, supervision timeout ms)
+DRIVE = (7_500, 15_000, 0, 2_000)
+IDLE = (100_000, 200_000, 4, 6_000)
+
+PROFILES = {
+    "drive": DRIVE,
+    "idle": IDLE,
+}
+
+
+def check(profile):
+    """ Raise ValueError if the profile breaks the Bluetooth core spec limits """
+    min_us, max_us, latency, timeout_ms = profile
+    if not 7_500 <= min_us <= max_us <= 4_000_000:
+        raise ValueError("interval out of range")
+    if not 0 <= latency <= 499:
+        raise ValueError("latency out of range")
+    if not 100 <= timeout_ms <= 32_000:
+        raise ValueError("supervision timeout out of range")
+    # The link must survive the longest gap the latency allows, twice over
+    if timeout_ms * 1000 <= (1 + latency) * max_us * 2:
+        raise ValueError("supervision timeout too short for the interval and latency")
+
+
+class LinkParams:
+    """ Pick a connection parameter profile, remember what was asked for and what the link runs at """
+
+    def __init__(self, mode="drive", profiles=PROFILES):
+        self.profiles = profiles
+        self.mode = None
+        self.requested = None
+        self.select(mode)
+        # Connection watched for updates, None before the first
+        self._conn_handle = None
+        # From the last connection update, None until the stack reports one
+        self.interval_us = None
+        self.latency = None
+        self.timeout_ms = None
+        self.updates = 0
+        register_irq_handler(self._irq, None)
+
+    def select(self, mode):
+        """ Choose the profile for the next connection """
+        if mode not in self.profiles:
+            raise ValueError("unknown link mode")
+        check(self.profiles[mode])
+        self.mode = mode
+
+    def connect_kwargs(self):
+        """ Return the keyword arguments for aioble's Device.connect() """
+        profile = self.profiles[self.mode]
+        self.requested = profile
+        return {"min_conn_interval_us": profile[0], "max_conn_interval_us": profile[1]}
+
+    def watch(self, connection):
+        """ Take the parameters of this connection from now on, forgetting the last one's """
+        self._conn_handle = connection._conn_handle
+        self.interval_us = self.latency = self.timeout_ms = None
+
+    def _irq(self, event, data):
+        # Called from the BLE IRQ: only store the values
+        if event == _IRQ_CONNECTION_UPDATE:
+            conn_handle, interval, latency, timeout, status = data
+            if conn_handle == self._conn_handle and status == 0:
+                # In units of 1.25 ms and 10 ms
+                self.interval_us = interval * 1250
+                self.latency = latency
+                self.timeout_ms = timeout * 10
+                self.updates += 1
+
+    def describe(self):
+        """ Return what was asked for and what the link runs at as a string, for printing """
+        if self.requested is None:
+            return f"link mode {self.mode}, nothing requested yet"
+        min_us, max_us, latency, timeout_ms = self.requested
+        asked = (f"link mode {self.mode}: asked for interval {min_us / 1000}-{max_us / 1000} ms; "
+                 f"latency {latency} and supervision timeout {timeout_ms} ms not requested")
+        if self.interval_us is None:
+            return f"{asked}; in effect: not reported by the stack yet"
+        return (f"{asked}; in effect: interval {self.interval_us / 1000} ms, latency {self.latency}, "
+                f"supervision timeout {self.timeout_ms} ms ({self.updates} updates)")
@@ -0,0 +1,113 @@
+# Leveled logging for the device scripts
+# print() to USB serial blocks while the bytes go out, and formatting a
+# message allocates, so neither belongs in the input or motor paths.
+# Logger only formats a line once it knows the line is wanted (arguments
+# are given separately, "%" style), and a DeferredSink just queues the
+# message and its arguments in a ring, to be printed by its own task when
+# the loop has nothing better to do.
+
+import array
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_ms
+
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+OFF = const(100)
+
+# Queued lines, must be a power of two
+LOG_BUFFER_SIZE = const(32)
+
+# How often the deferred sink prints, and at most how many lines each time
+LOG_FLUSH_MS = const(100)
+LOG_FLUSH_LINES = const(8)
+
+
+def _format(message, args):
+    return message % args if args else message
+
+
+class Logger:
+    """ Log lines at or above a level, printed now or handed to a sink """
+
+    def __init__(self, level=INFO, sink=None):
+        self.level = level
+        self.sink = sink
+
+    def log(self, level, message, *args):
+        if level >= self.level:
+            self._emit(level, message, args)
+
+    def debug(self, message, *args):
+        if self.level <= DEBUG:
+            self._emit(DEBUG, message, args)
+
+    def info(self, message, *args):
+        if self.level <= INFO:
+            self._emit(INFO, message, args)
+
+    def warning(self, message, *args):
+        if self.level <= WARNING:
+            self._emit(WARNING, message, args)
+
+    def error(self, message, *args):
+        if self.level <= ERROR:
+            self._emit(ERROR, message, args)
+
+    def _emit(self, level, message, args):
+        if self.sink is None:
+            print(_format(message, args))
+        else:
+            self.sink.write(level, message, args)
+
+
+class DeferredSink:
+    """ Queue log lines and print them later, from the loop's idle time """
+
+    def __init__(self, size=LOG_BUFFER_SIZE):
+        self._mask = size - 1
+        self._messages = [None] * size
+        self._args = [None] * size
+        self._times = array.array("L", [0] * size)
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+
+    def write(self, level, message, args):
+        """ Queue a line; if the ring is full it is counted and dropped """
+        head = self._head
+        next_head = (head + 1) & self._mask
+        if next_head == self._tail:
+            self.dropped += 1
+            return
+        self._messages[head] = message
+        self._args[head] = args
+        self._times[head] = ticks_ms()
+        self._head = next_head
+
+    def any(self):
+        """ Return True if there are lines waiting """
+        return self._head != self._tail
+
+    def flush(self, lines=None):
+        """ Print up to lines queued lines (all of them by default), oldest first """
+        while self._head != self._tail and lines != 0:
+            tail = self._tail
+            print(f"{self._times[tail]}: {_format(self._messages[tail], self._args[tail])}")
+            # Let go of the arguments so they can be collected
+            self._messages[tail] = self._args[tail] = None
+            self._tail = (tail + 1) & self._mask
+            if lines is not None:
+                lines -= 1
+        if self.dropped:
+            print(f"{self.dropped} log lines dropped")
+            self.dropped = 0
+
+    async def run(self, interval_ms=LOG_FLUSH_MS, lines=LOG_FLUSH_LINES):
+        """ Flush task, start it alongside the others """
+        while True:
+            await asyncio.sleep_ms(interval_ms)
+            self.flush(lines)
@@ -0,0 +1,185 @@
+# Event loop profiler
+# Wrap the coroutines handed to asyncio.create_task() and every step a task
+# takes - from being woken up to its next await - is timed into
+# preallocated counters: wakeups, total run time and the longest step.
+# Sleeps made through profiler.sleep_ms() also record how late the task
+# woke up, which is the time other tasks held the loop. Turned off, wrap()
+# hands the coroutine straight back, so nothing runs per step.
+
+import array
+import struct
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_add, ticks_diff, ticks_ms, ticks_us
+
+# Most tasks that can be profiled at once; remote.py and robot_code.py start
+# 9 each with everything turned on. Keep it below 30, _sleeping is a small int
+MAX_TASKS = const(16)
+
+# One task per report(), to fit the 20 bytes a notification carries
+# without a bigger MTU: number of tasks, this task's index, the first 6
+# characters of its name, wakeups, run us, longest step us and longest sleep
+# lag us. Run time wraps after 71 minutes, the longest times stop at 65535.
+REPORT_FORMAT = "<BB6sLLHH"
+REPORT_SIZE = struct.calcsize(REPORT_FORMAT)
+
+
+class _Steps:
+    """ Await a coroutine one step at a time, timing each step """
+
+    def __init__(self, profiler, index, coro):
+        self._profiler = profiler
+        self._index = index
+        self._coro = coro
+
+    def __iter__(self):
+        profiler = self._profiler
+        index = self._index
+        coro = self._coro
+        value = None
+        error = None
+        while True:
+            start = profiler._woken(index)
+            try:
+                if error is None:
+                    awaited = coro.send(value)
+                else:
+                    awaited = coro.throw(error)
+            except StopIteration as stop:
+                profiler._ran(index, start)
+                return stop.value
+            except BaseException:
+                profiler._ran(index, start)
+                raise
+            profiler._ran(index, start)
+            value = error = None
+            try:
+                value = yield awaited
+            except BaseException as e:
+                # Cancellation and the like go on to the task itself
+                error = e
+
+    __await__ = __iter__
+
+
+class LoopProfiler:
+    """ Per task wakeups, run time and scheduling lag """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.names = []
+        self._wakeups = array.array("L", [0] * MAX_TASKS)
+        self._run_us = array.array("L", [0] * MAX_TASKS)
+        self._max_us = array.array("L", [0] * MAX_TASKS)
+        self._sleeps = array.array("L", [0] * MAX_TASKS)
+        self._lag_us = array.array("L", [0] * MAX_TASKS)
+        self._max_lag_us = array.array("L", [0] * MAX_TASKS)
+        # When each sleeping task should wake, in ticks_us
+        self._due = array.array("L", [0] * MAX_TASKS)
+        self._sleeping = 0
+        # Task running now, -1 outside a profiled step
+        self._current = -1
+        self._started = ticks_ms()
+        self._report = bytearray(REPORT_SIZE)
+        # Tasks started once every slot was taken, which run unprofiled
+        self.refused = 0
+
+    def wrap(self, name, coro):
+        """ Return coro, timed under name if the profiler is enabled """
+        if not self.enabled:
+            return coro
+        # A task started again under the same name, e.g. after a
+        # reconnect, adds to its old counters
+        if name in self.names:
+            index = self.names.index(name)
+        elif len(self.names) < MAX_TASKS:
+            index = len(self.names)
+            self.names.append(name)
+        else:
+            self.refused += 1
+            print(f"profiler full, {name} runs unprofiled; raise MAX_TASKS")
+            return coro
+        return self._profiled(index, coro)
+
+    async def _profiled(self, index, coro):
+        return await _Steps(self, index, coro)
+
+    def _woken(self, index):
+        now = ticks_us()
+        self._wakeups[index] += 1
+        bit = 1 << index
+        if self._sleeping & bit:
+            self._sleeping &= ~bit
+            lag = max(0, ticks_diff(now, self._due[index]))
+            self._sleeps[index] += 1
+            self._lag_us[index] = (self._lag_us[index] + lag) & 0xFFFFFFFF
+            if lag > self._max_lag_us[index]:
+                self._max_lag_us[index] = lag
+        self._current = index
+        return now
+
+    def _ran(self, index, start):
+        step = ticks_diff(ticks_us(), start)
+        self._current = -1
+        self._run_us[index] = (self._run_us[index] + step) & 0xFFFFFFFF
+        if step > self._max_us[index]:
+            self._max_us[index] = step
+
+    def sleep_ms(self, ms):
+        """ asyncio.sleep_ms() that also records how late a profiled task wakes from it """
+        index = self._current
+        if index >= 0:
+            self._due[index] = ticks_add(ticks_us(), ms * 1000)
+            self._sleeping |= 1 << index
+        return asyncio.sleep_ms(ms)
+
+    def reset(self):
+        """ Zero the counters, keeping the task names """
+        for counters in (self._wakeups, self._run_us, self._max_us, self._sleeps, self._lag_us, self._max_lag_us):
+            for index in range(MAX_TASKS):
+                counters[index] = 0
+        self._started = ticks_ms()
+
+    def summary(self):
+        """ Return the counters as a string, one line per task, for printing """
+        elapsed_us = max(1, ticks_diff(ticks_ms(), self._started)) * 1000
+        lines = []
+        for index, name in enumerate(self.names):
+            sleeps = self._sleeps[index]
+            lag = self._lag_us[index] // sleeps if sleeps else 0
+            lines.append(
+                f"{name}: {self._wakeups[index]} wakeups, {self._run_us[index] // 1000} ms "
+                f"({self._run_us[index] * 100 // elapsed_us}%), longest step {self._max_us[index]} us, "
+                f"sleep lag avg {lag} us max {self._max_lag_us[index]} us"
+            )
+        if self.refused:
+            lines.append(f"{self.refused} tasks not profiled, more than MAX_TASKS {MAX_TASKS}")
+        return "\n".join(lines)
+
+    def dump(self):
+        """ Print the summary over serial, if anything was profiled """
+        if self.names:
+            print(self.summary())
+
+    def report(self, index=0):
+        """ Return one task's counters packed for the BLE diagnostics characteristic
+
+        The buffer is reused by the next call. An index past the last task
+        gets the number of tasks and zeros.
+        """
+        data = self._report
+        if index < len(self.names):
+            struct.pack_into(
+                REPORT_FORMAT, data, 0, len(self.names), index, self.names[index].encode(), self._wakeups[index],
+                self._run_us[index], min(self._max_us[index], 0xFFFF), min(self._max_lag_us[index], 0xFFFF),
+            )
+        else:
+            struct.pack_into(REPORT_FORMAT, data, 0, len(self.names), index, b"", 0, 0, 0, 0)
+        return data
+
+
+def decode_report(data):
+    """ Return a report() as (tasks, index, name, wakeups, run us, longest step us, longest lag us) """
+    fields = struct.unpack_from(REPORT_FORMAT, data)
+    return fields[:2] + (fields[2].rstrip(b"\0").decode(),) + fields[3:]
@@ -0,0 +1,84 @@
+# Garbage collection in the loop's idle time
+# MicroPython collects when an allocation finds the heap full, which can be
+# in the middle of handling a frame or a motor pulse, and everything stops
+# until it is done. The frame, ack and button paths allocate nothing (they
+# write into buffers made up front), so the heap only fills slowly, and
+# MemoryManager collects from idle time once more than a threshold has been
+# allocated since the last collection, timing every pause.
+
+import array
+import gc
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_diff, ticks_us
+
+import event_trace
+
+# Collect once this many bytes have been allocated since the last collection
+GC_THRESHOLD = const(8192)
+
+# How often the idle task looks
+GC_CHECK_MS = const(250)
+
+# Pause times kept, must be a power of two
+PAUSE_HISTORY = const(16)
+
+
+class MemoryManager:
+    """ Collect garbage when the loop is idle and record the pauses """
+
+    def __init__(self, threshold=GC_THRESHOLD, trace=None, size=PAUSE_HISTORY):
+        self.threshold = threshold
+        # Optional EventTrace for gc events
+        self.trace = trace
+        self._mask = size - 1
+        self._pauses = array.array("L", [0] * size)
+        self.collections = 0
+        self.total_us = 0
+        self.max_us = 0
+        gc.collect()
+        self._allocated = gc.mem_alloc()
+
+    def due(self):
+        """ Return True once threshold bytes have been allocated since the last collection """
+        return gc.mem_alloc() - self._allocated >= self.threshold
+
+    def collect(self):
+        """ Collect now and return how long it took, in us """
+        start = ticks_us()
+        gc.collect()
+        pause = ticks_diff(ticks_us(), start)
+        self._allocated = gc.mem_alloc()
+        self._pauses[self.collections & self._mask] = pause
+        self.collections += 1
+        self.total_us += pause
+        if pause > self.max_us:
+            self.max_us = pause
+        if self.trace is not None:
+            self.trace.record(event_trace.GC, min(0xFFFF, pause), start)
+        return pause
+
+    def idle(self):
+        """ Call when there is time to spare: collect if it is due, return True if it did """
+        if self.due():
+            self.collect()
+            return True
+        return False
+
+    async def run(self, interval_ms=GC_CHECK_MS):
+        """ Idle collection task, start it alongside the others """
+        while True:
+            await asyncio.sleep_ms(interval_ms)
+            self.idle()
+
+    def pauses(self):
+        """ Return the latest pause times in us, oldest first """
+        kept = min(self.collections, self._mask + 1)
+        return [self._pauses[(self.collections - kept + index) & self._mask] for index in range(kept)]
+
+    def stats(self):
+        """ Return the collection figures as a string, for printing """
+        mean = self.total_us // self.collections if self.collections else 0
+        return (f"gc {self.collections} collections, mean {mean} us, max {self.max_us} us, "
+                f"free {gc.mem_free()} bytes")
@@ -0,0 +1,156 @@
+# Differential drive mixer with lookup tables
+# Turns joystick steering and throttle into left and right motor speeds,
+# arcade style: throttle plus steering on the left, minus on the right.
+# The expo curves, steering rate and motor trims are worked out once into
+# tables of integers whenever the settings change, so mixing is a handful
+# of lookups, adds and a multiply, with no floats (every float is a heap
+# allocation on the RP2040) and no division. mixer_viper.py has the same
+# mix for the viper code emitter, which runs it as machine code; on ports
+# without the emitter it can't even be compiled, so it is only used when it
+# imports.
+#
+# All speeds are thousandths of full, -1000..1000. The tables only hold
+# 0..1000, the sign is put back after each lookup.
+
+import array
+
+from micropython import const
+
+try:
+    from mixer_viper import mix_viper
+except (ImportError, SyntaxError):
+    # No viper code emitter on this port
+    mix_viper = None
+
+# Full speed, as motion.DRIVE_MAX
+_FULL = const(1000)
+
+# Entries in each curve, one per thousandth from 0 to full
+TABLE_SIZE = const(1001)
+
+# Where each table starts in Mixer.tables: the curves, then 65536 * 1000 / x
+# for x from 1001 to 2000, for scaling a mix that comes out above full.
+# mixer_viper.py has its own copy of these, viper code only sees its own
+# module's consts as machine ints.
+STEER_TABLE = const(0)
+THROTTLE_TABLE = const(1001)
+LEFT_TABLE = const(2002)
+RIGHT_TABLE = const(3003)
+SCALE_TABLE = const(4004)
+TABLES_SIZE = const(5004)
+
+# Defaults: expo in percent (0 is linear, 100 is a cube curve), how much of
+# full steering the stick gives in percent (up to 100), the steering centre
+# offset in thousandths, and how fast each motor runs in percent of what it
+# is told, to even out motors that don't match
+STEER_EXPO = const(40)
+THROTTLE_EXPO = const(20)
+STEER_RATE = const(100)
+STEER_TRIM = const(0)
+LEFT_GAIN = const(100)
+RIGHT_GAIN = const(100)
+
+def expo_curve(table, start, expo, rate):
+    """ Fill a curve with x blended with x cubed by expo percent, times rate percent """
+    for x in range(TABLE_SIZE):
+        cube = x * x // _FULL * x // _FULL
+        table[start + x] = ((100 - expo) * x + expo * cube) * rate // 10_000
+
+
+def gain_curve(table, start, gain):
+    """ Fill a curve with x times gain percent, no more than full """
+    for x in range(TABLE_SIZE):
+        table[start + x] = min(_FULL, x * gain // 100)
+
+
+class Mixer:
+    """ Arcade mixing of steering and throttle through integer lookup tables """
+
+    def __init__(self, steer_expo=STEER_EXPO, throttle_expo=THROTTLE_EXPO, steer_rate=STEER_RATE,
+                 steer_trim=STEER_TRIM, left_gain=LEFT_GAIN, right_gain=RIGHT_GAIN, viper=False):
+        # Every table in one array, so mix_viper can take them as one argument
+        self.tables = array.array("H", bytearray(2 * TABLES_SIZE))
+        for x in range(_FULL + 1, 2 * _FULL + 1):
+            self.tables[SCALE_TABLE + x - _FULL - 1] = 65536 * _FULL // x
+        self.steer_expo = steer_expo
+        self.throttle_expo = throttle_expo
+        self.steer_rate = steer_rate
+        self.steer_trim = steer_trim
+        self.left_gain = left_gain
+        self.right_gain = right_gain
+        # True mixes with mix_viper, which needs speeds to be an array("h");
+        # where there is no viper emitter it mixes in Python anyway
+        self.viper = viper and mix_viper is not None
+        # How many times the curves were worked out
+        self.builds = 0
+        self._build(True, True, True, True)
+
+    def configure(self, steer_expo=None, throttle_expo=None, steer_rate=None, steer_trim=None,
+                  left_gain=None, right_gain=None):
+        """ Change settings, working out again only the curves they change; return True if any did """
+        steer = (steer_expo is not None and steer_expo != self.steer_expo) or \
+            (steer_rate is not None and steer_rate != self.steer_rate)
+        throttle = throttle_expo is not None and throttle_expo != self.throttle_expo
+        left = left_gain is not None and left_gain != self.left_gain
+        right = right_gain is not None and right_gain != self.right_gain
+        # The trim only moves the lookup, there is no curve to work out
+        trim = steer_trim is not None and steer_trim != self.steer_trim
+        if steer_expo is not None:
+            self.steer_expo = steer_expo
+        if steer_rate is not None:
+            self.steer_rate = steer_rate
+        if throttle_expo is not None:
+            self.throttle_expo = throttle_expo
+        if steer_trim is not None:
+            self.steer_trim = steer_trim
+        if left_gain is not None:
+            self.left_gain = left_gain
+        if right_gain is not None:
+            self.right_gain = right_gain
+        self._build(steer, throttle, left, right)
+        return steer or throttle or left or right or trim
+
+    def _build(self, steer, throttle, left, right):
+        tables = self.tables
+        if steer:
+            expo_curve(tables, STEER_TABLE, self.steer_expo, self.steer_rate)
+        if throttle:
+            expo_curve(tables, THROTTLE_TABLE, self.throttle_expo, 100)
+        if left:
+            gain_curve(tables, LEFT_TABLE, self.left_gain)
+        if right:
+            gain_curve(tables, RIGHT_TABLE, self.right_gain)
+        if steer or throttle or left or right:
+            self.builds += 1
+
+    def mix_into(self, steer, throttle, speeds):
+        """ Write the left and right speeds for the stick into speeds[0] and speeds[1] """
+        if self.viper:
+            mix_viper(steer + self.steer_trim, throttle, self.tables, speeds)
+            return
+        tables = self.tables
+        steer += self.steer_trim
+        if steer >= 0:
+            steer = tables[STEER_TABLE + min(steer, _FULL)]
+        else:
+            steer = -tables[STEER_TABLE + min(-steer, _FULL)]
+        if throttle >= 0:
+            throttle = tables[THROTTLE_TABLE + min(throttle, _FULL)]
+        else:
+            throttle = -tables[THROTTLE_TABLE + min(-throttle, _FULL)]
+        left = throttle + steer
+        right = throttle - steer
+        # Scale both down together so turning at full throttle still turns
+        biggest = max(abs(left), abs(right))
+        if biggest > _FULL:
+            scale = tables[SCALE_TABLE + biggest - _FULL - 1]
+            left = left * scale >> 16
+            right = right * scale >> 16
+        speeds[0] = tables[LEFT_TABLE + left] if left >= 0 else -tables[LEFT_TABLE - left]
+        speeds[1] = tables[RIGHT_TABLE + right] if right >= 0 else -tables[RIGHT_TABLE - right]
+
+    def mix(self, steer, throttle):
+        """ Return (left, right) speeds for the stick """
+        speeds = array.array("h", [0, 0])
+        self.mix_into(steer, throttle, speeds)
+        return speeds[0], speeds[1]
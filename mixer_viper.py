@@ -0,0 +1,56 @@
+# The joystick mix from mixer.py as viper code
+# Kept apart from mixer.py because a viper decorator is a compile error on
+# ports built without the viper code emitter; mixer.py only uses this when
+# it imports. Mixer.mix_into calls it when made with viper=True.
+
+import micropython
+from micropython import const
+
+# Full speed and where each table starts in Mixer.tables, as in mixer.py.
+# Consts of this module, so the viper code sees machine ints.
+_FULL = const(1000)
+_STEER_TABLE = const(0)
+_THROTTLE_TABLE = const(1001)
+_LEFT_TABLE = const(2002)
+_RIGHT_TABLE = const(3003)
+_SCALE_TABLE = const(4004)
+
+try:
+    ptr16
+except NameError:
+    # Pointer casts only exist in viper code; anywhere else an array indexes the same way
+    def ptr16(buffer):
+        return buffer
+
+
+@micropython.viper
+def mix_viper(steer: int, throttle: int, tables, speeds):
+    """ Mixer.mix_into as machine code; steer already trimmed, tables Mixer.tables, speeds an array("h") """
+    table = ptr16(tables)
+    out = ptr16(speeds)
+    if steer >= 0:
+        steer = int(table[_STEER_TABLE + (steer if steer < _FULL else _FULL)])
+    else:
+        steer = 0 - int(table[_STEER_TABLE + (0 - steer if steer > 0 - _FULL else _FULL)])
+    if throttle >= 0:
+        throttle = int(table[_THROTTLE_TABLE + (throttle if throttle < _FULL else _FULL)])
+    else:
+        throttle = 0 - int(table[_THROTTLE_TABLE + (0 - throttle if throttle > 0 - _FULL else _FULL)])
+    left = throttle + steer
+    right = throttle - steer
+    size = left if left >= 0 else 0 - left
+    other = right if right >= 0 else 0 - right
+    if other > size:
+        size = other
+    if size > _FULL:
+        scale = int(table[_SCALE_TABLE + size - _FULL - 1])
+        left = left * scale >> 16
+        right = right * scale >> 16
+    if left >= 0:
+        out[0] = table[_LEFT_TABLE + left]
+    else:
+        out[0] = 0 - int(table[_LEFT_TABLE - left])
+    if right >= 0:
+        out[1] = table[_RIGHT_TABLE + right]
+    else:
+        out[1] = 0 - int(table[_RIGHT_TABLE - right])
@@ -0,0 +1,163 @@
+# Non-blocking motion executor for the robot
+# BLE handling submits commands into a small bounded queue; a separate task
+# runs only the newest one and stops the motors when its pulse runs out, so
+# a held button never backs up behind blocking motor pulses. DRIVE sets a
+# speed for each side instead, from a joystick, and is held for longer; the
+# bot needs a drive() method for it, so give it the Burgerbot through
+# wheels.Wheels, or the velocity loop.
+
+import array
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_add, ticks_diff, ticks_ms, ticks_us
+
+import event_trace
+from alarm import Alarm
+
+STOP = const(0)
+FORWARD = const(1)
+BACKWARD = const(2)
+LEFT = const(3)
+RIGHT = const(4)
+DRIVE = const(5)
+
+COMMAND_NAMES = ("stop", "forward", "backward", "left", "right", "drive")
+
+# Full speed for DRIVE, speeds are -DRIVE_MAX..DRIVE_MAX
+DRIVE_MAX = const(1000)
+
+# Queue size, must be a power of two
+QUEUE_SIZE = const(4)
+
+# How long each command drives the motors for
+PULSE_MS = const(100)
+
+# How long DRIVE speeds are held without being sent again; the remote sends
+# its axes at least every AXIS_KEYFRAME_MS
+DRIVE_MS = const(1500)
+
+
+class MotionExecutor:
+    """ Run motion commands on the bot, newest command wins """
+
+    def __init__(self, bot, pulse_ms=PULSE_MS, size=QUEUE_SIZE, trace=None, drive_ms=DRIVE_MS):
+        self.bot = bot
+        # Optional EventTrace for move start / stop events
+        self.trace = trace
+        self.pulse_ms = pulse_ms
+        self.drive_ms = drive_ms
+        self._mask = size - 1
+        self._commands = bytearray(size)
+        self._times = array.array("L", [0] * size)
+        # Left and right speeds of each DRIVE queued
+        self._speeds = array.array("h", [0] * (2 * size))
+        # Speeds of the running DRIVE, or the newest one taken
+        self.left = 0
+        self.right = 0
+        self._head = 0
+        self._tail = 0
+        self._flag = asyncio.ThreadSafeFlag()
+        # Ends the waits that have a timeout
+        self._alarm = Alarm(self._flag)
+        self.command = STOP
+        self._deadline = 0
+        # Statistics
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.max_age_us = 0
+        self.last_age_us = 0
+
+    def depth(self):
+        """ Return the number of commands waiting to run """
+        return (self._head - self._tail) & self._mask
+
+    def submit(self, command):
+        """ Queue a command without blocking; the oldest is dropped if the queue is full """
+        self._put(command, 0, 0)
+
+    def drive(self, left, right):
+        """ Queue speeds for each side, -DRIVE_MAX..DRIVE_MAX, like submit() """
+        self._put(DRIVE, left, right)
+
+    def _put(self, command, left, right):
+        head = self._head
+        next_head = (head + 1) & self._mask
+        if next_head == self._tail:
+            self._tail = (self._tail + 1) & self._mask
+            self.dropped += 1
+        self._commands[head] = command
+        self._speeds[2 * head] = left
+        self._speeds[2 * head + 1] = right
+        self._times[head] = ticks_us()
+        self._head = next_head
+        self.submitted += 1
+        depth = self.depth()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._flag.set()
+
+    def _take_newest(self):
+        """ Return the newest queued command and discard the stale ones; DRIVE speeds go in left and right """
+        newest = (self._head - 1) & self._mask
+        self.coalesced += self.depth() - 1
+        command = self._commands[newest]
+        if command == DRIVE:
+            self.left = self._speeds[2 * newest]
+            self.right = self._speeds[2 * newest + 1]
+        age = ticks_diff(ticks_us(), self._times[newest])
+        self._tail = self._head
+        self.last_age_us = age
+        if age > self.max_age_us:
+            self.max_age_us = age
+        return command
+
+    def _apply(self, command):
+        bot = self.bot
+        if command == FORWARD:
+            bot.forward()
+        elif command == BACKWARD:
+            bot.backward()
+        elif command == LEFT:
+            bot.turnleft()
+        elif command == RIGHT:
+            bot.turnright()
+        elif command == DRIVE:
+            bot.drive(self.left, self.right)
+        else:
+            bot.stop()
+            self.left = self.right = 0
+        self.command = command
+        self.executed += 1
+        if self.trace is not None:
+            self.trace.record(event_trace.MOVE_STOP if command == STOP else event_trace.MOVE_START, command)
+
+    async def run(self):
+        """ Executor task, start it alongside the BLE task """
+        while True:
+            if self._head == self._tail:
+                if self.command == STOP:
+                    await self._flag.wait()
+                    continue
+                remaining = ticks_diff(self._deadline, ticks_ms())
+                if remaining > 0:
+                    self._alarm.start(remaining)
+                    await self._flag.wait()
+                    continue
+                # Pulse finished and nothing newer arrived
+                self._apply(STOP)
+                continue
+            left, right = self.left, self.right
+            command = self._take_newest()
+            # A repeat of the running command only extends the pulse
+            if command != self.command or (command == DRIVE and (self.left != left or self.right != right)):
+                self._apply(command)
+            self._deadline = ticks_add(ticks_ms(), self.drive_ms if command == DRIVE else self.pulse_ms)
+
+    def stop(self):
+        """ Stop straight away, dropping anything queued """
+        self._tail = self._head
+        self._apply(STOP)
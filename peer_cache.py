@@ -0,0 +1,102 @@
+# Last known remote, kept in flash
+# After a dropout the robot connects straight to the remote it had last
+# time and only falls back to a scan if that fails.
+
+import binascii
+import json
+import os
+
+import aioble
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_diff, ticks_ms
+
+PEER_FILE = "remote_peer.json"
+
+# How long to try the cached address before scanning
+CACHED_CONNECT_TIMEOUT_MS = const(1500)
+
+
+class PeerCache:
+    """ Remember the remote's address and reconnect to it directly """
+
+    def __init__(self, path=PEER_FILE, timeout_ms=CACHED_CONNECT_TIMEOUT_MS):
+        self.path = path
+        self.timeout_ms = timeout_ms
+        self.device = None
+        self._loaded = False
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.scans = 0
+        self.last_connect_ms = 0
+        self.last_source = None
+
+    def load(self):
+        """ Return the cached device, or None """
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.path) as file:
+                    peer = json.load(file)
+                self.device = aioble.Device(peer["addr_type"], binascii.unhexlify(peer["addr"]))
+            except (OSError, ValueError, KeyError):
+                self.device = None
+        return self.device
+
+    def save(self, device):
+        """ Write the device to flash, only if it changed """
+        cached = self.load()
+        if cached and cached.addr_type == device.addr_type and bytes(cached.addr) == bytes(device.addr):
+            return
+        self.device = device
+        try:
+            with open(self.path, "w") as file:
+                json.dump({"addr_type": device.addr_type, "addr": binascii.hexlify(bytes(device.addr)).decode()}, file)
+        except OSError as e:
+            print(f"could not save remote: {e}")
+
+    def forget(self):
+        """ Drop the cached device """
+        self.device = None
+        self._loaded = True
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    async def connect(self, find_remote, **connect_kwargs):
+        """ Connect to the cached remote, or scan with find_remote() if that fails
+
+        Any keyword arguments, such as connection intervals, go to Device.connect()
+        """
+        start = ticks_ms()
+        device = self.load()
+        if device:
+            try:
+                print("Connecting to cached remote", device)
+                connection = await device.connect(timeout_ms=self.timeout_ms, **connect_kwargs)
+                self.hits += 1
+                self._connected(start, "cache")
+                return connection
+            except asyncio.TimeoutError:
+                print("Cached remote not found, scanning")
+                self.misses += 1
+        self.scans += 1
+        device = await find_remote()
+        if not device:
+            return None
+        print("Connecting to", device)
+        connection = await device.connect(**connect_kwargs)
+        self.save(device)
+        self._connected(start, "scan")
+        return connection
+
+    def _connected(self, start, source):
+        self.last_connect_ms = ticks_diff(ticks_ms(), start)
+        self.last_source = source
+
+    def stats(self):
+        """ Return the reconnect metrics as a string, for printing """
+        return (f"connected in {self.last_connect_ms} ms via {self.last_source}, "
+                f"cache hits {self.hits}, misses {self.misses}, scans {self.scans}")
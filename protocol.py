@@ -0,0 +1,178 @@
+# Remote control frame format
+# Shared by the remote (remote.py, remote_control.py) and the robot
+# (robot.py, robot_code.py).
+#
+# Every notification carries the whole controller state:
+#
+#   byte 0    protocol version
+#   byte 1    flags, low nibble is the number of axes that follow, bit 7
+#             set for an emergency stop
+#   byte 2-3  sequence number, uint16, wraps
+#   byte 4-5  button mask, uint16, bit set while the button is held
+#   byte 6-7  sender tick, the remote's ticks_ms() as uint16, wraps
+#   byte 8..  axes, one int8 each (-127..127)
+#
+# An emergency stop is a header with FLAG_STOP set, no buttons and no axes.
+# The remote sends it on its own characteristic, so motion frames queued on
+# the button characteristic can never take its place.
+#
+# The robot acknowledges every frame by writing back its sequence number
+# and sender tick (uint16 each) to the remote's ack characteristic.
+#
+# A remote can drive several robots. Each robot may write a single byte to
+# the ack characteristic, the mask of the channels (CHANNEL_*) it wants to
+# be sent; until it does it is sent all of them.
+
+import struct
+
+from micropython import const
+from utime import ticks_ms
+
+PROTOCOL_VERSION = const(2)
+
+HEADER_FORMAT = "<BBHHH"
+HEADER_SIZE = const(8)
+MAX_AXES = const(4)
+MAX_FRAME_SIZE = const(12)
+
+ACK_FORMAT = "<HH"
+ACK_SIZE = const(4)
+
+_TICK_MASK = const(0xFFFF)
+_TICK_HALF = const(0x8000)
+
+_AXES_MASK = const(0x0F)
+
+FLAG_STOP = const(0x80)
+
+CHANNEL_FRAMES = const(0x01)
+CHANNEL_AXES = const(0x02)
+CHANNEL_STOP = const(0x04)
+CHANNELS_ALL = const(0x07)
+CHANNELS_SIZE = const(1)
+
+BUTTON_A = const(0x0001)
+BUTTON_B = const(0x0002)
+BUTTON_X = const(0x0004)
+BUTTON_Y = const(0x0008)
+BUTTON_UP = const(0x0010)
+BUTTON_DOWN = const(0x0020)
+BUTTON_LEFT = const(0x0040)
+BUTTON_RIGHT = const(0x0080)
+BUTTON_MENU = const(0x0100)
+BUTTON_SELECT = const(0x0200)
+BUTTON_START = const(0x0400)
+
+BUTTON_NAMES = (
+    "A", "B", "X", "Y", "Up", "Down", "Left", "Right", "Menu", "Select", "Start",
+)
+
+_EMPTY = ()
+
+
+def now_tick():
+    """ Return the sender tick for a frame sent now """
+    return ticks_ms() & _TICK_MASK
+
+
+def tick_diff(end, start):
+    """ Signed difference between two sender ticks, in ms """
+    return ((end - start + _TICK_HALF) & _TICK_MASK) - _TICK_HALF
+
+
+def encode(buttons, seq, axes=_EMPTY, tick=None):
+    """ Return a frame for the button mask, sequence number and axes, stamped now unless tick is given """
+    frame = bytearray(HEADER_SIZE + len(axes))
+    encode_into(frame, buttons, seq, axes, tick)
+    return bytes(frame)
+
+
+def encode_into(buffer, buttons, seq, axes=_EMPTY, tick=None):
+    """ Write a frame into a preallocated buffer and return its length """
+    count = len(axes)
+    if count > MAX_AXES:
+        raise ValueError("too many axes")
+    if tick is None:
+        tick = now_tick()
+    struct.pack_into(HEADER_FORMAT, buffer, 0, PROTOCOL_VERSION, count, seq & 0xFFFF, buttons & 0xFFFF,
+                     tick & _TICK_MASK)
+    for index in range(count):
+        buffer[HEADER_SIZE + index] = axes[index] & 0xFF
+    return HEADER_SIZE + count
+
+
+def encode_stop_into(buffer, seq, tick=None):
+    """ Write an emergency stop frame into a preallocated buffer and return its length """
+    if tick is None:
+        tick = now_tick()
+    struct.pack_into(HEADER_FORMAT, buffer, 0, PROTOCOL_VERSION, FLAG_STOP, seq & 0xFFFF, 0, tick & _TICK_MASK)
+    return HEADER_SIZE
+
+
+def is_stop(frame):
+    """ Return True if the frame is an emergency stop, without allocating anything """
+    return len(frame) >= HEADER_SIZE and frame[0] == PROTOCOL_VERSION and frame[1] & FLAG_STOP != 0
+
+
+def decode(frame):
+    """ Return (seq, buttons, axes) from a frame, raise ValueError if it is not valid """
+    if len(frame) < HEADER_SIZE:
+        raise ValueError("short frame")
+    version, flags, seq, buttons, tick = struct.unpack_from(HEADER_FORMAT, frame, 0)
+    if version != PROTOCOL_VERSION:
+        raise ValueError("unsupported version")
+    count = flags & _AXES_MASK
+    if len(frame) < HEADER_SIZE + count:
+        raise ValueError("short frame")
+    if count:
+        axes = struct.unpack_from("<%db" % count, frame, HEADER_SIZE)
+    else:
+        axes = _EMPTY
+    return seq, buttons, axes
+
+
+def is_valid(frame):
+    """ Return True if decode() would accept the frame, without allocating anything """
+    return (len(frame) >= HEADER_SIZE and frame[0] == PROTOCOL_VERSION
+            and len(frame) >= HEADER_SIZE + (frame[1] & _AXES_MASK))
+
+
+def frame_seq(frame):
+    """ Return the sequence number of any frame without decoding the rest """
+    return frame[2] | (frame[3] << 8)
+
+
+def frame_buttons(frame):
+    """ Return the button mask of any frame without decoding the rest """
+    return frame[4] | (frame[5] << 8)
+
+
+def frame_tick(frame):
+    """ Return the sender tick of any frame without decoding the rest """
+    return frame[6] | (frame[7] << 8)
+
+
+def encode_ack_into(buffer, seq, tick):
+    """ Write the acknowledgement into a preallocated buffer and return its length """
+    struct.pack_into(ACK_FORMAT, buffer, 0, seq & 0xFFFF, tick & _TICK_MASK)
+    return ACK_SIZE
+
+
+def ack_seq(data):
+    """ Return the sequence number of an acknowledgement of ACK_SIZE bytes """
+    return data[0] | (data[1] << 8)
+
+
+def ack_tick(data):
+    """ Return the sender tick of an acknowledgement of ACK_SIZE bytes """
+    return data[2] | (data[3] << 8)
+
+
+def encode_channels(channels):
+    """ Return the write that asks the remote for these channels """
+    return bytes((channels & CHANNELS_ALL,))
+
+
+def button_names(buttons):
+    """ Return the names of the buttons set in a mask, for printing """
+    return [name for bit, name in enumerate(BUTTON_NAMES) if buttons & (1 << bit)]
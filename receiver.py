@@ -0,0 +1,148 @@
+# Notification receiver for the central (robot) side
+# Subscribes to the remote's characteristic once, then hands every
+# notification to a handler picked by the frame's first byte. No GATT reads,
+# so nothing waits on an ATT round trip. Every frame can be acknowledged
+# back to the remote, and frames that arrive too late are not handled.
+
+from micropython import const
+from utime import ticks_diff, ticks_ms
+
+import event_trace
+import protocol
+
+# How long the quickest frame is remembered for when working out frame ages
+AGE_WINDOW_MS = const(10_000)
+
+
+class FrameAge:
+    """ Estimate how old a frame is from its sender tick
+
+    The remote's clock is not synchronised with ours, so ages are measured
+    against the quickest frame seen lately, which is taken to have arrived
+    straight away. The minimum is kept over two windows so the estimate
+    follows the drift between the two clocks.
+    """
+
+    def __init__(self, window_ms=AGE_WINDOW_MS):
+        self.window_ms = window_ms
+        self._current = None
+        self._previous = None
+        self._window_start = ticks_ms()
+
+    def age_ms(self, tick):
+        """ Return how much later than the quickest recent frame this one is, in ms """
+        now = ticks_ms()
+        offset = (now - tick) & 0xFFFF
+        if ticks_diff(now, self._window_start) > self.window_ms:
+            self._previous = self._current
+            self._current = None
+            self._window_start = now
+        if self._current is None or protocol.tick_diff(offset, self._current) < 0:
+            self._current = offset
+        base = self._current
+        if self._previous is not None and protocol.tick_diff(self._previous, base) < 0:
+            base = self._previous
+        return protocol.tick_diff(offset, base)
+
+
+class Subscriber:
+    """ Subscribe to one characteristic and pass each notification to handle() """
+
+    def __init__(self, characteristic, subscribe=None):
+        self.characteristic = characteristic
+        # Optional coroutine function that subscribes, e.g. GattCache.subscribe
+        self._subscribe = subscribe
+
+    async def subscribe(self):
+        """ Turn on notifications, with the subscribe function if one was given """
+        if self._subscribe:
+            await self._subscribe(self.characteristic)
+        else:
+            await self.characteristic.subscribe(notify=True)
+
+    async def run(self):
+        """ Subscribe and handle notifications until the connection goes away """
+        await self.subscribe()
+        while True:
+            self.handle(await self.characteristic.notified())
+
+    def handle(self, data):
+        raise NotImplementedError
+
+
+class NotificationReceiver(Subscriber):
+    """ Dispatch notifications from one characteristic through a handler table """
+
+    def __init__(self, characteristic, handlers, subscribe=None, ack=None, max_age_ms=None, timeout_ms=None,
+                 trace=None, idle=None):
+        super().__init__(characteristic, subscribe)
+        # {first byte of the frame: handler(frame)}
+        self.handlers = handlers
+        # Optional characteristic on the remote to write acks to
+        self.ack = ack
+        # Frames older than this are counted and not handled
+        self.max_age_ms = max_age_ms
+        self._age = FrameAge() if max_age_ms else None
+        # Raise asyncio.TimeoutError if no frame, not even a keepalive, comes for this long
+        self.timeout_ms = timeout_ms
+        # Optional EventTrace for notify received / ack sent events
+        self.trace = trace
+        # Optional function called after each frame is handled and acked,
+        # when the next one is a connection interval away, e.g. MemoryManager.idle
+        self.idle = idle
+        # Every ack is written from here, so sending one allocates nothing
+        self._ack_buffer = bytearray(protocol.ACK_SIZE)
+        self._last_seq = None
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.stale = 0
+
+    async def run(self):
+        """ Subscribe and dispatch until the connection goes away or goes quiet """
+        await self.subscribe()
+        while True:
+            frame = await self.characteristic.notified(self.timeout_ms)
+            trace = self.trace
+            if trace is not None and len(frame) >= protocol.HEADER_SIZE:
+                trace.record(event_trace.NOTIFY_RECEIVED, protocol.frame_seq(frame))
+            self.dispatch(frame)
+            if self.ack is not None and len(frame) >= protocol.HEADER_SIZE:
+                seq = protocol.frame_seq(frame)
+                protocol.encode_ack_into(self._ack_buffer, seq, protocol.frame_tick(frame))
+                await self.ack.write(self._ack_buffer)
+                if trace is not None:
+                    trace.record(event_trace.ACK_SENT, seq)
+            if self.idle is not None:
+                self.idle()
+
+    def dispatch(self, frame):
+        """ Count one frame and pass it to its handler """
+        self.received += 1
+        if len(frame) < protocol.HEADER_SIZE:
+            self.rejected += 1
+            return
+        seq = protocol.frame_seq(frame)
+        last = self._last_seq
+        if last is not None:
+            gap = (seq - last) & 0xFFFF
+            if gap == 0 or gap >= 0x8000:
+                # Repeated or older than one we have already handled
+                self.duplicates += 1
+                return
+            self.dropped += gap - 1
+        self._last_seq = seq
+        if self._age is not None and self._age.age_ms(protocol.frame_tick(frame)) > self.max_age_ms:
+            self.stale += 1
+            return
+        handler = self.handlers.get(frame[0])
+        if handler is None:
+            self.rejected += 1
+            return
+        handler(frame)
+
+    def stats(self):
+        """ Return the counters as a string, for printing """
+        return (f"received {self.received}, dropped {self.dropped}, duplicates {self.duplicates}, "
+                f"rejected {self.rejected}, stale {self.stale}")
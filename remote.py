@@ -9,7 +9,20 @@ import bluetooth
 import machine
 import uasyncio as asyncio
 from micropython import const
-from pimoroni import Button
+
+import log
+import protocol
+from advertising import AdvertisingSchedule
+from axes import AXIS_SAMPLE_MS, AxisStream
+from button_events import ButtonEvents
+from centrals import CentralRegistry
+from dual_core import InputCore
+from event_trace import (ACK_RECEIVED, BUTTON_EDGE, CONNECT, DISCONNECT, NOTIFY_SENT,
+                         EventTrace)
+from gpio_bank import input_bank
+from loop_profiler import LoopProfiler
+from memory import MemoryManager
+from send_schedule import SendSchedule
 
 def uid():
     """ Return the unique id of the device as a string """
@@ -22,30 +35,106 @@ SERIAL_NUMBER_ID = const(0x2A25)
 HARDWARE_REVISION_ID = const(0x2A26)
 BLE_VERSION_ID = const(0x2A28)
 
-button_a = Button(0)
-button_b = Button(1)
-button_x = Button(2)
-button_y = Button(3)
+# Buttons A, B, X and Y; edges are captured by pin interrupts. The pin order
+# matches the protocol button bits, so the event state is the button mask.
+BUTTON_PINS = (0, 1, 2, 3)
+
+# Resend held buttons every AUTOREPEAT_MS (0 for never) and send a
+# keepalive every KEEPALIVE_MS when nothing else has gone out
+AUTOREPEAT_MS = 50
+KEEPALIVE_MS = 1000
+
+schedule = SendSchedule(AUTOREPEAT_MS, KEEPALIVE_MS)
+
+# Pressing all of these together is an emergency stop, sent on the stop
+# characteristic ahead of the frame; the robot ignores motion until every
+# button is let go. 0 for no emergency stop.
+STOP_BUTTONS = protocol.BUTTON_X | protocol.BUTTON_Y
+
+# True scans and debounces the buttons on core 1, leaving core 0 to BLE;
+# False uses pin interrupts on core 0. remote_task works the same with both.
+DUAL_CORE = False
+
+if DUAL_CORE:
+    buttons = InputCore(input_bank(BUTTON_PINS))
+    buttons.start()
+else:
+    buttons = ButtonEvents(
+        [machine.Pin(pin, machine.Pin.IN, machine.Pin.PULL_UP) for pin in BUTTON_PINS]
+    )
+
+# ADC pins for joystick axes, steering then throttle, e.g. (26, 27); none
+# for a buttons-only remote. Updates go out on the axis characteristic.
+AXIS_PINS = ()
+
+axes = AxisStream([machine.ADC(pin) for pin in AXIS_PINS])
 
 led = machine.Pin("LED", machine.Pin.OUT)
 
+# Lowest level logged: log.DEBUG shows every button press, log.OFF nothing.
+# Lines are queued and printed when the loop is idle, not in remote_task.
+LOG_LEVEL = log.INFO
+
+log_sink = log.DeferredSink()
+logger = log.Logger(LOG_LEVEL, log_sink)
+
+# True times every task on the loop; write a task's index to the
+# diagnostics characteristic to get its report back, and a summary prints
+# on disconnect
+PROFILE = False
+
+profiler = LoopProfiler(PROFILE)
+
+# True records button edges, notifications, acks and connections, and
+# prints the trace on disconnect for tools/trace_to_chrome.py
+TRACE = False
+
+trace = EventTrace("remote", TRACE)
+
+# Collects garbage between frames rather than whenever the heap fills up
+memory = MemoryManager(trace=trace)
+
+# Frames are built here and edges popped into button_event, so sending
+# allocates nothing
+frame_buffer = bytearray(protocol.HEADER_SIZE)
+stop_buffer = bytearray(protocol.HEADER_SIZE)
+stop_seq = 0
+button_event = [0, False, 0]
+
 _ENV_SENSE_UUID = bluetooth.UUID(0x180A)
 _GENERIC = bluetooth.UUID(0x1848)
 _ENV_SENSE_TEMP_UUID = bluetooth.UUID(0x1800)
 _BUTTON_UUID = bluetooth.UUID(0x2A6E)
+_ACK_UUID = bluetooth.UUID(0x2A6F)
+_DIAGNOSTICS_UUID = bluetooth.UUID(0x2A70)
+_AXIS_UUID = bluetooth.UUID(0x2A71)
+_STOP_UUID = bluetooth.UUID(0x2A72)
 
 _BLE_APPEARANCE_GENERIC_REMOTE_CONTROL = const(384)
 
-# Advertising frequency
-ADV_INTERVAL_MS = 250_000
+# Advertising frequency: (how long in ms, interval in us). Fast for the first
+# 30 s after boot or a disconnect, then slower, then slow until a connection.
+ADV_PROFILE = (
+    (30_000, 25_000),
+    (120_000, 250_000),
+    (None, 1_000_000),
+)
 
-device_info = aioble.Service(_ENV_SENSE_UUID)
+advertising = AdvertisingSchedule(ADV_PROFILE)
 
-connection = None
+# How many robots can be connected at once; the remote keeps advertising
+# while there is room for another. Every frame goes to all of them.
+MAX_CENTRALS = 1
+
+centrals = CentralRegistry(MAX_CENTRALS)
+
+device_info = aioble.Service(_ENV_SENSE_UUID)
 
 # Create characteristics for device info
 aioble.Characteristic(device_info, bluetooth.UUID(MANUFACTURER_ID), read=True, initial="KevsRobotsRemote")
-aioble.Characteristic(device_info, bluetooth.UUID(MODEL_NUMBER_ID), read=True, initial="1.0")
+# Change the model number whenever the services below change; robots use it
+# to throw away their cached GATT handles
+aioble.Characteristic(device_info, bluetooth.UUID(MODEL_NUMBER_ID), read=True, initial="1.4")
 aioble.Characteristic(device_info, bluetooth.UUID(SERIAL_NUMBER_ID), read=True, initial=uid())
 aioble.Characteristic(device_info, bluetooth.UUID(HARDWARE_REVISION_ID), read=True, initial=sys.version)
 aioble.Characteristic(device_info, bluetooth.UUID(BLE_VERSION_ID), read=True, initial="1.0")
@@ -56,6 +145,26 @@ button_characteristic = aioble.Characteristic(
     remote_service, _BUTTON_UUID, read=True, notify=True
 )
 
+# The robot writes an ack here for every frame it gets
+ack_characteristic = aioble.Characteristic(
+    remote_service, _ACK_UUID, write=True, write_no_response=True, capture=True
+)
+
+# Profiler reports (see loop_profiler.decode_report) for whoever asks
+diagnostics_characteristic = aioble.Characteristic(
+    remote_service, _DIAGNOSTICS_UUID, read=True, write=True, notify=True, capture=True
+)
+
+# Joystick axis updates (see axes.py)
+axis_characteristic = aioble.Characteristic(
+    remote_service, _AXIS_UUID, read=True, notify=True
+)
+
+# Emergency stops only, so one is never overwritten by a motion frame
+stop_characteristic = aioble.Characteristic(
+    remote_service, _STOP_UUID, read=True, notify=True
+)
+
 print('registering services')
 aioble.register_services(remote_service, device_info)
 
@@ -64,50 +173,129 @@ connected = False
 async def remote_task():
     """ Send the event to the connected device """
 
+    seq = 0
     while True:
         if not connected:
-            print('not connected')
-            await asyncio.sleep_ms(1000)
+            logger.info("not connected")
+            buttons.clear()
+            schedule.reset()
+            await profiler.sleep_ms(1000)
             continue
-        if button_a.read():
-            print(f'Button A pressed, connection is: {connection}')
-            button_characteristic.write(b"a")   
-            button_characteristic.notify(connection,b"a")
-        elif button_b.read():
-            print('Button B pressed')
-            button_characteristic.write(b"b")
-            button_characteristic.notify(connection,b"b")
-        elif button_x.read():
-            print('Button X pressed')
-            button_characteristic.write(b"x")
-            button_characteristic.notify(connection,b"x")
-        elif button_y.read():
-            print('Button Y pressed')
-            button_characteristic.write(b"y")
-            button_characteristic.notify(connection,b"x")
-        else:
-            button_characteristic.write(b"!")
-        await asyncio.sleep_ms(10)
+        # Everything due has gone out, so this is the time to collect
+        if not buttons.any():
+            memory.idle()
+        # Only wake up for a new edge, or when a repeat or keepalive is due
+        await buttons.wait(schedule.wait_ms())
+        if not connected:
+            continue
+        # Every edge goes out in its own frame, releases included, so the
+        # robot sees chords end
+        while buttons.pop_into(button_event):
+            button, pressed, time = button_event
+            trace.record(BUTTON_EDGE, button << 1 | pressed, time)
+            if pressed and STOP_BUTTONS >> button & 1 and buttons.state & STOP_BUTTONS == STOP_BUTTONS:
+                send_stop()
+            if schedule.should_send(buttons.state):
+                if buttons.state and logger.level <= log.DEBUG:
+                    logger.debug("Buttons %s pressed, robots connected: %s",
+                                 protocol.button_names(buttons.state), centrals.count)
+                send_frame(seq)
+                seq += 1
+        if schedule.should_send(buttons.state):
+            send_frame(seq)
+            seq += 1
+
+def send_frame(seq):
+    """ Notify the robot of the buttons held now """
+    protocol.encode_into(frame_buffer, buttons.state, seq)
+    button_characteristic.write(frame_buffer)
+    centrals.notify(button_characteristic, protocol.CHANNEL_FRAMES, frame_buffer)
+    trace.record(NOTIFY_SENT, seq)
+    centrals.sent_frame(seq)
+
+def send_stop():
+    """ Notify the robot to stop now """
+    global stop_seq
+    protocol.encode_stop_into(stop_buffer, stop_seq)
+    stop_seq += 1
+    stop_characteristic.write(stop_buffer)
+    centrals.notify(stop_characteristic, protocol.CHANNEL_STOP, stop_buffer)
+    logger.info("emergency stop")
+
+async def ack_task():
+    """ Work out the round trip time, jitter and loss from each robot's acks """
+    while True:
+        connection, data = await ack_characteristic.written()
+        centrals.on_written(connection, data)
+        if len(data) == protocol.ACK_SIZE:
+            trace.record(ACK_RECEIVED, protocol.ack_seq(data))
+
+async def axis_task():
+    """ Sample the joystick axes and notify the robot of the ones that moved """
+    while True:
+        await profiler.sleep_ms(AXIS_SAMPLE_MS)
+        if not connected:
+            # The first update on the next connection is a keyframe
+            axes.reset()
+            continue
+        axes.sample()
+        update = axes.update()
+        if update is not None:
+            centrals.notify(axis_characteristic, protocol.CHANNEL_AXES, update)
+
+async def diagnostics_task():
+    """ Send a profiler report back whenever the diagnostics characteristic is written
+
+    The first byte written picks the task, one per notification; every
+    report says how many tasks there are.
+    """
+    while True:
+        connection, data = await diagnostics_characteristic.written()
+        report = profiler.report(data[0] if data else 0)
+        diagnostics_characteristic.write(report)
+        diagnostics_characteristic.notify(connection, report)
             
-# Serially wait for connections. Don't advertise while a central is
-# connected.    
+# Wait for connections, and keep advertising while there is room for
+# another robot
 async def peripheral_task():
     print('peripheral task started')
-    global connected, connection
+    global connected
     while True:
-        connected = False
-        async with await aioble.advertise(
-            ADV_INTERVAL_MS, 
+        await centrals.wait_for_space()
+        connection = await advertising.advertise(
             name="KevsRobots", 
             appearance=_BLE_APPEARANCE_GENERIC_REMOTE_CONTROL, 
             services=[_ENV_SENSE_TEMP_UUID]
-        ) as connection:
-            print("Connection from", connection.device)
-            connected = True
-            print(f"connected: {connected}")
-            await connection.disconnected()
-            print(f'disconnected')
-        
+        )
+        centrals.add(connection)
+        logger.info("Connection from %s, %s of %s", connection.device, centrals.count, centrals.capacity)
+        trace.record(CONNECT)
+        connected = True
+        # A robot joining while the stick is pushed needs a keyframe
+        axes.reset()
+        asyncio.create_task(profiler.wrap("central", central_task(connection)))
+
+async def central_task(connection):
+    """ Look after one robot's connection until it goes away """
+    global connected
+    async with connection:
+        await connection.disconnected(timeout_ms=None)
+    index = centrals.remove(connection)
+    connected = centrals.count > 0
+    if index >= 0:
+        logger.info("disconnected, %s, %s", centrals.acks[index].stats(), schedule.stats())
+    else:
+        # Never had a slot, so there are no acks of its own to show
+        logger.info("disconnected, %s", schedule.stats())
+    if AXIS_PINS:
+        logger.info(axes.stats())
+    logger.info(centrals.stats())
+    trace.record(DISCONNECT)
+    memory.collect()
+    logger.info(memory.stats())
+    log_sink.flush()
+    profiler.dump()
+    trace.dump()
 
 async def blink_task():
     print('blink task started')
@@ -120,14 +308,20 @@ async def blink_task():
             blink = 1000
         else:
             blink = 250
-        await asyncio.sleep_ms(blink)
+        await profiler.sleep_ms(blink)
         
 async def main():
     tasks = [
-        asyncio.create_task(peripheral_task()),
-        asyncio.create_task(blink_task()),
-        asyncio.create_task(remote_task()),
+        asyncio.create_task(profiler.wrap("periph", peripheral_task())),
+        asyncio.create_task(profiler.wrap("blink", blink_task())),
+        asyncio.create_task(profiler.wrap("remote", remote_task())),
+        asyncio.create_task(profiler.wrap("ack", ack_task())),
+        asyncio.create_task(profiler.wrap("diag", diagnostics_task())),
+        asyncio.create_task(profiler.wrap("log", log_sink.run())),
+        asyncio.create_task(profiler.wrap("gc", memory.run())),
     ]
+    if AXIS_PINS:
+        tasks.append(asyncio.create_task(profiler.wrap("axes", axis_task())))
     await asyncio.gather(*tasks)
 
 asyncio.run(main())
\ No newline at end of file
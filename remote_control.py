@@ -5,7 +5,14 @@ import bluetooth
 import machine
 import uasyncio as asyncio
 from micropython import const
-from pimoroni import Button
+
+import log
+import protocol
+from advertising import AdvertisingSchedule
+from gpio_bank import input_bank
+from loop_profiler import LoopProfiler
+from memory import MemoryManager
+from send_schedule import SendSchedule
 
 def uid():
     """ Return the unique id of the device as a string """
@@ -18,13 +25,37 @@ SERIAL_NUMBER_ID = const(0x2A25)
 HARDWARE_REVISION_ID = const(0x2A26)
 BLE_VERSION_ID = const(0x2A28)
 
-button_a = Button(12)
-button_b = Button(13)
-button_x = Button(14)
-button_y = Button(15)
+# Buttons A, B, X and Y on GPIO 12-15, read together in one GPIO register
+# snapshot; bits come out in protocol order (BUTTON_A is bit 0)
+buttons_bank = input_bank((12, 13, 14, 15))
 
 led = machine.Pin("LED", machine.Pin.OUT)
 
+# Lowest level logged: log.DEBUG shows every frame sent, log.OFF nothing.
+# Lines are queued and printed when the loop is idle, not in remote_task.
+LOG_LEVEL = log.INFO
+
+log_sink = log.DeferredSink()
+logger = log.Logger(LOG_LEVEL, log_sink)
+
+# True times every task on the loop, with a summary printed on disconnect
+PROFILE = False
+
+profiler = LoopProfiler(PROFILE)
+
+# Collects garbage between scans rather than whenever the heap fills up
+memory = MemoryManager()
+
+# Frames are built here, so sending allocates nothing
+frame_buffer = bytearray(protocol.HEADER_SIZE)
+
+# Only changes are sent straight away; held buttons are resent every
+# AUTOREPEAT_MS (0 for never) and a keepalive goes out every KEEPALIVE_MS
+AUTOREPEAT_MS = 50
+KEEPALIVE_MS = 1000
+
+schedule = SendSchedule(AUTOREPEAT_MS, KEEPALIVE_MS)
+
 _DEVICE_INFO_UUID = bluetooth.UUID(0x180A) # Device Information
 _GENERIC = bluetooth.UUID(0x1848)
 _BUTTON_UUID = bluetooth.UUID(0x2A6E)
@@ -32,7 +63,8 @@ _ROBOT = bluetooth.UUID(0x1800)
                               
 _BLE_APPEARANCE_GENERIC_REMOTE_CONTROL = const(384)
 
-ADV_INTERVAL_MS = 250_000
+# Fast advertising after boot or a disconnect, slowing down over time
+advertising = AdvertisingSchedule()
 
 device_info = aioble.Service(_DEVICE_INFO_UUID)
                               
@@ -59,48 +91,45 @@ connected = False
 async def remote_task():
     """ Task to handle remote control """
 
+    seq = 0
     while True:
         if not connected:
-            print("Not Connected")
-            await asyncio.sleep_ms(1000)
+            logger.info("Not Connected")
+            schedule.reset()
+            await profiler.sleep_ms(1000)
             continue
-        if button_a.read():
-            print(f"Button A pressed, connection is: {connection}")
-            button_characteristic.write(b"a")
-            button_characteristic.notify(connection, b"a")
-        elif button_b.read():
-            print(f"Button B pressed, connection is: {connection}")
-            button_characteristic.write(b"b")
-            button_characteristic.notify(connection, b"b")
-        elif button_x.read():
-            print(f"Button X pressed, connection is: {connection}")
-            button_characteristic.write(b"x")
-            button_characteristic.notify(connection, b"x")
-        elif button_y.read():
-            print(f"Button Y pressed, connection is: {connection}")
-            button_characteristic.write(b"y")
-            button_characteristic.notify(connection, b"y")
-        else:
-            button_characteristic.write(b"!")
-#             button_characteristic.notify(connection, b"!")
-        await asyncio.sleep_ms(10)
+        # Read every button at once so chords go out in a single frame; this
+        # is the held state, the schedule does the repeating
+        buttons = buttons_bank.read()
+        if schedule.should_send(buttons):
+            protocol.encode_into(frame_buffer, buttons, seq)
+            button_characteristic.write(frame_buffer)
+            if buttons and logger.level <= log.DEBUG:
+                logger.debug("Buttons %s pressed, connection is: %s", protocol.button_names(buttons), connection)
+            button_characteristic.notify(connection, frame_buffer)
+            seq += 1
+        memory.idle()
+        await profiler.sleep_ms(10)
 
 async def peripheral_task():
     """ Task to handle peripheral """
     global connected, connection
     while True:
         connected = False
-        async with await aioble.advertise(
-            ADV_INTERVAL_MS,
+        async with await advertising.advertise(
             name="KevsRobots",
             appearance=_BLE_APPEARANCE_GENERIC_REMOTE_CONTROL,
             services=[_ROBOT]
         ) as connection:
-            print("Connection from, ", connection.device)
+            logger.info("Connection from, %s", connection.device)
             connected = True
-            print("connected {connected}")
+            logger.info("connected %s", connected)
             await connection.disconnected()
-            print("disconnected")
+            logger.info("disconnected %s", schedule.stats())
+            memory.collect()
+            logger.info(memory.stats())
+            log_sink.flush()
+            profiler.dump()
 
 async def blink_task():
     """ Task to blink LED """
@@ -113,13 +142,15 @@ async def blink_task():
             blink = 1000
         else:
             blink = 250
-        await asyncio.sleep_ms(blink)
+        await profiler.sleep_ms(blink)
 
 async def main():
     tasks = [
-        asyncio.create_task(peripheral_task()),
-        asyncio.create_task(remote_task()),
-        asyncio.create_task(blink_task()),
+        asyncio.create_task(profiler.wrap("periph", peripheral_task())),
+        asyncio.create_task(profiler.wrap("remote", remote_task())),
+        asyncio.create_task(profiler.wrap("blink", blink_task())),
+        asyncio.create_task(profiler.wrap("log", log_sink.run())),
+        asyncio.create_task(profiler.wrap("gc", memory.run())),
     ]
     await asyncio.gather(*tasks)
 
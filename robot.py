@@ -9,32 +9,48 @@ import bluetooth
 import machine
 import uasyncio as asyncio
 
+import protocol
+from gatt_cache import GattCache
+from link_params import LinkParams
+from peer_cache import PeerCache
+from receiver import NotificationReceiver
+from scanner import ScanEngine, name_pattern, service_pattern
+
 # Bluetooth UUIDS can be found online at https://www.bluetooth.com/specifications/gatt/services/
 
 _REMOTE_UUID = bluetooth.UUID(0x1848)
 _ENV_SENSE_UUID = bluetooth.UUID(0x1800) 
 _REMOTE_CHARACTERISTICS_UUID = bluetooth.UUID(0x2A6E)
+_ACK_UUID = bluetooth.UUID(0x2A6F)
 
 led = machine.Pin("LED", machine.Pin.OUT)
 connected = False
 alive = False
 
+peers = PeerCache()
+gatt = GattCache()
+
+# "drive" asks for a short connection interval for low latency, "idle" saves power
+LINK_MODE = "drive"
+link = LinkParams(LINK_MODE)
+
+# Frames that arrive later than this are ignored rather than driving on
+# stale input
+MAX_FRAME_AGE_MS = 250
+
+# The remote sends a keepalive every second, so this long without a frame
+# means the link is dead even if the stack has not noticed yet
+LINK_TIMEOUT_MS = 3000
+
+# The remote puts its name and service in the advertising payload, so a
+# passive scan is enough
+remote_scanner = ScanEngine((name_pattern("KevsRobots"), service_pattern(_ENV_SENSE_UUID)))
+
 async def find_remote():
-    # Scan for 5 seconds, in active mode, with very low interval/window (to
-    # maximise detection rate).
-    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
-        async for result in scanner:
-
-            # See if it matches our name
-            if result.name() == "KevsRobots":
-                print("Found KevsRobots")
-                for item in result.services():
-                    print (item)
-                if _ENV_SENSE_UUID in result.services():
-                    print("Found Robot Remote Service")
-                    return result.device
-            
-    return None
+    device = await remote_scanner.find()
+    if device:
+        print("Found KevsRobots", remote_scanner.stats())
+    return device
 
 async def blink_task():
     """ Blink the LED on and off every second """
@@ -51,67 +67,69 @@ async def blink_task():
             blink = 250
         await asyncio.sleep_ms(blink)
 
+def print_buttons(frame):
+    """ Print the buttons held in a control frame """
+    try:
+        seq, buttons, axes = protocol.decode(frame)
+    except ValueError:
+        return
+    for name in protocol.button_names(buttons):
+        print(f"{name} button pressed")
+
 async def peripheral_task():
     print('starting peripheral task')
     global connected
     connected = False
-    device = await find_remote()
-    if not device:
-        print("Robot Remote not found")
-        return
     try:
-        print("Connecting to", device)
-        connection = await device.connect()
-        
+        connection = await peers.connect(find_remote, **link.connect_kwargs())
     except asyncio.TimeoutError:
         print("Timeout during connection")
         return
-      
+    if not connection:
+        print("Robot Remote not found")
+        return
+    link.watch(connection)
+    print(peers.stats())
+    print(link.describe())
+
     async with connection:
         print("Connected")
         connected = True
         alive = True
         while True and alive:
             try:
-                robot_service = await connection.service(_REMOTE_UUID)
-                print(robot_service)
-                control_characteristic = await robot_service.characteristic(_REMOTE_CHARACTERISTICS_UUID)
-                print(control_characteristic)
+                control_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _REMOTE_CHARACTERISTICS_UUID
+                )
+                # Remotes without an ack characteristic just don't get acks
+                ack_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _ACK_UUID
+                )
+                print(control_characteristic, gatt.stats())
             except asyncio.TimeoutError:
                 print("Timeout discovering services/characteristics")
                 return
-            while True:
-                if control_characteristic != None:
-                    try:
-                        command = await control_characteristic.read()
-#                         print(f"Command: {temp_deg_c}")
-
-                        if command == b'a':
-                            print("a button pressed")
-                        if command == b'b':
-                            print("b button pressed")
-                        if command == b'x':
-                            print("x button pressed")
-                        if command == b'y':
-                            print("y button pressed")
-                    except TypeError:
-                        print(f'something went wrong; remote disconnected?')
-                        connected = False
-                        alive = False
-                        return
-                    except asyncio.TimeoutError:
-                        print(f'something went wrong; timeout error?')
-                        connected = False
-                        alive = False
-                        return
-                    except asyncio.GattError:
-                        print(f'something went wrong; Gatt error - did the remote die?')
-                        connected = False
-                        alive = False
-                        return
-                else:
-                    print('no characteristic')
-                await asyncio.sleep_ms(10)
+            if control_characteristic == None:
+                print('no characteristic')
+                return
+            receiver = NotificationReceiver(
+                control_characteristic, {protocol.PROTOCOL_VERSION: print_buttons},
+                subscribe=gatt.subscribe, ack=ack_characteristic, max_age_ms=MAX_FRAME_AGE_MS,
+                timeout_ms=LINK_TIMEOUT_MS,
+            )
+            try:
+                await receiver.run()
+            except asyncio.TimeoutError:
+                print(f'something went wrong; timeout error?')
+            except aioble.DeviceDisconnectedError:
+                print(f'something went wrong; remote disconnected?')
+            except aioble.GattError:
+                print(f'something went wrong; Gatt error - did the remote die?')
+            print(receiver.stats())
+            print(link.describe())
+            connected = False
+            alive = False
+            return
 
 async def main():
     tasks = []
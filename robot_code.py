@@ -1,31 +1,111 @@
-import aioble
+import array
+
 import bluetooth
 import machine
 import uasyncio as asyncio
 from burgerbot import Burgerbot
 
+import log
+import motion
+import protocol
+from axes import AxisReceiver
+from dual_core import MotorCore
+from event_trace import CONNECT, DISCONNECT, EventTrace
+from gatt_cache import GattCache
+from link_params import LinkParams
+from loop_profiler import LoopProfiler
+from memory import MemoryManager
+from mixer import Mixer
+from peer_cache import PeerCache
+from receiver import NotificationReceiver
+from safety import DEADMAN_MS, Deadman, StopReceiver
+from scanner import ScanEngine, name_pattern, service_pattern
+from velocity import VelocityLoop
+from wheels import Wheels
+
 _REMOTE_UUID = bluetooth.UUID(0x1848)
 _GENERIC = bluetooth.UUID(0x1800)
 _REMOTE_CHARACTERISTICS_UUID = bluetooth.UUID(0x2A6E)
+_ACK_UUID = bluetooth.UUID(0x2A6F)
+_AXIS_UUID = bluetooth.UUID(0x2A71)
+_STOP_UUID = bluetooth.UUID(0x2A72)
 
 led = machine.Pin("LED", machine.Pin.OUT)
+
+# Lowest level logged: log.DEBUG shows every frame, log.OFF nothing. Lines
+# are queued and printed when the loop is idle, not while handling frames.
+LOG_LEVEL = log.INFO
+
+log_sink = log.DeferredSink()
+logger = log.Logger(LOG_LEVEL, log_sink)
+
+# True times every task on the loop, with a summary printed on disconnect
+PROFILE = False
+
+profiler = LoopProfiler(PROFILE)
+
+# True records notifications, acks, moves and connections, and prints the
+# trace on disconnect for tools/trace_to_chrome.py
+TRACE = False
+
+trace = EventTrace("robot", TRACE)
+
+# Collects garbage between frames rather than whenever the heap fills up
+memory = MemoryManager(trace=trace)
 connected = False
 alive = False
 
+peers = PeerCache()
+gatt = GattCache()
+
+# "drive" asks for a short connection interval for low latency, "idle" saves power
+LINK_MODE = "drive"
+link = LinkParams(LINK_MODE)
+
+# Frames that arrive later than this are ignored rather than driving on
+# stale input
+MAX_FRAME_AGE_MS = 250
+
+# The remote sends a keepalive every second, so this long without a frame
+# means the link is dead even if the stack has not noticed yet
+LINK_TIMEOUT_MS = 3000
+
 bot = Burgerbot()
 bot.stop()
 
+# The left and right motors, with the speed() method of Pimoroni's
+# motor.Motor, so the joystick can drive at any speed. None switches the
+# Burgerbot's own forward / backward / turn methods on and off instead.
+LEFT_MOTOR = None
+RIGHT_MOTOR = None
+
+wheels = Wheels(bot, LEFT_MOTOR, RIGHT_MOTOR)
+
+# True ramps the motors up and down in a fixed rate velocity loop, False
+# switches them straight on and off. Ramping needs LEFT_MOTOR and
+# RIGHT_MOTOR, the Burgerbot's own methods are only on or off.
+RAMP = False
+
+motors = VelocityLoop(wheels) if RAMP else wheels
+
+# True runs the motor loop on core 1, away from the BLE stack on core 0,
+# with the velocity loop too if RAMP is on
+DUAL_CORE = False
+
+if DUAL_CORE:
+    executor = MotorCore(motors)
+else:
+    executor = motion.MotionExecutor(motors, trace=trace)
+
+# The remote puts its name and service in the advertising payload, so a
+# passive scan is enough
+remote_scanner = ScanEngine((name_pattern("KevsRobots"), service_pattern(_GENERIC)))
+
 async def find_remote():
-    async with aioble.scan(5000, interval_us=30000, window_us=30000, active=True) as scanner:
-        async for result in scanner:
-            if result.name() == "KevsRobots":
-                print("Found KevsRobots")
-                for item in result.services():
-                    print(item)
-                if _GENERIC in result.services():
-                    print("Found Robot Remote Service")
-                    return result.device
-    return None
+    device = await remote_scanner.find()
+    if device:
+        print("Found KevsRobots", remote_scanner.stats())
+    return device
 
 async def blink_task():
     """ Blink the LED on and off every second """
@@ -39,50 +119,150 @@ async def blink_task():
             blink = 1000
         else:
             blink = 250
-        await asyncio.sleep_ms(blink)
+        await profiler.sleep_ms(blink)
     print('blink task stopped')
 
-def move_robot(command):
-    if command == b'a':
-        bot.forward(0.1)
-    elif command == b'b':
-        bot.backward(0.1)
-    elif command == b'x':
-        bot.turnleft(0.1)
-    elif command == b'y':
-        bot.turnright(0.1)
+def halt():
+    """ Stop the motors now, dropping queued moves and not ramping; return True if they were running """
+    moving = executor.command != motion.STOP or (RAMP and (motors.left or motors.right))
+    executor.stop()
+    if RAMP and not DUAL_CORE:
+        # MotorCore halts the velocity loop itself, on core 1
+        motors.halt()
+    return bool(moving)
+
+# Halts the motors if no valid frame comes for this long while they run
+deadman = Deadman(halt, DEADMAN_MS)
+
+# Set by an emergency stop from the remote; motion is ignored until every
+# button is let go and the joystick is back at the centre
+stop_latched = False
+
+def emergency_stop():
+    """ Halt and ignore motion until the remote lets go """
+    global stop_latched
+    stop_latched = True
+    halt()
+    logger.warning("emergency stop")
+
+# Button mask of the last frame moved on, so only letting go stops the
+# robot; keepalives with no buttons leave a joystick drive alone
+held_buttons = 0
+
+def move_robot(buttons):
+    """ Queue the motion for the button mask; drive buttons win over turns """
+    global held_buttons
+    released = held_buttons and not buttons
+    held_buttons = buttons
+    if buttons & protocol.BUTTON_A:
+        executor.submit(motion.FORWARD)
+    elif buttons & protocol.BUTTON_B:
+        executor.submit(motion.BACKWARD)
+    elif buttons & protocol.BUTTON_X:
+        executor.submit(motion.LEFT)
+    elif buttons & protocol.BUTTON_Y:
+        executor.submit(motion.RIGHT)
+    elif released and not stick_moving:
+        executor.submit(motion.STOP)
+
+# False ignores the remote's joystick, and asks the remote not to send it
+JOYSTICK = True
+
+# Joystick to motor speeds: expo, steering rate and trims are in mixer.py;
+# viper=True mixes with the viper code emitter, and in Python on ports
+# without it
+mixer = Mixer(viper=True)
+speeds = array.array("h", [0, 0])
+
+# True while the joystick is off centre, so coming back to the centre stops
+# the robot once and the keyframes after that leave button moves alone
+stick_moving = False
+
+def on_axes(values):
+    """ Drive at the speeds from the joystick: steering, then throttle """
+    global stick_moving
+    deadman.feed()
+    steer = values[0]
+    throttle = values[1]
+    if stop_latched:
+        # Only noted, so the stop is let go with the stick at the centre
+        stick_moving = bool(steer or throttle)
+        return
+    if steer or throttle:
+        stick_moving = True
+        mixer.mix_into(steer, throttle, speeds)
+        executor.drive(speeds[0], speeds[1])
+    elif stick_moving:
+        stick_moving = False
+        executor.submit(motion.STOP)
+
+async def listen_task(listener):
+    """ Run an AxisReceiver or StopReceiver until the connection goes away """
+    try:
+        await listener.run()
+    except Exception:
+        # The frame receiver sees the same disconnect and cleans up
+        pass
+    finally:
+        logger.info(listener.stats())
+
+def on_control_frame(frame):
+    """ Handle a control frame from the remote """
+    if not protocol.is_valid(frame):
+        logger.warning("bad frame: %s", frame)
+        return
+    global stop_latched
+    buttons = protocol.frame_buttons(frame)
+    deadman.feed()
+    if stop_latched:
+        if buttons or stick_moving:
+            return
+        stop_latched = False
+        logger.info("emergency stop let go")
+    move_robot(buttons)
+    if logger.level <= log.DEBUG:
+        logger.debug("%s %s", protocol.frame_seq(frame), protocol.button_names(buttons))
 
 async def peripheral_task():
     print ("peripheral task started")
     global connected, alive 
     connected = False
-    device = await find_remote()
-    if not device:
-        print("No remote found")
-        return
     try:
-        print("connecting to", device)
-        connection = await device.connect()
-    
+        connection = await peers.connect(find_remote, **link.connect_kwargs())
     except asyncio.TimeoutError:
         print("Timeout during connection")
         return
+    if not connection:
+        print("No remote found")
+        return
+    link.watch(connection)
+    print(peers.stats())
+    print(link.describe())
 
     async with connection:
         print("connected")
+        trace.record(CONNECT)
         alive = True
         connected = True
 
-        robot_service = await connection.service(_REMOTE_UUID)
-        control_characteristic = await robot_service.characteristic(_REMOTE_CHARACTERISTICS_UUID)
-
         while True:
             try:
-                if robot_service == None:
-                    print("remote disconnected")
-                    alive = False
-                    break
-            
+                control_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _REMOTE_CHARACTERISTICS_UUID
+                )
+                # Remotes without an ack characteristic just don't get acks
+                ack_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _ACK_UUID
+                )
+                # Nor do remotes without a joystick send axes
+                axis_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _AXIS_UUID
+                )
+                # Nor do older remotes have an emergency stop
+                stop_characteristic = await gatt.characteristic(
+                    connection, _REMOTE_UUID, _STOP_UUID
+                )
+                print(gatt.stats())
             except asyncio.TimeoutError:
                 print("Timeout during discovery / service / characteristic")
                 alive = False
@@ -93,33 +273,81 @@ async def peripheral_task():
                 alive = False
                 break
                  
+            receiver = NotificationReceiver(
+                control_characteristic, {protocol.PROTOCOL_VERSION: on_control_frame},
+                subscribe=gatt.subscribe, ack=ack_characteristic, max_age_ms=MAX_FRAME_AGE_MS,
+                timeout_ms=LINK_TIMEOUT_MS, trace=trace, idle=memory.idle,
+            )
+            listeners = []
+            # Only what this robot listens to, the remote may be driving others too
+            channels = protocol.CHANNEL_FRAMES
+            if stop_characteristic is not None:
+                channels |= protocol.CHANNEL_STOP
+                stop_receiver = StopReceiver(stop_characteristic, emergency_stop, subscribe=gatt.subscribe)
+                listeners.append(asyncio.create_task(profiler.wrap("estop", listen_task(stop_receiver))))
+            if axis_characteristic is not None and JOYSTICK:
+                channels |= protocol.CHANNEL_AXES
+                axis_receiver = AxisReceiver(axis_characteristic, on_axes, subscribe=gatt.subscribe)
+                listeners.append(asyncio.create_task(profiler.wrap("axes", listen_task(axis_receiver))))
             try:
-                data = await control_characteristic.read(timeout_ms=1000)
-
-                await control_characteristic.subscribe(notify=True)
-                while True:
-                    command = await control_characteristic.notified()
-                    move_robot(command)
-                    print(command)
-                    bot.stop()
+                if ack_characteristic is not None:
+                    await ack_characteristic.write(protocol.encode_channels(channels))
+                await receiver.run()
 
             except Exception as e:
-                print(f"something went wrong: {e}")
+                logger.error("something went wrong: %s", e)
+                logger.info(receiver.stats())
+                for listener in listeners:
+                    listener.cancel()
+                halt()
                 connected = False
                 alive = False
                 break
             
-        await connection.disconnected()
-        print("disconnected")
+        # Drops the link if it only went quiet, returns straight away if
+        # it is already down
+        await connection.disconnect()
+        logger.info("disconnected")
+        trace.record(DISCONNECT)
+        # Again, now any connection updates are in
+        logger.info(link.describe())
+        if RAMP:
+            logger.info(motors.stats())
+        logger.info(deadman.stats())
+        memory.collect()
+        logger.info(memory.stats())
+        log_sink.flush()
+        profiler.dump()
+        trace.dump()
         alive = False
 
 async def main():
     tasks = []
     tasks = [
-        asyncio.create_task(blink_task()),
-        asyncio.create_task(peripheral_task()),
+        asyncio.create_task(profiler.wrap("blink", blink_task())),
+        asyncio.create_task(profiler.wrap("periph", peripheral_task())),
     ]
-    await asyncio.gather(*tasks)
+    executor_task = asyncio.create_task(profiler.wrap("motion", executor.run()))
+    log_task = asyncio.create_task(profiler.wrap("log", log_sink.run()))
+    memory_task = asyncio.create_task(profiler.wrap("gc", memory.run()))
+    deadman_task = asyncio.create_task(profiler.wrap("deadman", deadman.run()))
+    # MotorCore ticks the velocity loop on core 1
+    ramp_task = RAMP and not DUAL_CORE
+    if ramp_task:
+        velocity_task = asyncio.create_task(profiler.wrap("velocity", motors.run()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        executor_task.cancel()
+        log_task.cancel()
+        memory_task.cancel()
+        deadman_task.cancel()
+        executor.stop()
+        if ramp_task:
+            velocity_task.cancel()
+            # Nothing is left to ramp them down
+            wheels.stop()
+        log_sink.flush()
 
 while True:
     asyncio.run(main())
@@ -0,0 +1,81 @@
+# Emergency stops for the robot
+# StopReceiver listens on the remote's stop characteristic, which has its
+# own notification slot, so a stop is never overwritten by the motion frames
+# streaming in on the button characteristic, and halts the motors the moment
+# one arrives. Deadman halts them when no valid frame has come for
+# DEADMAN_MS while they run, so a remote that hangs or a link that stalls
+# without dropping can't leave the robot driving until the link timeout.
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_add, ticks_diff, ticks_ms
+
+import protocol
+from receiver import Subscriber
+
+# Longer than the gaps between frames while driving: held buttons repeat
+# every 50 ms and the joystick sends a keyframe at least every 500 ms
+DEADMAN_MS = const(750)
+
+
+class StopReceiver(Subscriber):
+    """ Subscribe to the remote's stop characteristic and halt on every stop frame """
+
+    def __init__(self, characteristic, halt, subscribe=None):
+        super().__init__(characteristic, subscribe)
+        # halt(), called straight from the notification
+        self.halt = halt
+        self.stops = 0
+        self.rejected = 0
+
+    def handle(self, data):
+        if protocol.is_stop(data):
+            self.stops += 1
+            self.halt()
+        else:
+            self.rejected += 1
+
+    def stats(self):
+        """ Return the counters as a string, for printing """
+        return f"stops: received {self.stops}, rejected {self.rejected}"
+
+
+class Deadman:
+    """ Call halt() when feed() has not been called for window_ms """
+
+    def __init__(self, halt, window_ms=DEADMAN_MS):
+        # halt() stops the motors and returns True if they were running
+        self.halt = halt
+        self.window_ms = window_ms
+        self._fed = ticks_ms()
+        # Only trips once per silence, and not before the first frame
+        self._armed = False
+        self.trips = 0
+        self.max_gap_ms = 0
+
+    def feed(self):
+        """ Call for every valid frame """
+        now = ticks_ms()
+        if self._armed:
+            gap = ticks_diff(now, self._fed)
+            if gap > self.max_gap_ms:
+                self.max_gap_ms = gap
+        self._fed = now
+        self._armed = True
+
+    async def run(self):
+        """ Deadman task; wakes about once per window, not per frame """
+        while True:
+            remaining = ticks_diff(ticks_add(self._fed, self.window_ms), ticks_ms())
+            if remaining > 0:
+                await asyncio.sleep_ms(remaining)
+                continue
+            if self._armed:
+                self._armed = False
+                if self.halt():
+                    self.trips += 1
+            await asyncio.sleep_ms(self.window_ms)
+
+    def stats(self):
+        """ Return the counters as a string, for printing """
+        return f"deadman {self.window_ms} ms: {self.trips} trips, longest gap {self.max_gap_ms} ms"
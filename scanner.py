@@ -0,0 +1,92 @@
+# Scan engine for finding the remote
+# Matches advertisements on raw payload bytes compiled once up front, so
+# nothing is decoded per advertisement. Returns on the first match and
+# retries with exponential backoff.
+
+import struct
+
+import aioble
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_diff, ticks_ms
+
+_ADV_TYPE_UUID16_COMPLETE = const(0x03)
+_ADV_TYPE_UUID128_COMPLETE = const(0x07)
+_ADV_TYPE_NAME = const(0x09)
+_ADV_TYPE_MANUFACTURER = const(0xFF)
+
+
+def name_pattern(name):
+    """ Raw AD structure for a complete local name """
+    name = name.encode()
+    return bytes((len(name) + 1, _ADV_TYPE_NAME)) + name
+
+
+def service_pattern(uuid):
+    """ Raw AD structure for a complete service list holding just this UUID """
+    uuid = bytes(uuid)
+    adv_type = _ADV_TYPE_UUID16_COMPLETE if len(uuid) == 2 else _ADV_TYPE_UUID128_COMPLETE
+    return bytes((len(uuid) + 1, adv_type)) + uuid
+
+
+def manufacturer_pattern(company_id, data=b""):
+    """ Raw manufacturer data tag, the company id followed by the start of the data """
+    return bytes((_ADV_TYPE_MANUFACTURER,)) + struct.pack("<H", company_id) + data
+
+
+class ScanEngine:
+    """ Find the first device whose advertisement holds all the patterns """
+
+    def __init__(self, patterns, active=False, duration_ms=2000, interval_us=30000,
+                 window_us=30000, attempts=4, backoff_ms=250):
+        self.patterns = tuple(patterns)
+        # Active scans are only needed if a pattern lives in the scan response
+        self.active = active
+        self.duration_ms = duration_ms
+        self.interval_us = interval_us
+        self.window_us = window_us
+        self.attempts = attempts
+        self.backoff_ms = backoff_ms
+        # Metrics
+        self.processed = 0
+        self.last_match_ms = 0
+        self.last_rate = 0
+
+    def matches(self, adv_data, resp_data=None):
+        """ Return True if every pattern is in the advertising data or scan response """
+        for pattern in self.patterns:
+            if adv_data and pattern in adv_data:
+                continue
+            if resp_data and pattern in resp_data:
+                continue
+            return False
+        return True
+
+    async def find(self):
+        """ Return the matching device, or None after all the attempts """
+        start = ticks_ms()
+        processed = 0
+        backoff_ms = self.backoff_ms
+        device = None
+        for attempt in range(self.attempts):
+            if attempt:
+                await asyncio.sleep_ms(backoff_ms)
+                backoff_ms *= 2
+            async with aioble.scan(self.duration_ms, interval_us=self.interval_us,
+                                   window_us=self.window_us, active=self.active) as scanner:
+                async for result in scanner:
+                    processed += 1
+                    if self.matches(result.adv_data, result.resp_data):
+                        device = result.device
+                        break
+            if device:
+                break
+        elapsed = ticks_diff(ticks_ms(), start)
+        self.processed += processed
+        self.last_match_ms = elapsed if device else 0
+        self.last_rate = processed * 1000 // elapsed if elapsed else 0
+        return device
+
+    def stats(self):
+        """ Return the scan metrics as a string, for printing """
+        return f"matched in {self.last_match_ms} ms, {self.last_rate} adverts/s, {self.processed} processed"
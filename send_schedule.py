@@ -0,0 +1,65 @@
+# When the remote sends a frame
+# Changes to the buttons go out straight away. Held buttons are sent again
+# at the autorepeat rate, and when nothing else has gone out for a while a
+# keepalive frame is sent so the robot can tell the link is still there.
+
+from micropython import const
+from utime import ticks_diff, ticks_ms
+
+# Resend held buttons this often, 0 turns autorepeat off. Keep it under the
+# robot's motion pulse (motion.PULSE_MS) so a held button drives smoothly.
+AUTOREPEAT_MS = const(50)
+
+# Resend the current state this often when nothing else has gone out
+KEEPALIVE_MS = const(1000)
+
+
+class SendSchedule:
+    """ Decide when a button mask needs sending """
+
+    def __init__(self, repeat_ms=AUTOREPEAT_MS, keepalive_ms=KEEPALIVE_MS):
+        self.repeat_ms = repeat_ms
+        self.keepalive_ms = keepalive_ms
+        self._last_buttons = None
+        self._last_ms = 0
+        # Frames sent for each reason
+        self.changes = 0
+        self.repeats = 0
+        self.keepalives = 0
+
+    def reset(self):
+        """ Send the next mask straight away, e.g. after connecting """
+        self._last_buttons = None
+
+    def _period(self, buttons):
+        if buttons and self.repeat_ms:
+            return self.repeat_ms
+        return self.keepalive_ms
+
+    def should_send(self, buttons, now=None):
+        """ Return True if the mask should be sent now, and count it as sent """
+        if now is None:
+            now = ticks_ms()
+        if buttons != self._last_buttons:
+            self.changes += 1
+        elif ticks_diff(now, self._last_ms) < self._period(buttons):
+            return False
+        elif buttons and self.repeat_ms:
+            self.repeats += 1
+        else:
+            self.keepalives += 1
+        self._last_buttons = buttons
+        self._last_ms = now
+        return True
+
+    def wait_ms(self, now=None):
+        """ Return how long until the next repeat or keepalive is due """
+        if self._last_buttons is None:
+            return 0
+        if now is None:
+            now = ticks_ms()
+        return max(0, self._period(self._last_buttons) - ticks_diff(now, self._last_ms))
+
+    def stats(self):
+        """ Return the frame counts as a string, for printing """
+        return f"sent {self.changes} changes, {self.repeats} repeats, {self.keepalives} keepalives"
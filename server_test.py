@@ -7,6 +7,8 @@ import machine
 import uasyncio as asyncio
 from micropython import const
 
+import protocol
+
 def uid():
     """ Return the unique id of the device as a string """
     return "{:02x}{:02x}{:02x}{:02x}{:02x}{:02x}{:02x}{:02x}".format(
@@ -57,14 +59,17 @@ connected = False
 async def remote_task():
     """ Send the event to the connected device """
 
+    seq = 0
     while True:
         if not connected:
             print('not connected')
             await asyncio.sleep_ms(1000)
             continue
         
-        button_characteristic.write(b"hello world")
-#         button_characteristic.notify(connection,b"x")
+        frame = protocol.encode(0, seq)
+        seq += 1
+        button_characteristic.write(frame)
+        button_characteristic.notify(connection, frame)
         
         await asyncio.sleep_ms(10)
             
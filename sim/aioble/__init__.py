@@ -0,0 +1,691 @@
+# Host stand-in for aioble
+# The peripheral and central roles share one simulated radio inside the
+# process. Once connected, packets only move on connection events, every
+# `interval_ms`, so a GATT read costs a full round trip while a
+# notification only waits for the next event.
+
+import random
+import struct
+
+import bluetooth
+import uasyncio as asyncio
+import utime
+
+from . import core
+
+ADDR_PUBLIC = bluetooth.ADDR_PUBLIC
+ADDR_RANDOM = bluetooth.ADDR_RANDOM
+
+_ADV_TYPE_FLAGS = 0x01
+_ADV_TYPE_UUID16_COMPLETE = 0x03
+_ADV_TYPE_UUID128_COMPLETE = 0x07
+_ADV_TYPE_NAME = 0x09
+_ADV_TYPE_APPEARANCE = 0x19
+_ADV_TYPE_MANUFACTURER = 0xFF
+
+_ADV_PAYLOAD_MAX_LEN = 31
+
+_FLAG_READ = 0x0002
+_FLAG_WRITE_NO_RESPONSE = 0x0004
+_FLAG_WRITE = 0x0008
+_FLAG_NOTIFY = 0x0010
+_FLAG_INDICATE = 0x0020
+
+_IRQ_CONNECTION_UPDATE = 27
+
+_CCCD_UUID = bluetooth.UUID(0x2902)
+_CCCD_NOTIFY = 1
+_CCCD_INDICATE = 2
+
+# Connection interval for new connections, in ms
+connection_interval_ms = 30
+
+# Set to use this interval whatever connect() asks for, in ms
+fixed_interval_ms = None
+
+# Chance that a packet is lost on a connection event and has to be resent
+# on the next one, and the most extra delay added to each delivery, in ms
+packet_loss = 0.0
+jitter_ms = 0.0
+
+# Address that advertise() uses in this process
+local_address = b"\x28\xcd\xc1\x0a\x00\x01"
+
+_rng = random.Random(0)
+_services = []
+_advertisers = []
+_links = []
+_capture = None
+_next_handle = 0
+
+# (min_conn_interval_us, max_conn_interval_us) for every connect() call
+requested_params = []
+
+# Set to a list to record (ticks_us, "notify" or "deliver", data) for every
+# notification sent and every one that reaches a client
+trace = None
+
+
+class GattError(Exception):
+    def __init__(self, status=0):
+        super().__init__(status)
+        self._status = status
+
+
+class DeviceDisconnectedError(Exception):
+    pass
+
+
+def _now():
+    return asyncio.get_event_loop().time()
+
+
+def _trace(event, data):
+    if trace is not None:
+        trace.append((utime.ticks_us(), event, data))
+
+
+def reset(seed=0):
+    """ Forget all services, advertisers and links (simulation only) """
+    global _rng, _capture, _next_handle
+    _rng = random.Random(seed)
+    _capture = None
+    _next_handle = 0
+    core._irq_handlers.clear()
+    core._shutdown_handlers.clear()
+    requested_params.clear()
+    _services.clear()
+    _advertisers.clear()
+    _links.clear()
+
+
+def replay(packets):
+    """ Make scans hear a recorded capture instead of the advertisers (simulation only)
+
+    packets is a list of (time_ms, addr, adv_data, resp_data), sorted by time;
+    every scan replays it from its own start.
+    """
+    global _capture
+    _capture = packets
+
+
+def links():
+    """ Return the live links (simulation only) """
+    return [link for link in _links if link.connected]
+
+
+def update_params(connection, interval_ms, latency=0, timeout_ms=2000):
+    """ Change a link's parameters, as a peripheral's update request would (simulation only)
+
+    Both ends get _IRQ_CONNECTION_UPDATE with the new values, in the units
+    the stack uses: 1.25 ms for the interval, 10 ms for the timeout.
+    """
+    link = connection._link
+    link.interval = interval_ms / 1000
+    link.anchor = _now()
+    for end in (link.central, link.peripheral):
+        core.ble_irq(_IRQ_CONNECTION_UPDATE, (end._conn_handle, round(interval_ms / 1.25), latency,
+                                              timeout_ms // 10, 0))
+
+
+# Advertising payloads, the same layout aioble builds
+
+
+def _append(payload, adv_type, value):
+    payload += struct.pack("BB", len(value) + 1, adv_type) + value
+
+
+def _build_payloads(name, services, appearance, manufacturer):
+    adv = bytearray()
+    resp = bytearray()
+    _append(adv, _ADV_TYPE_FLAGS, b"\x06")
+    fields = []
+    if name:
+        fields.append((_ADV_TYPE_NAME, name.encode()))
+    for uuid in services or ():
+        adv_type = _ADV_TYPE_UUID16_COMPLETE if len(uuid) == 2 else _ADV_TYPE_UUID128_COMPLETE
+        fields.append((adv_type, bytes(uuid)))
+    if appearance:
+        fields.append((_ADV_TYPE_APPEARANCE, struct.pack("<H", appearance)))
+    if manufacturer:
+        fields.append((_ADV_TYPE_MANUFACTURER, struct.pack("<H", manufacturer[0]) + bytes(manufacturer[1])))
+    for adv_type, value in fields:
+        target = adv if len(adv) + len(value) + 2 <= _ADV_PAYLOAD_MAX_LEN else resp
+        _append(target, adv_type, value)
+    return bytes(adv), bytes(resp)
+
+
+def _decode_field(payload, adv_type):
+    i = 0
+    result = []
+    while payload and i + 1 < len(payload):
+        if payload[i + 1] == adv_type:
+            result.append(payload[i + 2:i + payload[i] + 1])
+        i += 1 + payload[i]
+    return result
+
+
+class Device:
+    """ A remote device, identified by its address """
+
+    def __init__(self, addr_type, addr):
+        if isinstance(addr, str):
+            addr = bytes(int(part, 16) for part in addr.split(":"))
+        self.addr_type = addr_type
+        self.addr = bytes(addr)
+
+    def __eq__(self, other):
+        return isinstance(other, Device) and self.addr_type == other.addr_type and self.addr == other.addr
+
+    def __hash__(self):
+        return hash((self.addr_type, self.addr))
+
+    def __repr__(self):
+        return "Device(ADDR_%s, %s)" % ("PUBLIC" if self.addr_type == ADDR_PUBLIC else "RANDOM", self.addr_hex())
+
+    def addr_hex(self):
+        return ":".join("%02x" % b for b in self.addr)
+
+    async def connect(self, timeout_ms=10000, scan_duration_ms=None,
+                      min_conn_interval_us=None, max_conn_interval_us=None):
+        requested_params.append((min_conn_interval_us, max_conn_interval_us))
+        if fixed_interval_ms:
+            interval_ms = fixed_interval_ms
+        elif min_conn_interval_us:
+            # The central picks the bottom of the range, in 1.25 ms steps
+            interval_ms = max(7.5, -(-min_conn_interval_us // 1250) * 1.25)
+        else:
+            interval_ms = connection_interval_ms
+        deadline = _now() + timeout_ms / 1000
+        while True:
+            for advertiser in _advertisers:
+                if advertiser.device == self and advertiser.connectable and not advertiser.future.done():
+                    # Connect request goes out after the next advertisement
+                    await asyncio.sleep(advertiser.next_event() - _now())
+                    if advertiser.future.done() or advertiser not in _advertisers:
+                        continue
+                    link = _Link(Device(ADDR_PUBLIC, local_address), advertiser, interval_ms)
+                    advertiser.future.set_result(link.peripheral)
+                    await asyncio.sleep(link.interval)
+                    return link.central
+            if _now() >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(min(0.01, deadline - _now()))
+
+
+class _Link:
+    """ One simulated connection between a central and a peripheral """
+
+    def __init__(self, central_device, advertiser, interval_ms):
+        self.interval = interval_ms / 1000
+        self.anchor = _now()
+        self.connected = True
+        self.server = advertiser.services
+        self.handles = advertiser.handles
+        self.events = 0
+        self.notifications = 0
+        self.round_trips = 0
+        self.retries = 0
+        self._last_delivery = 0
+        self.central = DeviceConnection(self, advertiser.device)
+        self.peripheral = DeviceConnection(self, central_device)
+        self.central.peer = self.peripheral
+        self.peripheral.peer = self.central
+        _links.append(self)
+
+    def next_event_delay(self):
+        """ Seconds until the next connection event """
+        elapsed = (_now() - self.anchor) % self.interval
+        return self.interval - elapsed
+
+    def _delivery_delay(self):
+        """ Seconds until a packet queued now gets across, with loss and jitter """
+        delay = self.next_event_delay()
+        while packet_loss and _rng.random() < packet_loss:
+            delay += self.interval
+            self.retries += 1
+            self.events += 1
+        if jitter_ms:
+            delay += _rng.random() * jitter_ms / 1000
+        # Packets are acknowledged in order, so a resend holds up the ones
+        # behind it. They are kept a ns apart, as the event loop does not
+        # run callbacks due at the same time in the order they were added.
+        now = _now()
+        when = max(now + delay, self._last_delivery + 1e-9)
+        self._last_delivery = when
+        return when - now
+
+    def deliver(self, callback, *args):
+        """ Run the callback at the next connection event """
+        self.events += 1
+        asyncio.get_event_loop().call_later(self._delivery_delay(), self._deliver, callback, args)
+
+    def _deliver(self, callback, args):
+        if self.connected:
+            callback(*args)
+
+    async def round_trip(self):
+        """ Request on the next connection event, response on the one after """
+        if not self.connected:
+            raise DeviceDisconnectedError
+        self.round_trips += 1
+        self.events += 2
+        await asyncio.sleep(self._delivery_delay() + self.interval)
+        if not self.connected:
+            raise DeviceDisconnectedError
+
+    def close(self):
+        if not self.connected:
+            return
+        self.connected = False
+        for connection in (self.central, self.peripheral):
+            connection._closed.set()
+            for characteristic in connection._clients:
+                characteristic._wake()
+
+
+class _Advertiser:
+    def __init__(self, interval_us, adv_data, resp_data, connectable, services):
+        self.device = Device(ADDR_PUBLIC, local_address)
+        self.interval = max(interval_us, 20_000) / 1_000_000
+        self.adv_data = adv_data
+        self.resp_data = resp_data
+        self.connectable = connectable
+        self.services = services
+        self.handles = {}
+        for service in services:
+            for characteristic in service.characteristics:
+                self.handles[characteristic._value_handle] = characteristic
+        self.start = _now()
+        self.future = asyncio.get_event_loop().create_future()
+
+    def next_event(self):
+        """ Time of the next advertising event, including the random advDelay """
+        elapsed = _now() - self.start
+        count = int(elapsed / self.interval) + 1
+        return self.start + count * self.interval + _rng.random() * 0.01
+
+
+class DeviceConnection:
+    """ One end of a link """
+
+    def __init__(self, link, device):
+        global _next_handle
+        self._link = link
+        self.device = device
+        self._conn_handle = _next_handle
+        _next_handle += 1
+        self.peer = None
+        self._closed = asyncio.Event()
+        self._clients = []
+
+    def __repr__(self):
+        return "DeviceConnection(%s)" % self.device.addr_hex()
+
+    def is_connected(self):
+        return self._link.connected
+
+    async def disconnect(self, timeout_ms=2000):
+        self._link.close()
+
+    async def disconnected(self, timeout_ms=None):
+        if timeout_ms is None:
+            await self._closed.wait()
+        else:
+            await asyncio.wait_for(self._closed.wait(), timeout_ms / 1000)
+
+    async def service(self, uuid, timeout_ms=2000):
+        await self._link.round_trip()
+        for service in self._link.server:
+            if service.uuid == uuid:
+                return ClientService(self, service._start_handle, service._end_handle, uuid)
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._link.close()
+
+
+class ClientService:
+    def __init__(self, connection, start_handle, end_handle, uuid):
+        self.connection = connection
+        self.uuid = uuid
+        self._start_handle = start_handle
+        self._end_handle = end_handle
+
+    def __repr__(self):
+        return "ClientService(%r)" % self.uuid
+
+    async def characteristic(self, uuid, timeout_ms=2000):
+        await self.connection._link.round_trip()
+        for characteristic in self.connection._link.handles.values():
+            if characteristic.uuid == uuid and self._start_handle < characteristic._value_handle <= self._end_handle:
+                return ClientCharacteristic(
+                    self, characteristic._end_handle, characteristic._value_handle,
+                    characteristic._properties, uuid,
+                )
+        return None
+
+
+class ClientCharacteristic:
+    """ The central's view of a server characteristic """
+
+    def __init__(self, service, end_handle, value_handle, properties, uuid):
+        self.service = service
+        self.uuid = uuid
+        self.properties = properties
+        self._end_handle = end_handle
+        self._value_handle = value_handle
+        self._connection = service.connection
+        self._queue = None
+        self._event = asyncio.Event()
+        self.subscribed = False
+        self.overwritten = 0
+        self._register_with_connection()
+
+    def __repr__(self):
+        return "ClientCharacteristic(%r)" % self.uuid
+
+    def _register_with_connection(self):
+        if self not in self._connection._clients:
+            self._connection._clients.append(self)
+
+    def _server(self):
+        link = self._connection._link
+        if not link.connected:
+            raise DeviceDisconnectedError
+        characteristic = link.handles.get(self._value_handle)
+        if characteristic is None:
+            raise GattError(0x01)
+        return characteristic
+
+    async def read(self, timeout_ms=1000):
+        await self._connection._link.round_trip()
+        return self._server()._value
+
+    async def write(self, data, response=False, timeout_ms=1000):
+        characteristic = self._server()
+        link = self._connection._link
+        if response:
+            await link.round_trip()
+            characteristic._on_written(self._connection.peer, bytes(data))
+        else:
+            link.deliver(characteristic._on_written, self._connection.peer, bytes(data))
+
+    async def descriptor(self, uuid, timeout_ms=2000):
+        await self._connection._link.round_trip()
+        characteristic = self._server()
+        if uuid == _CCCD_UUID and characteristic._cccd_handle:
+            return ClientDescriptor(self, characteristic._cccd_handle, uuid)
+        return None
+
+    async def subscribe(self, notify=True, indicate=False):
+        # Like aioble, find the CCCD and then write it
+        self._register_with_connection()
+        cccd = await self.descriptor(_CCCD_UUID)
+        if cccd:
+            await cccd.write(struct.pack("<H", _CCCD_NOTIFY * notify + _CCCD_INDICATE * indicate), response=True)
+
+    def _on_notify(self, data):
+        _trace("deliver", data)
+        # Like aioble, only the latest notification is kept
+        if self._queue is not None:
+            self.overwritten += 1
+        self._queue = data
+        self._event.set()
+
+    def _wake(self):
+        self._event.set()
+
+    async def notified(self, timeout_ms=None):
+        while self._queue is None:
+            if not self._connection._link.connected:
+                raise DeviceDisconnectedError
+            self._event.clear()
+            if timeout_ms is None:
+                await self._event.wait()
+            else:
+                await asyncio.wait_for(self._event.wait(), timeout_ms / 1000)
+        data = self._queue
+        self._queue = None
+        return data
+
+
+class ClientDescriptor:
+    def __init__(self, characteristic, dsc_handle, uuid):
+        self.characteristic = characteristic
+        self.uuid = uuid
+        self._value_handle = dsc_handle
+
+    async def write(self, data, response=False, timeout_ms=1000):
+        link = self.characteristic._connection._link
+        if response:
+            await link.round_trip()
+        elif not link.connected:
+            raise DeviceDisconnectedError
+        server = self.characteristic._server()
+        if self._value_handle != server._cccd_handle:
+            raise GattError(0x01)
+        value = struct.unpack("<H", data)[0]
+        for client in self.characteristic._connection._clients:
+            if client._value_handle == self.characteristic._value_handle:
+                client.subscribed = bool(value)
+
+
+class Service:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.characteristics = []
+        self._start_handle = 0
+        self._end_handle = 0
+
+
+class Characteristic:
+    """ A characteristic in the local GATT server """
+
+    def __init__(self, service, uuid, read=False, write=False, write_no_response=False,
+                 notify=False, indicate=False, initial=None, capture=False):
+        self.uuid = uuid
+        self._properties = (
+            (_FLAG_READ if read else 0) | (_FLAG_WRITE if write else 0)
+            | (_FLAG_WRITE_NO_RESPONSE if write_no_response else 0)
+            | (_FLAG_NOTIFY if notify else 0) | (_FLAG_INDICATE if indicate else 0)
+        )
+        self._cccd = notify or indicate
+        self._end_handle = 0
+        self._value_handle = 0
+        self._cccd_handle = 0
+        self.capture = capture
+        self._value = b"" if initial is None else (initial.encode() if isinstance(initial, str) else bytes(initial))
+        self._written = []
+        self._written_event = asyncio.Event()
+        self.writes = 0
+        self.notifications = 0
+        service.characteristics.append(self)
+
+    def write(self, data, send_update=False):
+        self.writes += 1
+        self._value = bytes(data)
+
+    def read(self):
+        return self._value
+
+    def notify(self, connection, data=None):
+        link = connection._link
+        if not link.connected:
+            raise DeviceDisconnectedError
+        data = self._value if data is None else bytes(data)
+        self.notifications += 1
+        link.notifications += 1
+        _trace("notify", data)
+        for client in connection.peer._clients:
+            if client._value_handle == self._value_handle:
+                link.deliver(client._on_notify, data)
+
+    def _on_written(self, connection, data):
+        self._value = data
+        self._written.append((connection, data))
+        self._written_event.set()
+
+    async def written(self, timeout_ms=None):
+        while not self._written:
+            self._written_event.clear()
+            if timeout_ms is None:
+                await self._written_event.wait()
+            else:
+                await asyncio.wait_for(self._written_event.wait(), timeout_ms / 1000)
+        connection, data = self._written.pop(0)
+        if self.capture:
+            return connection, data
+        return connection
+
+
+def register_services(*services):
+    """ Hand out attribute handles the way the stack does """
+    handle = 1
+    for service in services:
+        service._start_handle = handle
+        handle += 1
+        for characteristic in service.characteristics:
+            characteristic._value_handle = handle + 1
+            handle += 2
+            if characteristic._cccd:
+                characteristic._cccd_handle = handle
+                handle += 1
+            characteristic._end_handle = handle - 1
+        service._end_handle = handle - 1
+    _services[:] = services
+
+
+async def advertise(interval_us, adv_data=None, resp_data=None, connectable=True,
+                    limited_disc=False, br_edr=False, name=None, services=None,
+                    appearance=0, manufacturer=None, timeout_ms=None):
+    if adv_data is None:
+        adv_data, resp_data = _build_payloads(name, services, appearance, manufacturer)
+    advertiser = _Advertiser(interval_us, bytes(adv_data), bytes(resp_data or b""), connectable, list(_services))
+    _advertisers.append(advertiser)
+    try:
+        if timeout_ms is None:
+            return await advertiser.future
+        return await asyncio.wait_for(advertiser.future, timeout_ms / 1000)
+    finally:
+        _advertisers.remove(advertiser)
+
+
+class ScanResult:
+    def __init__(self, device):
+        self.device = device
+        self.adv_data = None
+        self.resp_data = None
+        self.rssi = None
+        self.connectable = False
+
+    def __repr__(self):
+        return "ScanResult(%s)" % self.device.addr_hex()
+
+    def _update(self, advertiser, active):
+        updated = False
+        if self.adv_data != advertiser.adv_data:
+            self.adv_data = advertiser.adv_data
+            updated = True
+        if active and advertiser.resp_data and self.resp_data != advertiser.resp_data:
+            self.resp_data = advertiser.resp_data
+            updated = True
+        self.rssi = -40 - _rng.randrange(30)
+        self.connectable = advertiser.connectable
+        return updated
+
+    def _fields(self, adv_type):
+        return _decode_field(self.adv_data, adv_type) + _decode_field(self.resp_data, adv_type)
+
+    def name(self):
+        names = self._fields(_ADV_TYPE_NAME)
+        return names[0].decode() if names else None
+
+    def services(self):
+        for value in self._fields(_ADV_TYPE_UUID16_COMPLETE):
+            for i in range(0, len(value), 2):
+                yield bluetooth.UUID(struct.unpack("<H", value[i:i + 2])[0])
+        for value in self._fields(_ADV_TYPE_UUID128_COMPLETE):
+            yield bluetooth.UUID(value)
+
+    def manufacturer(self, filter=None):
+        for value in self._fields(_ADV_TYPE_MANUFACTURER):
+            company = struct.unpack("<H", value[:2])[0]
+            if filter is None or company == filter:
+                yield company, value[2:]
+
+
+class scan:
+    """ Async context manager that yields a ScanResult whenever a device's data changes """
+
+    def __init__(self, duration_ms, interval_us=1280000, window_us=11250, active=False):
+        self.duration = duration_ms / 1000
+        self.duty = min(1.0, window_us / interval_us)
+        self.active = active
+        self.packets = 0
+
+    async def __aenter__(self):
+        self._start = _now()
+        self._end = self._start + self.duration
+        self._results = {}
+        self._next = {}
+        self._index = 0
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def _next_replayed(self):
+        while self._index < len(_capture):
+            time_ms, addr, adv_data, resp_data = _capture[self._index]
+            self._index += 1
+            when = self._start + time_ms / 1000
+            if self.duration and when > self._end:
+                break
+            await asyncio.sleep(max(0, when - _now()))
+            if _rng.random() >= self.duty:
+                continue
+            self.packets += 1
+            result = ScanResult(Device(ADDR_PUBLIC, addr))
+            result.adv_data = adv_data
+            result.resp_data = resp_data if self.active else None
+            result.rssi = -40 - _rng.randrange(50)
+            return result
+        await asyncio.sleep(max(0, self._end - _now()))
+        raise StopAsyncIteration
+
+    async def __anext__(self):
+        if _capture is not None:
+            return await self._next_replayed()
+        while True:
+            now = _now()
+            if self.duration and now >= self._end:
+                raise StopAsyncIteration
+            pending = [advertiser for advertiser in _advertisers if not advertiser.future.done()]
+            if not pending:
+                await asyncio.sleep(0.005)
+                continue
+            for advertiser in pending:
+                if advertiser not in self._next or self._next[advertiser] < now - advertiser.interval:
+                    self._next[advertiser] = advertiser.next_event()
+            advertiser = min(pending, key=self._next.get)
+            when = self._next[advertiser]
+            if self.duration and when > self._end:
+                await asyncio.sleep(self._end - now)
+                raise StopAsyncIteration
+            await asyncio.sleep(max(0, when - now))
+            self._next[advertiser] = advertiser.next_event()
+            if advertiser not in _advertisers or _rng.random() >= self.duty:
+                continue
+            self.packets += 1
+            result = self._results.get(advertiser.device)
+            if result is None:
+                result = self._results[advertiser.device] = ScanResult(advertiser.device)
+            if result._update(advertiser, self.active):
+                return result
@@ -0,0 +1,3 @@
+# Host stand-in for aioble.client
+
+from . import ClientCharacteristic, ClientDescriptor, ClientService  # noqa: F401
@@ -0,0 +1,20 @@
+# Host stand-in for aioble.core
+# Modules hook the BLE IRQ through register_irq_handler(), as on the
+# device; the simulated stack calls ble_irq() for the events it raises.
+
+_irq_handlers = []
+_shutdown_handlers = []
+
+
+def register_irq_handler(irq, shutdown):
+    if irq:
+        _irq_handlers.append(irq)
+    if shutdown:
+        _shutdown_handlers.append(shutdown)
+
+
+def ble_irq(event, data):
+    for handler in _irq_handlers:
+        result = handler(event, data)
+        if result is not None:
+            return result
@@ -0,0 +1,37 @@
+# Host stand-in for the MicroPython `bluetooth` module
+
+import binascii
+
+ADDR_PUBLIC = 0x00
+ADDR_RANDOM = 0x01
+
+
+class UUID:
+    """ 16 bit or 128 bit UUID """
+
+    def __init__(self, value):
+        if isinstance(value, UUID):
+            value = value._bytes
+        if isinstance(value, int):
+            self._bytes = value.to_bytes(2, "little")
+        elif isinstance(value, str):
+            self._bytes = binascii.unhexlify(value.replace("-", ""))[::-1]
+        else:
+            self._bytes = bytes(value)
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._bytes)
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+    def __repr__(self):
+        if len(self._bytes) == 2:
+            return "UUID(0x%04x)" % int.from_bytes(self._bytes, "little")
+        return "UUID('%s')" % binascii.hexlify(self._bytes[::-1]).decode()
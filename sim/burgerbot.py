@@ -0,0 +1,36 @@
+# Host stand-in for the Burgerbot driver
+# Motion methods start the motors and only block when given a duration,
+# the motors keep running until stop() is called.
+
+import utime
+
+
+class Burgerbot:
+    """ Simulated robot that records every motor change """
+
+    def __init__(self):
+        self.left = 0
+        self.right = 0
+        self.log = []
+
+    def _set(self, left, right, duration):
+        self.left = left
+        self.right = right
+        self.log.append((utime.ticks_us(), left, right))
+        if duration:
+            utime.sleep(duration)
+
+    def forward(self, duration=None):
+        self._set(1, 1, duration)
+
+    def backward(self, duration=None):
+        self._set(-1, -1, duration)
+
+    def turnleft(self, duration=None):
+        self._set(-1, 1, duration)
+
+    def turnright(self, duration=None):
+        self._set(1, -1, duration)
+
+    def stop(self):
+        self._set(0, 0, None)
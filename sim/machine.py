@@ -0,0 +1,164 @@
+# Host stand-in for the MicroPython `machine` module
+
+_UNIQUE_ID = b"\xe6\x61\x64\x08\x43\x2b\x7a\x2c"
+
+# The latest Pin created for each id
+_pins = {}
+
+# The latest ADC created for each pin or channel
+_adcs = {}
+
+# RP2040 SIO GPIO_IN, kept up to date by the pins
+_SIO_GPIO_IN = 0xD0000004
+_registers = {_SIO_GPIO_IN: 0}
+
+
+class _Mem32:
+    """ Word access to the simulated registers """
+
+    def __getitem__(self, address):
+        return _registers[address]
+
+    def __setitem__(self, address, value):
+        _registers[address] = value & 0xFFFFFFFF
+
+
+mem32 = _Mem32()
+
+
+def unique_id():
+    return _UNIQUE_ID
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+def pin(id):
+    """ Return the Pin a script created for this id (simulation only) """
+    return _pins[id]
+
+
+def adc(id):
+    """ Return the ADC a script created for this pin or channel (simulation only) """
+    return _adcs[id]
+
+
+class Pin:
+    """ Simulated GPIO pin; call drive() to change an input level and fire its IRQ """
+
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self._bit = 1 << id if isinstance(id, int) and 0 <= id < 30 else 0
+        self._handler = None
+        self._trigger = 0
+        self.reads = 0
+        self._set(value if value is not None else 1 if pull == Pin.PULL_UP else 0)
+        _pins[id] = self
+
+    def _set(self, level):
+        self._value = 1 if level else 0
+        if self._bit:
+            if level:
+                _registers[_SIO_GPIO_IN] |= self._bit
+            else:
+                _registers[_SIO_GPIO_IN] &= ~self._bit
+
+    def value(self, value=None):
+        if value is None:
+            self.reads += 1
+            return self._value
+        self._set(value)
+
+    def on(self):
+        self._set(1)
+
+    def off(self):
+        self._set(0)
+
+    def toggle(self):
+        self._set(not self._value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    def drive(self, level):
+        """ Set the external level on an input pin """
+        level = 1 if level else 0
+        if level == self._value:
+            return
+        self._set(level)
+        edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+        if self._handler is not None and self._trigger & edge:
+            self._handler(self)
+
+
+class ADC:
+    """ Simulated ADC input; call drive() to change the voltage it reads, as 0-65535 """
+
+    def __init__(self, id):
+        self.id = id.id if isinstance(id, Pin) else id
+        # Mid scale, like a centred joystick
+        self._value = 32768
+        self.reads = 0
+        _adcs[self.id] = self
+
+    def read_u16(self):
+        self.reads += 1
+        return self._value
+
+    def drive(self, value):
+        """ Set the input level, 0 to 65535 """
+        self._value = min(65535, max(0, int(value)))
+
+
+class Timer:
+    """ Simulated soft timer, its callback runs from the event loop """
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._handle = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self._mode = mode
+        self._period = period
+        self._callback = callback
+        self._start()
+
+    def _start(self):
+        import asyncio
+        self._handle = asyncio.get_running_loop().call_later(self._period / 1000, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        if self._mode == Timer.PERIODIC:
+            self._start()
+        if self._callback is not None:
+            self._callback(self)
+
+    def deinit(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
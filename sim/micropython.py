@@ -0,0 +1,50 @@
+# Host stand-in for the MicroPython `micropython` module
+
+import gc as _gc
+import tracemalloc as _tracemalloc
+
+
+def const(value):
+    """ Return the value unchanged; on the device this is folded at compile time """
+    return value
+
+
+def native(func):
+    """ No-op code emitter decorator """
+    return func
+
+
+def viper(func):
+    """ No-op code emitter decorator """
+    return func
+
+
+def schedule(func, arg):
+    """ Run the function straight away; there is no soft IRQ queue on the host """
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+# CPython's gc is built in, so there is no stand-in module for it on
+# sys.path; the MicroPython-only functions are added to it here instead,
+# since every device module imports micropython. The heap is what
+# tracemalloc sees while it is tracing, and empty otherwise.
+
+# About what a Pico W has free after boot
+_HEAP_SIZE = 192 * 1024
+
+
+def _mem_alloc():
+    return _tracemalloc.get_traced_memory()[0] if _tracemalloc.is_tracing() else 0
+
+
+def _mem_free():
+    return max(0, _HEAP_SIZE - _mem_alloc())
+
+
+if not hasattr(_gc, "mem_alloc"):
+    _gc.mem_alloc = _mem_alloc
+    _gc.mem_free = _mem_free
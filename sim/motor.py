@@ -0,0 +1,50 @@
+# Host stand-in for Pimoroni's `motor` module (Motor and pico_motor_shim)
+# Only the speed side of motor.Motor; every speed set is recorded.
+
+import utime
+
+NORMAL_DIR = 0
+REVERSED_DIR = 1
+
+
+class pico_motor_shim:
+    MOTOR_1 = (6, 7)
+    MOTOR_2 = (27, 26)
+    NUM_MOTORS = 2
+
+
+class Motor:
+    """ Simulated motor that records every speed it is set to """
+
+    def __init__(self, pins, direction=NORMAL_DIR, speed_scale=1.0):
+        self.pins = pins
+        self._direction = direction
+        self._speed_scale = speed_scale
+        self._speed = 0.0
+        self._enabled = False
+        # (ticks_us, speed) for every change
+        self.log = []
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def is_enabled(self):
+        return self._enabled
+
+    def speed(self, speed=None):
+        if speed is None:
+            return self._speed
+        # Setting a speed enables the motor, like the firmware
+        self._speed = max(-self._speed_scale, min(self._speed_scale, speed))
+        self._enabled = True
+        self.log.append((utime.ticks_us(), self._speed))
+
+    def stop(self):
+        self.speed(0.0)
+
+    def coast(self):
+        self.speed(0.0)
+        self.disable()
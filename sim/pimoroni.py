@@ -0,0 +1,52 @@
+# Host stand-in for the Pimoroni `pimoroni.Button` helper
+
+from machine import Pin
+from utime import ticks_ms
+
+
+class Button:
+    """ Active-low button with the same press / auto-repeat behaviour as the firmware """
+
+    def __init__(self, button, invert=True, repeat_time=200, hold_time=1000):
+        self.invert = invert
+        self.repeat_time = repeat_time
+        self.hold_time = hold_time
+        self.pin = Pin(button, pull=Pin.PULL_UP if invert else Pin.PULL_DOWN)
+        self.last_state = False
+        self.pressed = False
+        self.pressed_time = 0
+        self.last_time = 0
+
+    def raw(self):
+        if self.invert:
+            return not self.pin.value()
+        return bool(self.pin.value())
+
+    def read(self):
+        current_time = ticks_ms()
+        state = self.raw()
+        changed = state != self.last_state
+        self.last_state = state
+
+        if changed:
+            if state:
+                self.pressed_time = current_time
+                self.pressed = True
+                self.last_time = current_time
+                return True
+            self.pressed_time = 0
+            self.pressed = False
+            self.last_time = 0
+
+        if self.repeat_time == 0:
+            return False
+
+        if self.pressed:
+            repeat_rate = self.repeat_time
+            if self.hold_time > 0 and current_time - self.pressed_time > self.hold_time:
+                repeat_rate /= 3
+            if current_time - self.last_time > repeat_rate:
+                self.last_time = current_time
+                return True
+
+        return False
@@ -0,0 +1,264 @@
+# Virtual-time simulator for the device scripts
+# Runs unmodified entry points such as remote.py and robot_code.py against
+# each other in one process, over the simulated radio in the aioble
+# stand-in. Time only moves when every task is waiting, so a minute of
+# driving takes a fraction of a second and every run is repeatable.
+
+import asyncio
+import contextlib
+import io
+import os
+import selectors
+import tempfile
+import time
+import types
+
+import aioble
+import machine
+import uasyncio
+import utime
+from motor import Motor, pico_motor_shim
+
+
+class VirtualClock:
+    """ Simulated time in seconds, shared by the event loop and utime
+
+    With cpu_scale above 0 the host time spent running code is added too,
+    multiplied by cpu_scale, so the cost of the code shows up in latencies.
+    """
+
+    def __init__(self, start=0.0, cpu_scale=0.0):
+        self._now = start
+        self.cpu_scale = cpu_scale
+        self._mark = time.perf_counter()
+
+    @property
+    def now(self):
+        if self.cpu_scale:
+            mark = time.perf_counter()
+            self._now += (mark - self._mark) * self.cpu_scale
+            self._mark = mark
+        return self._now
+
+    def advance(self, seconds):
+        self._now = self.now + seconds
+
+    def ns(self):
+        return int(self.now * 1_000_000_000)
+
+    def sleep_ns(self, ns):
+        self.advance(ns / 1_000_000_000)
+
+
+class _VirtualSelector:
+    """ Selector that jumps the clock forward instead of blocking """
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError("simulation stalled, every task is waiting with nothing scheduled")
+        self._clock.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """ asyncio event loop that runs on a VirtualClock """
+
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.now
+
+
+def run_virtual(coroutine, clock=None):
+    """ Run a coroutine on a VirtualClock, with utime following the same clock """
+    clock = clock or VirtualClock()
+    real_ns, real_sleep_ns = utime._ns, utime._sleep_ns
+    utime._ns, utime._sleep_ns = clock.ns, clock.sleep_ns
+    loop = VirtualEventLoop(clock)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+        utime._ns, utime._sleep_ns = real_ns, real_sleep_ns
+
+
+class _Started(Exception):
+    pass
+
+
+class Script:
+    """ A device script, loaded up to the point where it calls asyncio.run() """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.module = types.ModuleType(self.name)
+        self.module.__file__ = path
+        self.entry = None
+
+    def load(self):
+        """ Run the module body and keep the coroutine it hands to asyncio.run() """
+        with open(self.path) as file:
+            code = compile(file.read(), self.path, "exec")
+
+        def run(coroutine):
+            self.entry = coroutine
+            raise _Started
+
+        real_run = uasyncio.run
+        uasyncio.run = run
+        try:
+            exec(code, self.module.__dict__)
+        except _Started:
+            pass
+        finally:
+            uasyncio.run = real_run
+        if self.entry is None:
+            raise RuntimeError(f"{self.path} never called asyncio.run()")
+
+    async def run(self):
+        """ Run the entry point, calling it again whenever it returns like a device loop would """
+        coroutine = self.entry
+        function = getattr(self.module, coroutine.__name__)
+        while True:
+            await coroutine
+            coroutine = function()
+
+
+class Simulation:
+    """ Device scripts running against each other over a simulated link """
+
+    def __init__(self, paths, interval_ms=None, packet_loss=0.0, jitter_ms=0.0, seed=0, cpu_scale=0.0):
+        self.paths = paths
+        self.interval_ms = interval_ms
+        self.packet_loss = packet_loss
+        self.jitter_ms = jitter_ms
+        self.seed = seed
+        self.clock = VirtualClock(cpu_scale=cpu_scale)
+        self.scripts = {}
+        self.output = io.StringIO()
+        # (ticks_us, "notify" or "deliver", frame) for every notification
+        self.trace = []
+        # (pin id, press ticks_us, release ticks_us) for every button press
+        self.presses = []
+        self._inputs = []
+
+    def press(self, pin, at_ms, hold_ms=100):
+        """ Hold the button on pin down at at_ms for hold_ms, in simulated time """
+        self._inputs.append((pin, at_ms, hold_ms))
+
+    async def _press(self, start, pin, at_ms, hold_ms):
+        await asyncio.sleep(start + at_ms / 1000 - self.clock.now)
+        pressed = utime.ticks_us()
+        machine.pin(pin).drive(0)
+        await asyncio.sleep(hold_ms / 1000)
+        machine.pin(pin).drive(1)
+        self.presses.append((pin, pressed, utime.ticks_us()))
+
+    async def _main(self, duration_ms, extra):
+        start = self.clock.now
+        tasks = [asyncio.create_task(script.run()) for script in self.scripts.values()]
+        tasks += [asyncio.create_task(self._press(start, *press)) for press in self._inputs]
+        tasks += [asyncio.create_task(function()) for function in extra]
+        await asyncio.sleep(duration_ms / 1000)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception():
+                raise task.exception()
+            task.cancel()
+        # And any the scripts started themselves
+        tasks += [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and task not in tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, duration_ms, tasks=(), setup=None):
+        """ Load the scripts and run them for duration_ms of simulated time
+
+        tasks are extra coroutine functions to run alongside the scripts, and
+        setup(simulation) is called once the scripts are loaded, for hooking
+        into their globals.
+        """
+        real_ns, real_sleep_ns = utime._ns, utime._sleep_ns
+        utime._ns, utime._sleep_ns = self.clock.ns, self.clock.sleep_ns
+        aioble.reset(self.seed)
+        aioble.fixed_interval_ms = self.interval_ms
+        aioble.packet_loss = self.packet_loss
+        aioble.jitter_ms = self.jitter_ms
+        aioble.trace = self.trace
+        loop = VirtualEventLoop(self.clock)
+        cwd = os.getcwd()
+        # Scripts keep their caches in the current folder, like flash
+        with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(self.output):
+            os.chdir(folder)
+            try:
+                asyncio.set_event_loop(loop)
+                for path in self.paths:
+                    script = Script(os.path.abspath(os.path.join(cwd, path)))
+                    script.load()
+                    self.scripts[script.name] = script
+                if setup:
+                    setup(self)
+                loop.run_until_complete(self._main(duration_ms, tasks))
+            finally:
+                os.chdir(cwd)
+                asyncio.set_event_loop(None)
+                loop.close()
+                utime._ns, utime._sleep_ns = real_ns, real_sleep_ns
+                aioble.fixed_interval_ms = None
+                aioble.packet_loss = 0.0
+                aioble.jitter_ms = 0.0
+                aioble.trace = None
+
+
+def drives(left, right, motors):
+    """ True if the motors at left, right turn the way motors, (left, right) as -1, 0 or 1, asks, at any speed
+
+    With the velocity loop the motors ramp up, so the first change is a small
+    speed the right way.
+    """
+    return ((left > 0) - (left < 0), (right > 0) - (right < 0)) == motors
+
+
+def motor_latencies(presses, log, motors):
+    """ Press to motor latency in us for each press; None where the motors never moved
+
+    log is a Burgerbot log of (ticks_us, left, right) and motors maps a pin id
+    to the (left, right) its button should drive.
+    """
+    latencies = []
+    for pin, pressed, released in presses:
+        latency = None
+        for when, left, right in log:
+            delay = utime.ticks_diff(when, pressed)
+            if delay >= 0 and drives(left, right, motors[pin]):
+                latency = delay
+                break
+        latencies.append(latency)
+    return latencies
+
+
+def speed_motors(robot):
+    """ Give a loaded robot_code.py motors with a speed, as if LEFT_MOTOR and RIGHT_MOTOR were set
+
+    Returns the (left, right) motor.Motor stand-ins, whose logs have every
+    speed they were set to.
+    """
+    left, right = Motor(pico_motor_shim.MOTOR_1), Motor(pico_motor_shim.MOTOR_2)
+    wheels = robot.wheels
+    wheels.left_motor, wheels.right_motor = left, right
+    wheels.proportional = True
+    return left, right
@@ -0,0 +1,38 @@
+# Host stand-in for MicroPython `uasyncio`, built on CPython asyncio
+
+from asyncio import *  # noqa: F401,F403
+import asyncio as _asyncio
+
+
+def sleep_ms(ms):
+    return _asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return _asyncio.wait_for(aw, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    """ Flag that can be set from an IRQ handler or another thread and awaited by one task """
+
+    def __init__(self):
+        self._event = _asyncio.Event()
+        self._loop = None
+
+    def set(self):
+        try:
+            _asyncio.get_running_loop()
+        except RuntimeError:
+            # Another thread, like core 1 on the device
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._event.set)
+                return
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        self._loop = _asyncio.get_running_loop()
+        await self._event.wait()
+        self._event.clear()
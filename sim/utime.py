@@ -0,0 +1,54 @@
+# Host stand-in for the MicroPython `utime` module
+# Ticks wrap at 2**30 just like on the RP2040 port.
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def _ns():
+    """ Clock source in nanoseconds """
+    return _time.perf_counter_ns()
+
+
+def _sleep_ns(ns):
+    """ Block for ns nanoseconds """
+    _time.sleep(ns / 1_000_000_000)
+
+
+def ticks_ns():
+    return _ns()
+
+
+def ticks_us():
+    return (_ns() // 1_000) & _TICKS_MAX
+
+
+def ticks_ms():
+    return (_ns() // 1_000_000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep(seconds):
+    _sleep_ns(int(seconds * 1_000_000_000))
+
+
+def sleep_ms(ms):
+    _sleep_ns(ms * 1_000_000)
+
+
+def sleep_us(us):
+    _sleep_ns(us * 1_000)
+
+
+def time():
+    return int(_time.time())
@@ -0,0 +1,185 @@
+# Turn event traces dumped over serial into a Chrome trace
+# Save the serial output of each device with TRACE = True (anything that is
+# not a trace is skipped, and the last dump from each device is used), then
+#
+#   python tools/trace_to_chrome.py remote.log robot.log -o drive.json
+#
+# and open drive.json in chrome://tracing or https://ui.perfetto.dev. The
+# two clocks are not synchronised, so each trace is moved onto the first
+# one's clock using the notify / ack pairs they share, the way NTP does:
+# the offset is taken from the exchange with the quickest round trip, where
+# the two one-way delays are closest. Without acks the quickest
+# notification is taken to have arrived straight away.
+
+import argparse
+import binascii
+import json
+import os
+import struct
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "sim"), ROOT]
+
+import event_trace  # noqa: E402
+from motion import COMMAND_NAMES  # noqa: E402
+
+TICKS_PERIOD = 1 << 30
+
+
+class Trace:
+    """ One device's dump: its name and records of (time us, event, argument) """
+
+    def __init__(self, name, records, lost):
+        self.name = name
+        self.records = records
+        self.lost = lost
+        self.offset_us = 0
+
+    def first(self, event):
+        """ Return {argument: time} for the first record of an event per argument """
+        times = {}
+        for time, kind, arg in self.records:
+            if kind == event and arg not in times:
+                times[arg] = time
+        return times
+
+
+def parse(lines):
+    """ Return {device name: Trace} for the last dump from each device in lines """
+    traces = {}
+    dump = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith("TRACE "):
+            fields = line.split()
+            if fields[1] == "END":
+                if dump is not None:
+                    traces[dump.name] = dump
+                dump = None
+            else:
+                dump = Trace(fields[1], [], int(fields[3]))
+        elif dump is not None and line:
+            data = binascii.unhexlify(line)
+            dump.records.extend(struct.iter_unpack(event_trace.RECORD_FORMAT, data))
+    for trace in traces.values():
+        trace.records = unwrap(trace.records)
+    return traces
+
+
+def unwrap(records):
+    """ Turn ticks_us, which wrap every 2**30 us, into a steady count """
+    unwrapped = []
+    last = None
+    total = 0
+    for time, event, arg in records:
+        if last is not None:
+            total += ((time - last + TICKS_PERIOD // 2) % TICKS_PERIOD) - TICKS_PERIOD // 2
+        else:
+            total = time
+        last = time
+        unwrapped.append((total, event, arg))
+    return unwrapped
+
+
+def clock_offset(sender, receiver):
+    """ Return (receiver clock - sender clock in us, how) from the frames between them """
+    sent = sender.first(event_trace.NOTIFY_SENT)
+    received = receiver.first(event_trace.NOTIFY_RECEIVED)
+    acked = receiver.first(event_trace.ACK_SENT)
+    ack_received = sender.first(event_trace.ACK_RECEIVED)
+    best = None
+    for seq, t1 in sent.items():
+        if seq in received and seq in acked and seq in ack_received:
+            t2, t3, t4 = received[seq], acked[seq], ack_received[seq]
+            round_trip = (t4 - t1) - (t3 - t2)
+            if best is None or round_trip < best[0]:
+                best = (round_trip, ((t2 - t1) + (t3 - t4)) / 2)
+    if best is not None:
+        return best[1], f"from acks, round trip {best[0]:.0f} us"
+    delays = [received[seq] - time for seq, time in sent.items() if seq in received]
+    if delays:
+        return min(delays), "from the quickest notification"
+    return 0, "no shared frames, clocks left as they are"
+
+
+def align(traces):
+    """ Set each trace's offset_us onto the first trace's clock; return notes on how """
+    reference = traces[0]
+    notes = []
+    for trace in traces[1:]:
+        if reference.first(event_trace.NOTIFY_SENT):
+            offset, how = clock_offset(reference, trace)
+        else:
+            offset, how = clock_offset(trace, reference)
+            offset = -offset
+        trace.offset_us = offset
+        notes.append(f"{trace.name}: {offset:+.0f} us against {reference.name}, {how}")
+    return notes
+
+
+def chrome_events(traces):
+    """ Return the Chrome trace events for the aligned traces """
+    start = min(time - trace.offset_us for trace in traces for time, _, _ in trace.records[:1])
+    events = []
+    for pid, trace in enumerate(traces, 1):
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": trace.name}})
+        moving = connected = False
+        for time, event, arg in trace.records:
+            ts = time - trace.offset_us - start
+            name = event_trace.EVENT_NAMES[event] if event < len(event_trace.EVENT_NAMES) else f"event {event}"
+            base = {"pid": pid, "ts": ts}
+            if event in (event_trace.MOVE_START, event_trace.MOVE_STOP):
+                if moving:
+                    events.append(dict(base, ph="E", tid="motors"))
+                moving = event == event_trace.MOVE_START
+                if moving:
+                    events.append(dict(base, ph="B", tid="motors", name=COMMAND_NAMES[arg]))
+            elif event == event_trace.CONNECT:
+                if not connected:
+                    events.append(dict(base, ph="B", tid="link", name="connected"))
+                connected = True
+            elif event == event_trace.DISCONNECT:
+                if connected:
+                    events.append(dict(base, ph="E", tid="link"))
+                connected = False
+            elif event == event_trace.GC:
+                events.append(dict(base, ph="X", tid="gc", name=name, dur=arg))
+            elif event == event_trace.BUTTON_EDGE:
+                action = "pressed" if arg & 1 else "released"
+                events.append(dict(base, ph="i", s="t", tid="buttons", name=f"button {arg >> 1} {action}"))
+            else:
+                events.append(dict(base, ph="i", s="t", tid="ble", name=name, args={"seq": arg}))
+    return events
+
+
+def convert(paths):
+    """ Return (Chrome trace dict, notes) for the dumps in the files at paths """
+    traces = []
+    for path in paths:
+        with open(path) as file:
+            traces.extend(trace for trace in parse(file).values() if trace.records)
+    if not traces:
+        raise ValueError("no traces found")
+    notes = align(traces)
+    for trace in traces:
+        if trace.lost:
+            notes.append(f"{trace.name}: {trace.lost} older events were overwritten")
+    return {"traceEvents": chrome_events(traces), "displayTimeUnit": "ms"}, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert event trace dumps to a Chrome trace")
+    parser.add_argument("logs", nargs="+", help="serial output from each device")
+    parser.add_argument("-o", "--output", default="trace.json", help="Chrome trace file to write")
+    args = parser.parse_args()
+    chrome, notes = convert(args.logs)
+    with open(args.output, "w") as file:
+        json.dump(chrome, file)
+    for note in notes:
+        print(note)
+    print(f"wrote {len(chrome['traceEvents'])} events to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
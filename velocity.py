@@ -0,0 +1,149 @@
+# Fixed rate velocity loop for the motors
+# Instead of switching the motors fully on and off, a task runs every
+# VELOCITY_TICK_MS and moves each side's speed towards its setpoint by at
+# most the acceleration (speeding up) or deceleration (slowing down) for one
+# tick. Setpoints are set from anywhere without blocking. It has the same
+# methods as the Burgerbot, so MotionExecutor can drive it as if it were
+# the robot, and the loop is the only thing that talks to the motors, which
+# need a speed for each side, through wheels.Wheels. run() is the loop task
+# on core 0; dual_core.MotorCore calls tick() from its own loop on core 1.
+
+import uasyncio as asyncio
+from micropython import const
+from utime import ticks_add, ticks_diff, ticks_us
+
+from motion import DRIVE_MAX
+
+# How often the loop runs
+VELOCITY_TICK_MS = const(10)
+
+# Thousandths of full speed per second: 0 to full speed in 250 ms, full
+# speed to a stop in 125 ms
+ACCELERATION = const(4000)
+DECELERATION = const(8000)
+
+
+def ramp(speed, target, up, down):
+    """ Return speed moved towards target by at most up when speeding up, down when slowing down """
+    if speed == target:
+        return speed
+    if (speed >= 0 and target > speed) or (speed <= 0 and target < speed):
+        # Speeding up, away from 0
+        step = up
+    else:
+        step = down
+    if target > speed:
+        speed = min(target, speed + step)
+    else:
+        speed = max(target, speed - step)
+    return speed
+
+
+class VelocityLoop:
+    """ Ramp the Burgerbot's left and right speeds to their setpoints at a fixed rate """
+
+    def __init__(self, bot, tick_ms=VELOCITY_TICK_MS, acceleration=ACCELERATION, deceleration=DECELERATION):
+        self.bot = bot
+        self.tick_ms = tick_ms
+        self.tick_us = tick_ms * 1000
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        # Change per tick, at least 1 so a ramp always ends
+        self._up = max(1, acceleration * tick_ms // 1000)
+        self._down = max(1, deceleration * tick_ms // 1000)
+        # Setpoints and the speeds the motors are running at, -DRIVE_MAX..DRIVE_MAX
+        self.target_left = 0
+        self.target_right = 0
+        self.left = 0
+        self.right = 0
+        self._flag = asyncio.ThreadSafeFlag()
+        # Tick statistics: how far from its time each tick started, in us.
+        # uasyncio sleeps in whole ms, so up to 500 us is the floor.
+        self.ticks = 0
+        self.skipped = 0
+        self.total_jitter_us = 0
+        self.max_jitter_us = 0
+        self.updates = 0
+
+    def drive(self, left, right):
+        """ Set the speed setpoint for each side, the loop ramps to it """
+        self.target_left = max(-DRIVE_MAX, min(DRIVE_MAX, left))
+        self.target_right = max(-DRIVE_MAX, min(DRIVE_MAX, right))
+        self._flag.set()
+
+    def forward(self, duration=None):
+        self.drive(DRIVE_MAX, DRIVE_MAX)
+
+    def backward(self, duration=None):
+        self.drive(-DRIVE_MAX, -DRIVE_MAX)
+
+    def turnleft(self, duration=None):
+        self.drive(-DRIVE_MAX, DRIVE_MAX)
+
+    def turnright(self, duration=None):
+        self.drive(DRIVE_MAX, -DRIVE_MAX)
+
+    def stop(self):
+        """ Ramp down to a stop """
+        self.drive(0, 0)
+
+    def halt(self):
+        """ Stop the motors now, without ramping down """
+        self.target_left = self.target_right = 0
+        self.left = self.right = 0
+        self.bot.stop()
+
+    def settled(self):
+        """ Return True once both sides run at their setpoints """
+        return self.left == self.target_left and self.right == self.target_right
+
+    def step(self):
+        """ Move one tick towards the setpoints, and tell the motors if anything changed """
+        left = ramp(self.left, self.target_left, self._up, self._down)
+        right = ramp(self.right, self.target_right, self._up, self._down)
+        if left != self.left or right != self.right:
+            self.left = left
+            self.right = right
+            self.updates += 1
+            if left == 0 and right == 0:
+                self.bot.stop()
+            else:
+                self.bot.drive(left, right)
+
+    def tick(self, deadline):
+        """ Run the tick due at deadline (ticks_us), counting how far off it is; return the next deadline """
+        now = ticks_us()
+        late = ticks_diff(now, deadline)
+        if late >= self.tick_us:
+            # A whole tick or more was missed: start again from now
+            # rather than running the missed ticks back to back
+            self.skipped += late // self.tick_us
+            deadline = now
+            late = 0
+        jitter = late if late > 0 else -late
+        self.ticks += 1
+        self.total_jitter_us += jitter
+        if jitter > self.max_jitter_us:
+            self.max_jitter_us = jitter
+        self.step()
+        # Deadlines follow on from each other, so the rate does not drift
+        return ticks_add(deadline, self.tick_us)
+
+    async def run(self):
+        """ Loop task, start it alongside the motion executor """
+        deadline = ticks_us()
+        while True:
+            if self.settled():
+                # Nothing to ramp, so no ticks until a setpoint changes
+                await self._flag.wait()
+                deadline = ticks_us()
+            deadline = self.tick(deadline)
+            wait = ticks_diff(deadline, ticks_us())
+            if wait > 0:
+                await asyncio.sleep_ms((wait + 500) // 1000)
+
+    def stats(self):
+        """ Return the tick figures as a string, for printing """
+        mean = self.total_jitter_us // self.ticks if self.ticks else 0
+        return (f"velocity loop {self.ticks} ticks, {self.skipped} skipped, jitter mean {mean} us "
+                f"max {self.max_jitter_us} us, {self.updates} motor updates")
@@ -0,0 +1,82 @@
+# Speeds for each side of the Burgerbot
+# MotionExecutor's DRIVE and the velocity loop give a speed for each side in
+# thousandths, -DRIVE_MAX..DRIVE_MAX. Wheels passes them to a left and right
+# motor with the speed() method of Pimoroni's motor.Motor, -1.0..1.0. The
+# Burgerbot driver itself only has forward, backward, turnleft, turnright
+# and stop, so without motors each side is switched fully on or off by its
+# sign with those, which is all the robot could do before.
+
+from motion import DRIVE_MAX
+
+# What the Burgerbot is doing when switched on and off
+_STOPPED = 0
+_FORWARD = 1
+_BACKWARD = 2
+_LEFT = 3
+_RIGHT = 4
+
+
+class Wheels:
+    """ Drive the Burgerbot at a speed for each side, with its own methods if it has no motors """
+
+    def __init__(self, bot, left_motor=None, right_motor=None):
+        self.bot = bot
+        # Both or neither: motors with speed(), like motor.Motor
+        self.left_motor = left_motor
+        self.right_motor = right_motor
+        self.proportional = left_motor is not None and right_motor is not None
+        # The method last called when switching on and off, so it is only
+        # called again when it changes
+        self._state = _STOPPED
+
+    def drive(self, left, right):
+        """ Run each side at a speed, -DRIVE_MAX..DRIVE_MAX """
+        if self.proportional:
+            self.left_motor.speed(left / DRIVE_MAX)
+            self.right_motor.speed(right / DRIVE_MAX)
+            return
+        if left > 0 and right > 0:
+            state = _FORWARD
+        elif left < 0 and right < 0:
+            state = _BACKWARD
+        elif right > left:
+            state = _LEFT
+        elif left > right:
+            state = _RIGHT
+        else:
+            state = _STOPPED
+        if state == self._state:
+            return
+        self._state = state
+        bot = self.bot
+        if state == _FORWARD:
+            bot.forward()
+        elif state == _BACKWARD:
+            bot.backward()
+        elif state == _LEFT:
+            bot.turnleft()
+        elif state == _RIGHT:
+            bot.turnright()
+        else:
+            bot.stop()
+
+    def forward(self, duration=None):
+        self.drive(DRIVE_MAX, DRIVE_MAX)
+
+    def backward(self, duration=None):
+        self.drive(-DRIVE_MAX, -DRIVE_MAX)
+
+    def turnleft(self, duration=None):
+        self.drive(-DRIVE_MAX, DRIVE_MAX)
+
+    def turnright(self, duration=None):
+        self.drive(DRIVE_MAX, -DRIVE_MAX)
+
+    def stop(self):
+        """ Stop both sides, always telling the motors even if they look stopped already """
+        if self.proportional:
+            self.left_motor.speed(0)
+            self.right_motor.speed(0)
+        else:
+            self._state = _STOPPED
+            self.bot.stop()